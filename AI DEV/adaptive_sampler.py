@@ -0,0 +1,88 @@
+# adaptive_sampler.py
+import math
+import time
+
+try:
+    import psutil
+except ImportError:  # psutil เป็น optional - ถ้าไม่มีจะไม่ใช้ CPU headroom ในการตัดสินใจ
+    psutil = None
+
+
+class AdaptiveFrameSampler:
+    """
+    Per-camera controller for how many frames to skip between two processed frames.
+
+    The target skip comes from the scene state reported by CarTrackerManager:
+    - 'ACTIVE' (cars moving / confirming / leaving a zone): sample at `min_frames_to_skip`.
+    - 'PARKED' or 'EMPTY' (nothing moving in the zones): sample at `max_frames_to_skip`.
+
+    It is then raised if the measured processing latency cannot keep up with the source
+    (`latency * fps / target_utilization` frames), and by one more step while the CPU is
+    above `cpu_high_percent`. The skip drops immediately when activity starts but only grows
+    by one step per processed frame, so the rate does not oscillate.
+
+    Only the sampling rate changes: frame_idx still counts every source frame, so durations
+    computed from frame_idx / fps stay correct.
+    """
+    def __init__(self, fps, min_frames_to_skip=1, max_frames_to_skip=10, initial_frames_to_skip=1,
+                 target_utilization=0.8, cpu_high_percent=85, cpu_check_interval_seconds=2.0, latency_smoothing=0.2):
+        self.fps = fps
+        self.min_frames_to_skip = max(1, int(min_frames_to_skip))
+        self.max_frames_to_skip = max(self.min_frames_to_skip, int(max_frames_to_skip))
+        self.frames_to_skip = self._clamp(initial_frames_to_skip)
+        self.target_utilization = target_utilization
+        self.cpu_high_percent = cpu_high_percent
+        self.cpu_check_interval_seconds = cpu_check_interval_seconds
+        self.latency_smoothing = latency_smoothing
+
+        self.latency_seconds = None
+        self.cpu_percent = None
+        self.scene_state = None
+        self._last_processed_frame_idx = None
+        self._last_cpu_check = 0.0
+        if psutil is not None:
+            psutil.cpu_percent(interval=None)  # ค่าแรกของ psutil เป็น 0 เสมอ ให้เริ่มนับไว้ก่อน
+
+    def _clamp(self, frames_to_skip):
+        return min(self.max_frames_to_skip, max(self.min_frames_to_skip, int(frames_to_skip)))
+
+    def should_process(self, frame_idx):
+        """Returns True if this frame should go through detection/tracking."""
+        if self._last_processed_frame_idx is not None and frame_idx - self._last_processed_frame_idx < self.frames_to_skip:
+            return False
+        self._last_processed_frame_idx = frame_idx
+        return True
+
+    def record_latency(self, seconds):
+        """Feeds the processing time of one processed frame (exponential moving average)."""
+        if self.latency_seconds is None:
+            self.latency_seconds = seconds
+        else:
+            self.latency_seconds += self.latency_smoothing * (seconds - self.latency_seconds)
+
+    def _cpu_is_busy(self):
+        if psutil is None:
+            return False
+        now = time.monotonic()
+        if now - self._last_cpu_check >= self.cpu_check_interval_seconds:
+            self.cpu_percent = psutil.cpu_percent(interval=None)
+            self._last_cpu_check = now
+        return self.cpu_percent is not None and self.cpu_percent >= self.cpu_high_percent
+
+    def update(self, scene_state):
+        """Recomputes `frames_to_skip` after a processed frame. Returns the new value."""
+        self.scene_state = scene_state
+        target = self.min_frames_to_skip if scene_state == 'ACTIVE' else self.max_frames_to_skip
+
+        # ต้องข้ามอย่างน้อยเท่านี้ ไม่อย่างนั้นการประมวลผลจะตามเฟรมจริงไม่ทัน
+        if self.latency_seconds is not None and self.fps > 0:
+            target = max(target, math.ceil(self.latency_seconds * self.fps / self.target_utilization))
+        if self._cpu_is_busy():
+            target += 1
+        target = self._clamp(target)
+
+        if target < self.frames_to_skip:
+            self.frames_to_skip = target
+        elif target > self.frames_to_skip:
+            self.frames_to_skip += 1
+        return self.frames_to_skip
@@ -15,8 +15,8 @@ from datetime import datetime
 from typing import Optional
 import logging
 import asyncio
-import httpx
-from collections import deque 
+import functools
+import hashlib
 import base64 
 
 # Configure logging for this Worker Process
@@ -33,9 +33,25 @@ from ultralytics.nn.modules.block import C2f, Bottleneck, SPPF, DFL
 from ultralytics.nn.modules.head import Detect, Segment, Pose
 
 # ### แก้ไข ###: Import ฟังก์ชันสำหรับหลายโซนจาก utils.py
-from utils import load_parking_zone, is_point_in_any_polygon, get_bbox_center, draw_parking_zones, write_mot_results
-from utils import adjust_brightness_clahe, adjust_brightness_histogram
+from utils import load_parking_zone, get_bbox_center, draw_parking_zones, write_mot_results
+from utils import adjust_brightness_clahe, adjust_brightness_histogram, get_zones_bounding_rect
 from car_tracker_manager import CarTrackerManager
+from vectorized_tracker_manager import VectorizedCarTrackerManager
+from frame_grabber import FrameGrabber, is_stream_source
+from ffmpeg_capture import FFmpegCapture, FullResolutionReader
+from inference_server import InferenceClient
+from frame_ring import SharedFrameRing
+from motion_gate import MotionGate
+from zone_index import ZoneIndex
+from adaptive_sampler import AdaptiveFrameSampler
+from detection_tracker import DetectionTracker
+from tracker_checkpoint import CheckpointWriter, load_checkpoint
+from track_log import TrackLogWriter
+from detections import Detections
+from event_uplink import EventUplink
+from event_outbox import EventOutbox
+from frame_renderer import render_frame
+from detectors.onnx_backend import create_detector
 
 # แก้ไข UnpicklingError
 torch.serialization.add_safe_globals([
@@ -52,30 +68,86 @@ except AttributeError:
     logger.warning("Ultralytics plotting functions not found or already modified. Manual drawing might overlap.")
 
 # --- ค่าคงที่และตัวแปร Global ---
-FASTAPI_BACKEND_URL = "http://127.0.0.1:8000/analytics"
-api_retry_queue = deque(maxlen=100)
+FASTAPI_BACKEND_URL = "http://127.0.0.1:8000/analytics/"
+EVIDENCE_UPLOAD_URL = "http://127.0.0.1:8000/evidence/"
+
+# --- แปลง event จาก CarTrackerManager เป็น (payload ของ API, ภาพหลักฐาน JPEG หรือ None) ---
+# ภาพไม่อยู่ใน JSON: uplink อัปโหลดแยกไปที่ /evidence/ และ payload อ้างถึงด้วย image_sha256
+def build_event_payload(event, branch, branch_id, camera_id):
+    event_for_json = event.copy()
+    image_jpeg = event_for_json.pop('image_jpeg', None)
+    if image_jpeg is not None:
+        event_for_json['image_sha256'] = hashlib.sha256(image_jpeg).hexdigest()
+    if 'entry_time' in event_for_json and isinstance(event_for_json['entry_time'], datetime):
+        event_for_json['entry_time'] = event_for_json['entry_time'].isoformat() + "Z"
+    if 'exit_time' in event_for_json and isinstance(event_for_json['exit_time'], datetime):
+        event_for_json['exit_time'] = event_for_json['exit_time'].isoformat() + "Z"
+    return {
+        "parking_violation": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "branch": branch,
+            "branch_id": branch_id,
+            "camera_id": camera_id,
+            **event_for_json
+        }
+    }, image_jpeg
+
+# --- สร้างตัวส่ง event ของ worker (client แบบ keep-alive + sender task ที่ทำงานคู่กับลูปเฟรม) ---
+def create_event_uplink(config, camera_id, api_key):
+    uplink_cfg = config.get('api_uplink', {})
+    # ### เพิ่ม ###: event ที่ส่งไม่สำเร็จเก็บลงดิสก์ (ไฟล์ละกล้อง) แทน retry queue ในหน่วยความจำ
+    outbox = EventOutbox(
+        Path(uplink_cfg.get('outbox_dir', 'runs/outbox')) / f"{camera_id}.sqlite3",
+        max_bytes=int(uplink_cfg.get('outbox_max_mb', 256) * 1024 * 1024),
+        overflow_policy=uplink_cfg.get('outbox_overflow_policy', 'drop_oldest')
+    )
+    return EventUplink(
+        uplink_cfg.get('url', FASTAPI_BACKEND_URL), api_key, outbox, name=camera_id,
+        max_queue_size=uplink_cfg.get('max_queue_size', 1000),
+        concurrency=uplink_cfg.get('concurrency', 2),
+        timeout_seconds=uplink_cfg.get('timeout_seconds', 10.0),
+        deadline_seconds=uplink_cfg.get('deadline_seconds', 30.0),
+        retry_interval_seconds=uplink_cfg.get('retry_interval_seconds', 5.0),
+        replay_batch_size=uplink_cfg.get('replay_batch_size', 50),
+        batch_url=uplink_cfg.get('batch_url'),
+        coalesce_max_events=uplink_cfg.get('coalesce_max_events', 1),
+        coalesce_max_delay_ms=uplink_cfg.get('coalesce_max_delay_ms', 200),
+        image_url=uplink_cfg.get('image_url', EVIDENCE_UPLOAD_URL)
+    )
 
-# --- ฟังก์ชันสำหรับส่งข้อมูลไปที่ API (เวอร์ชันปรับปรุง) ---
-async def send_data_to_api(camera_id: str, event_payload: dict, api_key: str):
-    current_logger = logging.getLogger(f"camera_worker_process.{camera_id}")
-    headers = {"X-API-Key": api_key, "Content-Type": "application/json"}
+# --- ส่ง metadata ของเฟรมใน shared memory ไปให้ main_monitor (ไม่บล็อกถ้าคิวเต็ม) ---
+def publish_display_frame(display_queue, cam_name, display_ring, slot_idx, frame_idx, timestamp, render_snapshot=None):
+    frame_meta = display_ring.metadata(slot_idx, frame_idx, timestamp)
+    frame_meta['render'] = render_snapshot
     try:
-        current_logger.info(f"[{camera_id}] Attempting to send data...")
-        async with httpx.AsyncClient() as client:
-            response = await client.post(FASTAPI_BACKEND_URL, json=event_payload, headers=headers, timeout=10)
-            response.raise_for_status()
-        current_logger.info(f"[{camera_id}] Successfully sent data.")
+        display_queue.put_nowait((cam_name, frame_meta))
         return True
-    except (httpx.RequestError, httpx.TimeoutException) as e:
-        current_logger.warning(f"[{camera_id}] Could not send data: {e}. Adding to retry queue.")
-        api_retry_queue.append({'payload': event_payload, 'api_key': api_key})
-        return False
-    except Exception as e:
-        current_logger.exception(f"[{camera_id}] Unexpected error in send_data_to_api:")
+    except queue.Full:
         return False
 
+# --- ปรับความสว่างตาม config (ใช้ทั้งกับเฟรมเต็มและภาพ ROI crop) ---
+def apply_brightness_adjustment(frame, config):
+    if config.get('enable_brightness_adjustment', False):
+        if config.get('brightness_method', 'clahe').lower() == 'clahe':
+            return adjust_brightness_clahe(frame)
+        elif config.get('brightness_method', 'clahe').lower() == 'histogram':
+            return adjust_brightness_histogram(frame)
+    return frame
+
+# --- โหลดโมเดล YOLO (ใช้ทั้งใน worker และใน inference server) ---
+def load_yolo_model(config):
+    device_str = config.get('device', 'cpu')
+    model = YOLO(config['yolo_model'])
+    model.to(device_str)
+    if config.get('half_precision', False) and device_str != 'cpu':
+        model.half()
+    model.fuse()
+    model.track_config = Path(config['boxmot_config_path'])
+    model.reid_weights = Path(config['reid_model'])
+    return model
+
 # --- ฟังก์ชัน Worker หลัก (เวอร์ชันปรับปรุง) ---
-async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_display_flag):
+async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_display_flag, inference_queues=None):
     # --- ส่วนตั้งค่าเริ่มต้น ---
     cam_name = cam_cfg['name']
     source_path = str(cam_cfg['source_path'])
@@ -91,16 +163,25 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
     frames_to_skip = config.get('performance_settings', {}).get('frames_to_skip', 1)
     draw_bounding_box = config.get('performance_settings', {}).get('draw_bounding_box', True)
 
-    device_str = config.get('device', 'cpu')
-    logger.info(f"[{cam_name}] Using device: {device_str}")
-    model = YOLO(config['yolo_model'])
-    model.to(device_str)
-    if config.get('half_precision', False) and device_str != 'cpu':
-        model.half()
-    model.fuse()
-    model.track_config = Path(config['boxmot_config_path'])
-    model.reid_weights = Path(config['reid_model'])
-    class_names = model.names
+    tracker_config_file = config.get('tracker_config_file_default', "bytetrack.yaml")
+
+    # ### เพิ่ม ###: ถ้ามี inference server จะไม่โหลดโมเดลใน worker นี้ แต่ส่งเฟรมไปให้ server แทน
+    model = None
+    inference_client = None
+    detector = None
+    detection_tracker = None
+    if inference_queues is not None:
+        request_queue, response_queue = inference_queues
+        inference_client = InferenceClient(cam_name, request_queue, response_queue,
+                                           config.get('inference_server', {}).get('response_timeout_seconds', 10.0))
+        logger.info(f"[{cam_name}] Using shared inference server.")
+    elif config.get('detector_backend', {}).get('type', 'ultralytics').lower() != 'ultralytics':
+        # ### เพิ่ม ###: รันโมเดล ONNX (FP32/INT8) ผ่าน ONNX Runtime / OpenVINO แล้วใช้ tracker ของ Ultralytics ต่อ
+        detector = create_detector(config)
+        logger.info(f"[{cam_name}] Using detector backend: {config['detector_backend']['type']}")
+    else:
+        logger.info(f"[{cam_name}] Using device: {config.get('device', 'cpu')}")
+        model = load_yolo_model(config)
 
     cam_save_dir = increment_path(Path(config['output_dir']) / cam_name, exist_ok=False)
     cam_save_dir.mkdir(parents=True, exist_ok=True)
@@ -110,18 +191,42 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
         logger.error(f"[{cam_name}] Error: ROI coordinates file '{roi_file}' not found or invalid. Exiting worker.")
         return
 
-    cap = cv2.VideoCapture(source_path)
+    # ### เพิ่ม ###: เลือกตัวอ่านวิดีโอ - opencv (ถอดรหัสความละเอียดเต็ม) หรือ ffmpeg (ถอดรหัสและย่อใน ffmpeg เลย)
+    capture_cfg = config.get('capture_backend', {})
+    open_capture = None
+    if capture_cfg.get('type', 'opencv').lower() == 'ffmpeg':
+        open_capture = lambda path: FFmpegCapture(
+            path,
+            output_width=capture_cfg.get('output_width') or target_inference_width,
+            output_fps=capture_cfg.get('output_fps'),
+            is_stream=is_stream_source(path),
+            ffmpeg_path=capture_cfg.get('ffmpeg_path', 'ffmpeg'),
+            ffprobe_path=capture_cfg.get('ffprobe_path', 'ffprobe'),
+            rtsp_transport=capture_cfg.get('rtsp_transport', 'tcp'),
+            # สตรีมย้อนอ่านไม่ได้ - เก็บเฟรมความละเอียดเต็มล่าสุดไว้ให้ภาพหลักฐาน
+            full_resolution_frames=capture_cfg.get('evidence_stream_frames', 25) if is_stream_source(path) and capture_cfg.get('evidence_full_resolution', True) else 0
+        )
+
+    # ### แก้ไข ###: ใช้ FrameGrabber ถอดรหัสเฟรมบน thread แยก และเก็บเฉพาะเฟรมล่าสุด
+    frame_grabber = FrameGrabber(source_path, name=cam_name, reconnect_delay_seconds=config.get('reconnect_delay_seconds', 15), open_capture=open_capture)
     
-    original_video_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    original_video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    original_video_width = frame_grabber.source_width
+    original_video_height = frame_grabber.source_height
     
     if original_video_width == 0 or original_video_height == 0:
-        ret, temp_frame = cap.read()
-        if ret:
-            original_video_height, original_video_width = temp_frame.shape[:2]
-        else:
-            logger.warning(f"[{cam_name}] Could not determine video dimensions.")
-            original_video_width, original_video_height = target_inference_width, target_inference_width
+        logger.warning(f"[{cam_name}] Could not determine video dimensions.")
+        original_video_width, original_video_height = target_inference_width, target_inference_width
+
+    # ขนาดของเฟรมที่ grabber ส่งมา (เท่ากับขนาดต้นฉบับ ยกเว้นเมื่อ ffmpeg ย่อมาให้แล้ว)
+    capture_width = frame_grabber.width or original_video_width
+    capture_height = frame_grabber.height or original_video_height
+
+    # เฟรมความละเอียดเต็มสำหรับภาพหลักฐาน เมื่อ ffmpeg ส่งมาแค่เฟรมที่ย่อแล้ว (โหลดเฉพาะตอนเกิด violation)
+    full_resolution_reader = None
+    if open_capture is not None and capture_cfg.get('evidence_full_resolution', True) and capture_width < original_video_width:
+        source_fps = getattr(frame_grabber.cap, 'source_fps', 0) or frame_grabber.fps
+        frame_step = source_fps / frame_grabber.fps if frame_grabber.fps > 0 else 1.0
+        full_resolution_reader = FullResolutionReader(source_path, is_stream_source(source_path), frame_step, frame_grabber=frame_grabber)
 
     target_inference_height = int(original_video_height * (target_inference_width / original_video_width)) if original_video_width > 0 else 480
     scale_x = target_inference_width / original_video_width if original_video_width > 0 else 1
@@ -131,8 +236,10 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
     for polygon in parking_zones_original:
         scaled_polygon = [[int(p[0] * scale_x), int(p[1] * scale_y)] for p in polygon]
         scaled_parking_zones.append(scaled_polygon)
+    # ### เพิ่ม ###: label mask ของโซนที่ความละเอียด inference สร้างครั้งเดียว ใช้ร่วมกันทั้งตัวกรองกล่องและ tracker manager
+    zone_index = ZoneIndex(scaled_parking_zones, target_inference_width, target_inference_height)
     
-    fps = cap.get(cv2.CAP_PROP_FPS)
+    fps = frame_grabber.fps
     if fps <= 0: fps = 30.0
 
     parking_time_limit_minutes = cam_cfg.get('parking_time_limit_minutes', config.get('parking_time_limit_minutes', 15))
@@ -140,239 +247,295 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
     if warning_time_limit_minutes is None:
         warning_time_limit_minutes = parking_time_limit_minutes - 2 if isinstance(parking_time_limit_minutes, int) and parking_time_limit_minutes > 2 else 13
 
-    car_tracker_manager = CarTrackerManager(
+    if inference_client is not None or detector is not None:
+        detection_tracker = DetectionTracker(tracker_config_file, frame_rate=fps)
+
+    # ### เพิ่ม ###: เลือก engine ของ tracker manager - dict (ค่าเดิม) หรือ vectorized (numpy, เหมาะกับลานจอดที่มีรถเยอะ)
+    tracker_manager_class = VectorizedCarTrackerManager if config.get('tracker_engine', 'dict') == 'vectorized' else CarTrackerManager
+    car_tracker_manager = tracker_manager_class(
         scaled_parking_zones,
         parking_time_limit_minutes,
         cam_cfg.get('movement_threshold_px', config.get('movement_threshold_px', 5)),
         cam_cfg.get('movement_frame_window', config.get('movement_frame_window', 30)),
         warning_time_limit_minutes,
         fps,
-        config
+        config,
+        zone_index=zone_index
     )
+
+    # ### เพิ่ม ###: checkpoint ของ session ที่เปิดอยู่ - ถ้า worker ถูก restart จะกู้คืนรถที่จอดอยู่ต่อจากเดิม (ไม่เริ่มนับใหม่ ไม่ส่ง parking_started ซ้ำ)
+    checkpoint_writer = None
+    checkpoint_cfg = config.get('tracker_checkpoint', {})
+    if checkpoint_cfg.get('enabled', False):
+        checkpoint_path = Path(checkpoint_cfg.get('dir', 'runs/checkpoints')) / f"{camera_id}.json"
+        checkpoint_state = load_checkpoint(checkpoint_path, checkpoint_cfg.get('max_age_seconds', 600))
+        if checkpoint_state is not None:
+            restored_sessions = car_tracker_manager.restore_state(checkpoint_state)
+            logger.info(f"[{cam_name}] Restored {restored_sessions} parking sessions from {checkpoint_path}.")
+        checkpoint_writer = CheckpointWriter(checkpoint_path)
+        checkpoint_interval_frames = max(1, int(checkpoint_cfg.get('interval_seconds', 10) * fps))
+        last_checkpoint_frame_idx = 0
     
+    roi_crop_rect = None
+    roi_crop_cfg = config.get('roi_crop', {})
+    if roi_crop_cfg.get('enabled', False):
+        rx1, ry1, rx2, ry2 = get_zones_bounding_rect(scaled_parking_zones, roi_crop_cfg.get('padding_px', 32), target_inference_width, target_inference_height)
+        # กรอบในพิกัดของเฟรมที่ grabber ส่งมา
+        capture_scale_x = target_inference_width / capture_width
+        capture_scale_y = target_inference_height / capture_height
+        roi_crop_rect = (int(rx1 / capture_scale_x), int(ry1 / capture_scale_y), min(capture_width, int(np.ceil(rx2 / capture_scale_x))), min(capture_height, int(np.ceil(ry2 / capture_scale_y))))
+        crop_w, crop_h = roi_crop_rect[2] - roi_crop_rect[0], roi_crop_rect[3] - roi_crop_rect[1]
+        # ความกว้างที่ส่งเข้าโมเดล (ไม่ขยายเกินความละเอียดจริงของ crop)
+        crop_inference_width = min(crop_w, roi_crop_cfg.get('inference_width') or target_inference_width)
+        roi_crop_size = (crop_inference_width, max(1, int(round(crop_h * crop_inference_width / crop_w))))
+        roi_crop_factor_x = crop_w / roi_crop_size[0]
+        roi_crop_factor_y = crop_h / roi_crop_size[1]
+        logger.info(f"[{cam_name}] ROI crop enabled: {roi_crop_rect} (capture px) -> inference size {roi_crop_size}.")
+
+    # ### เพิ่ม ###: ปรับจำนวนเฟรมที่ข้ามตามสถานะของฉาก, latency และ CPU (แทนค่า frames_to_skip คงที่)
+    frame_sampler = None
+    sampling_cfg = config.get('adaptive_sampling', {})
+    if sampling_cfg.get('enabled', False):
+        frame_sampler = AdaptiveFrameSampler(
+            fps,
+            min_frames_to_skip=sampling_cfg.get('min_frames_to_skip', 1),
+            max_frames_to_skip=sampling_cfg.get('max_frames_to_skip', 10),
+            initial_frames_to_skip=frames_to_skip,
+            target_utilization=sampling_cfg.get('target_utilization', 0.8),
+            cpu_high_percent=sampling_cfg.get('cpu_high_percent', 85)
+        )
+        logger.info(f"[{cam_name}] Adaptive frame sampling enabled (skip {frame_sampler.min_frames_to_skip}-{frame_sampler.max_frames_to_skip} frames).")
+
+    motion_gate = None
+    last_detected_tracks = Detections()
+    motion_gate_cfg = config.get('motion_gate', {})
+    if motion_gate_cfg.get('enabled', False):
+        motion_gate = MotionGate(
+            scaled_parking_zones, target_inference_width, target_inference_height, fps,
+            downscale_width=motion_gate_cfg.get('downscale_width', 160),
+            pixel_threshold=motion_gate_cfg.get('pixel_threshold', 25),
+            min_changed_ratio=motion_gate_cfg.get('min_changed_ratio', 0.005),
+            max_skip_seconds=motion_gate_cfg.get('max_skip_seconds', 2.0)
+        )
+        logger.info(f"[{cam_name}] Motion gate enabled (full detection at least every {motion_gate.max_skip_frames} frames).")
+
     video_writer = None
     if config.get('save_video', False):
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         output_video_path = cam_save_dir / f"output_{Path(source_path).stem}.mp4"
         video_writer = cv2.VideoWriter(str(output_video_path), fourcc, fps, (target_inference_width, target_inference_height))
     
+    # ### เพิ่ม ###: ส่งเฟรมให้ main_monitor ผ่าน shared memory (ส่งแค่ metadata ผ่านคิว)
+    display_ring = None
+    if show_display_flag:
+        display_ring = SharedFrameRing.create((target_inference_height, target_inference_width, 3), config.get('display_ring_slots', 4))
+
     mot_save_path = cam_save_dir / "mot_results" / "mot.txt" if config.get('save_mot_results', False) else None
     if mot_save_path:
         mot_save_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # ### เพิ่ม ###: track log แบบ binary columnar (บีบอัด, เขียนใน thread แยก) แทนการเขียน MOT text ทุกเฟรม
+    track_log_writer = None
+    track_log_cfg = config.get('track_log', {})
+    if track_log_cfg.get('enabled', False):
+        track_log_writer = TrackLogWriter(
+            cam_save_dir / "track_log" / "tracks.trk",
+            chunk_rows=track_log_cfg.get('chunk_rows', 65536),
+            flush_seconds=track_log_cfg.get('flush_seconds', 60),
+            compress_level=track_log_cfg.get('compress_level', 6)
+        )
         
     frame_idx = 0
+    last_render_snapshot = None
+    last_processed_frame_idx = 0
+    last_fps_log_frame_idx = 0
+    processed_frames_since_log = 0
     start_time = time.time()
+    frame_grabber.start()
+    # ### เพิ่ม ###: ส่ง event ผ่านคิว + sender task แทนการ await HTTP ในลูปเฟรม (backend ช้าจะไม่ทำให้เฟรมหาย)
+    event_uplink = create_event_uplink(config, camera_id, api_key)
+    await event_uplink.start()
 
     # --- ลูปหลักในการประมวลผล ---
     while True:
-        ret, frame = cap.read()
+        # ### แก้ไข ###: รอเฟรมจาก grabber โดยไม่บล็อก asyncio loop (การ reconnect ทำใน thread ของ grabber)
+        grabbed = await asyncio.to_thread(frame_grabber.read, 1.0)
         
-        # ### แก้ไข ###: ตรรกะการจัดการเมื่อวิดีโอจบ หรือกล้องหลุด
-        if not ret:
-            is_video_file = not source_path.startswith(('rtsp://', 'http://', 'https://')) and not source_path.isnumeric()
-            
-            if is_video_file:
+        if grabbed is None:
+            if frame_grabber.finished:
                 logger.warning(f"[{cam_name}] End of video file. Worker will now terminate.")
-                break # ### แก้ไข ###: ออกจากลูป while True เมื่อวิดีโอจบ
-            else:
-                logger.warning(f"[{cam_name}] Stream ended or connection lost. Attempting to reconnect...")
-                cap.release()
-                time.sleep(15)
-                cap = cv2.VideoCapture(source_path)
-                continue
+                break
+            continue
 
-        frame_idx += 1
+        # frame_idx มาจาก grabber (นับรวมเฟรมที่ถูกทิ้ง) เพื่อให้ frame_idx / fps ยังตรงกับเวลาจริง
+        frame, frame_idx, capture_timestamp = grabbed
         
-        if frames_to_skip > 1 and (frame_idx % frames_to_skip != 0):
-            if show_display_flag and frame is not None:
-                temp_frame_for_display = cv2.resize(frame, (target_inference_width, target_inference_height))
-                try:
-                    display_queue.put((cam_name, temp_frame_for_display.copy()))
-                except queue.Full: pass
+        if frame_sampler is not None:
+            skip_frame = not frame_sampler.should_process(frame_idx)
+        else:
+            skip_frame = frames_to_skip > 1 and (frame_idx - last_processed_frame_idx < frames_to_skip)
+        if skip_frame:
+            if display_ring is not None and frame is not None:
+                slot_idx, slot_view = display_ring.next_slot()
+                cv2.resize(frame, (target_inference_width, target_inference_height), dst=slot_view)
+                display_ring.write(slot_idx, slot_view, frame_idx)
+                publish_display_frame(display_queue, cam_name, display_ring, slot_idx, frame_idx, capture_timestamp, last_render_snapshot)
             continue
-
-        resized_frame = cv2.resize(frame, (target_inference_width, target_inference_height))
+        last_processed_frame_idx = frame_idx
+        processed_frames_since_log += 1
+        processing_start_time = time.time()
+
+        # ย่อเฟรมลง slot ของ shared memory โดยตรง (ถ้าเปิดการแสดงผล) เพื่อไม่ต้องคัดลอกเฟรมอีกรอบ
+        display_slot_idx = None
+        if display_ring is not None:
+            display_slot_idx, display_slot = display_ring.next_slot()
+            resized_frame = cv2.resize(frame, (target_inference_width, target_inference_height), dst=display_slot)
+        else:
+            resized_frame = cv2.resize(frame, (target_inference_width, target_inference_height))
         
-        if config.get('enable_brightness_adjustment', False):
-            if config.get('brightness_method', 'clahe').lower() == 'clahe':
-                resized_frame = adjust_brightness_clahe(resized_frame)
-            elif config.get('brightness_method', 'clahe').lower() == 'histogram':
-                resized_frame = adjust_brightness_histogram(resized_frame)
-
-        results = model.track(resized_frame, persist=True, show=False, conf=config['detection_confidence_threshold'], classes=config['car_class_id'], tracker=config.get('tracker_config_file_default', "bytetrack.yaml"), verbose=False)
-
-        current_frame_tracks_for_manager = []
-        if results and results[0].boxes is not None and results[0].boxes.id is not None:
-            for box in results[0].boxes:
-                if int(box.cls[0]) in config['car_class_id']:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    bbox_center_x, bbox_center_y = get_bbox_center([x1, y1, x2, y2])
-                    
-                    if is_point_in_any_polygon((bbox_center_x, bbox_center_y), scaled_parking_zones):
-                        current_frame_tracks_for_manager.append({
-                            'id': int(box.id[0]),
-                            'bbox': np.array([x1, y1, x2, y2]),
-                            'conf': float(box.conf[0]),
-                            'cls': int(box.cls[0])
-                        })
+        resized_frame = apply_brightness_adjustment(resized_frame, config)
+
+        # ### เพิ่ม ###: Motion gate - ถ้าในโซนจอดไม่มีอะไรเปลี่ยน ให้ใช้ผล track ล่าสุดซ้ำแทนการรัน YOLO
+        run_detection = motion_gate is None or motion_gate.should_detect(resized_frame, frame_idx)
+        if run_detection:
+            # ### เพิ่ม ###: ROI crop - รันโมเดลเฉพาะกรอบที่ครอบโซนจอดรถ (ตัดจากเฟรมต้นฉบับ เพื่อให้ได้ความละเอียดสูงขึ้น)
+            if roi_crop_rect is not None:
+                ox1, oy1, ox2, oy2 = roi_crop_rect
+                inference_input = apply_brightness_adjustment(cv2.resize(frame[oy1:oy2, ox1:ox2], roi_crop_size), config)
+            else:
+                inference_input = resized_frame
+
+            # raw_tracks: (M, 7) array ของ [x1, y1, x2, y2, track_id, conf, cls]
+            if inference_client is not None:
+                detections = await asyncio.to_thread(inference_client.infer, inference_input, frame_idx)
+                raw_tracks = detection_tracker.update(detections, inference_input)[:, :7]
+            elif detector is not None:
+                detections = detector.detect(inference_input)
+                raw_tracks = detection_tracker.update(detections, inference_input)[:, :7]
+            else:
+                results = model.track(inference_input, persist=True, show=False, conf=config['detection_confidence_threshold'], classes=config['car_class_id'], tracker=tracker_config_file, verbose=False)
+                raw_tracks = np.empty((0, 7))
+                if results and results[0].boxes is not None and results[0].boxes.id is not None:
+                    # boxes.data ของผล track คือ [x1, y1, x2, y2, track_id, conf, cls] - ย้ายจาก GPU/tensor ครั้งเดียวทั้งเฟรม
+                    raw_tracks = results[0].boxes.data.cpu().numpy()
+
+            if roi_crop_rect is not None and len(raw_tracks) > 0:
+                # แปลงพิกัดจาก crop กลับเป็นพิกัดของ resized_frame (overlay, evidence และ MOT จึงเหมือนเดิม)
+                raw_tracks = raw_tracks.astype(np.float64)
+                raw_tracks[:, [0, 2]] = (ox1 + raw_tracks[:, [0, 2]] * roi_crop_factor_x) * capture_scale_x
+                raw_tracks[:, [1, 3]] = (oy1 + raw_tracks[:, [1, 3]] * roi_crop_factor_y) * capture_scale_y
+
+            # ### แก้ไข ###: เก็บผลทั้งเฟรมเป็น Detections (array เดียว) แล้วกรองคลาสและโซนด้วย mask ไม่ต้องสร้าง dict ต่อคัน
+            frame_detections = Detections.from_tracker_output(raw_tracks)
+            is_car = np.isin(frame_detections.cls, config['car_class_id'])
+            in_zone = zone_index.contains(frame_detections.centers)
+            current_frame_tracks_for_manager = frame_detections[is_car & in_zone]
+            last_detected_tracks = current_frame_tracks_for_manager
+        else:
+            # ส่ง track เดิมเข้า manager ด้วย frame_idx ปัจจุบัน เพื่อให้เวลาจอดและสถานะเดินต่อตามปกติ
+            current_frame_tracks_for_manager = last_detected_tracks
 
         # <<< แก้ไข: เพิ่ม original_frame=frame เพื่อส่งเฟรมต้นฉบับเข้าไปด้วย
-        alerts = car_tracker_manager.update(current_frame_tracks_for_manager, frame_idx, resized_frame, original_frame=frame)
+        original_frame = frame
+        if full_resolution_reader is not None:
+            original_frame = functools.partial(full_resolution_reader.read, frame_idx, frame)
+        alerts = car_tracker_manager.update(current_frame_tracks_for_manager, frame_idx, resized_frame, original_frame=original_frame)
+
+        # export_state คัดลอกเฉพาะ session ที่เปิดอยู่ ส่วนการเขียนไฟล์ทำใน thread ของ CheckpointWriter
+        if checkpoint_writer is not None and frame_idx - last_checkpoint_frame_idx >= checkpoint_interval_frames:
+            checkpoint_writer.submit(car_tracker_manager.export_state(frame_idx))
+            last_checkpoint_frame_idx = frame_idx
         
         for alert_msg in alerts:
             logger.info(f"ALERT [{cam_name}]: {alert_msg}")
 
         parking_data_to_send = car_tracker_manager.get_parking_events_for_api()
         for event in parking_data_to_send:
-            event_for_json = event.copy()
-            if 'entry_time' in event_for_json and isinstance(event_for_json['entry_time'], datetime):
-                event_for_json['entry_time'] = event_for_json['entry_time'].isoformat() + "Z"
-            if 'exit_time' in event_for_json and isinstance(event_for_json['exit_time'], datetime):
-                event_for_json['exit_time'] = event_for_json['exit_time'].isoformat() + "Z"
-
-            payload_to_send = {
-                "parking_violation": {
-                    "timestamp": datetime.utcnow().isoformat() + "Z",
-                    "branch": branch,
-                    "branch_id": branch_id,
-                    "camera_id": camera_id,
-                    **event_for_json
-                }
-            }
-            await send_data_to_api(camera_id, payload_to_send, api_key)
-
-        if frame_idx % 150 == 0 and api_retry_queue:
-            logger.info(f"[{cam_name}] Found {len(api_retry_queue)} items in retry queue. Resending one.")
-            item_to_retry = api_retry_queue.popleft()
-            success = await send_data_to_api(camera_id, item_to_retry['payload'], item_to_retry['api_key'])
-            if not success:
-                api_retry_queue.appendleft(item_to_retry)
+            event_uplink.submit(*build_event_payload(event, branch, branch_id, camera_id))
 
         if mot_save_path:
-            write_mot_results(mot_save_path, frame_idx, current_frame_tracks_for_manager)
-
-        draw_parking_zones(resized_frame, scaled_parking_zones)
-        for track_id, car_info in car_tracker_manager.tracked_cars.items():
-            if 'current_bbox' in car_info and car_info['current_bbox'] is not None:
-                x1, y1, x2, y2 = map(int, car_info['current_bbox'])
-                status_info = car_tracker_manager.get_car_status(track_id, frame_idx)
-                status = status_info['status']
-                time_parked_str = status_info['time_parked_str']
-                text_color, background_color, draw_box_color = (255, 255, 255), (0, 128, 0), (0, 255, 0)
-                if status == 'PARKED': background_color, draw_box_color = (0, 128, 0), (0, 255, 0)
-                elif status == 'WARNING_PARKED': background_color, draw_box_color = (0, 100, 200), (0, 255, 255)
-                elif status == 'VIOLATION': background_color, draw_box_color = (0, 0, 200), (0, 0, 255)
-                elif status == 'OUT_OF_ZONE': background_color, draw_box_color = (128, 0, 0), (255, 0, 0)
-                elif status == 'MOVING_IN_ZONE': background_color, draw_box_color = (150, 150, 0), (255, 255, 0)
-                else: background_color, draw_box_color = (50, 50, 50), (128, 128, 128)
-                full_label_text = f"ID:{track_id} {status}"
-                if time_parked_str: full_label_text += f" ({time_parked_str})"
-                font, font_scale, font_thickness = cv2.FONT_HERSHEY_SIMPLEX, 0.3, 1
-                (text_width, text_height), baseline = cv2.getTextSize(full_label_text, font, font_scale, font_thickness)
-                
-                padding_x = 2
-                padding_y = 1
-                margin_from_bbox = 4
-                
-                rect_x1 = x1
-                rect_x2 = rect_x1 + text_width + padding_x * 2
-
-                frame_width = resized_frame.shape[1]
-                if rect_x2 > frame_width:
-                    rect_x2 = x2 
-                    rect_x1 = rect_x2 - text_width - padding_x * 2
-
-                rect_y1 = y2 + margin_from_bbox
-                rect_y2 = rect_y1 + text_height + padding_y * 2 + baseline
-                
-                if rect_y2 > resized_frame.shape[0]:
-                    rect_y2 = y1 - margin_from_bbox
-                    rect_y1 = rect_y2 - (text_height + padding_y * 2 + baseline)
-
-                if draw_bounding_box:
-                    cv2.rectangle(resized_frame, (x1, y1), (x2, y2), draw_box_color, 2)
-
-                if rect_x2 > rect_x1 and rect_y2 > rect_y1:
-                    cv2.rectangle(resized_frame, (rect_x1, rect_y1), (rect_x2, rect_y2), background_color, -1)
-                    cv2.putText(resized_frame, full_label_text, (rect_x1 + padding_x, rect_y1 + text_height + padding_y), font, font_scale, text_color, font_thickness, cv2.LINE_AA)
-        
-        current_parked_cars_count = len(car_tracker_manager.get_current_parking_cars())
-        total_parking_sessions_display = car_tracker_manager.get_parking_count()
-        frame_height, frame_width = resized_frame.shape[:2]
-        font, small_font_scale, small_font_thickness = cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1
-        text_total_sessions = f"Total Parking Sessions: {total_parking_sessions_display}"
-        (w_total, h_total), _ = cv2.getTextSize(text_total_sessions, font, small_font_scale, small_font_thickness)
-        pos_total_y = frame_height - 10
-        pos_total_x = frame_width - w_total - 10
-        cv2.putText(resized_frame, text_total_sessions, (pos_total_x, pos_total_y), font, small_font_scale, (255, 255, 255), small_font_thickness)
-        text_current_parked = f"Current Parked: {current_parked_cars_count}"
-        (w_parked, _), _ = cv2.getTextSize(text_current_parked, font, small_font_scale, small_font_thickness)
-        pos_parked_y = pos_total_y - h_total - 5
-        pos_parked_x = frame_width - w_parked - 10
-        cv2.putText(resized_frame, text_current_parked, (pos_parked_x, pos_parked_y), font, small_font_scale, (255, 255, 255), small_font_thickness)
-        text_cam_name = f"{cam_name}"
-        (w_cam, h_cam), _ = cv2.getTextSize(text_cam_name, font, small_font_scale, small_font_thickness)
-        pos_cam_y = pos_parked_y - h_cam - 5
-        pos_cam_x = frame_width - w_cam - 10
-        cv2.putText(resized_frame, text_cam_name, (pos_cam_x, pos_cam_y), font, small_font_scale, (255, 255, 0), small_font_thickness)
+            write_mot_results(mot_save_path, frame_idx, current_frame_tracks_for_manager.as_track_dicts())
+
+        if track_log_writer is not None and len(current_frame_tracks_for_manager):
+            log_tracks = current_frame_tracks_for_manager
+            track_log_writer.append(
+                frame_idx, log_tracks.ids, log_tracks.xyxy, log_tracks.conf, log_tracks.cls,
+                zone_index.lookup(log_tracks.centers), car_tracker_manager.get_status_codes(log_tracks.ids.tolist())
+            )
+
+        # ### แก้ไข ###: ไม่วาด overlay ใน worker แล้ว - ส่งแค่ snapshot ของ track/สถานะ ให้ผู้ใช้ภาพ (จอแสดงผล/video writer) วาดเอง
+        # ถ้าไม่มีใครใช้ภาพ (headless) จะไม่เสีย CPU กับการวาดเลย
+        if display_ring is not None or video_writer is not None:
+            last_render_snapshot = {'cam_name': cam_name, 'zones': scaled_parking_zones, **car_tracker_manager.get_render_snapshot(frame_idx)}
         
         end_time = time.time()
-        if frame_idx > 1 and frame_idx % (fps * 2) == 0:
+        if frame_idx - last_fps_log_frame_idx >= fps * 2:
             elapsed_time = end_time - start_time
             if elapsed_time > 0:
-                actual_processed_frames = fps * 2 / (frames_to_skip if frames_to_skip > 0 else 1)
-                worker_fps = actual_processed_frames / elapsed_time
-                logger.info(f"[{cam_name}] Worker FPS (Processed): {worker_fps:.2f}")
+                worker_fps = processed_frames_since_log / elapsed_time
+                frame_age_ms = (end_time - capture_timestamp) * 1000
+                logger.info(f"[{cam_name}] Worker FPS (Processed): {worker_fps:.2f}, Frame age: {frame_age_ms:.0f} ms, Dropped frames: {frame_grabber.dropped_frames}")
+                if frame_sampler is not None:
+                    logger.info(f"[{cam_name}] Adaptive sampling: skip={frame_sampler.frames_to_skip}, scene={frame_sampler.scene_state}, latency={frame_sampler.latency_seconds * 1000:.0f} ms, CPU={frame_sampler.cpu_percent}%")
+                if motion_gate is not None:
+                    logger.info(f"[{cam_name}] Motion gate: {motion_gate.detected_frames} detected / {motion_gate.skipped_frames} skipped frames.")
+                uplink_stats = event_uplink.stats()
+                logger.info(f"[{cam_name}] Uplink: queue={uplink_stats['queue_depth']}, outbox={uplink_stats['outbox_depth']} ({uplink_stats['outbox_bytes'] / 1024:.0f} KB), sent={uplink_stats['sent']} ({uplink_stats['requests']} requests, {uplink_stats['images_uploaded']} images), failed={uplink_stats['failed']}, "
+                            f"expired={uplink_stats['expired']}, dropped={uplink_stats['dropped']}, latency p50/p95={uplink_stats['latency_p50_ms']:.0f}/{uplink_stats['latency_p95_ms']:.0f} ms")
+                if uplink_stats['outbox_depth']:
+                    logger.info(f"[{cam_name}] Outbox replay: {uplink_stats['replayed']} replayed, {uplink_stats['replay_rate_eps']:.1f} events/s, lag {uplink_stats['replay_lag_seconds']:.0f} s")
             start_time = time.time()
+            last_fps_log_frame_idx = frame_idx
+            processed_frames_since_log = 0
 
-        if show_display_flag and resized_frame is not None:
-            try:
-                display_queue.put((cam_name, resized_frame.copy()))
-            except queue.Full:
+        if display_ring is not None and resized_frame is not None:
+            display_ring.write(display_slot_idx, resized_frame, frame_idx)
+            if not publish_display_frame(display_queue, cam_name, display_ring, display_slot_idx, frame_idx, capture_timestamp, last_render_snapshot):
                 logger.warning(f"[{cam_name}] Display queue is full.")
         
         if video_writer and video_writer.isOpened():
-            video_writer.write(resized_frame)
+            # slot ของ display ring ต้องเป็นภาพดิบ (main_monitor วาดเอง) จึงวาดลงสำเนาแทน
+            video_frame = resized_frame.copy() if display_ring is not None else resized_frame
+            video_writer.write(render_frame(video_frame, last_render_snapshot, draw_bounding_box))
+
+        if frame_sampler is not None:
+            frame_sampler.record_latency(time.time() - processing_start_time)
+            frame_sampler.update(car_tracker_manager.get_scene_state())
 
     # --- ส่วนท้ายนี้จะถูกเรียกใช้เมื่อออกจากลูป while True (เช่น วิดีโอจบ) ---
     logger.info(f"[{cam_name}] Video stream ended. Finalizing remaining tracked cars...")
 
     # 1. เรียกใช้เมธอดเพื่อปิดท้าย session ของรถที่ยังจอดอยู่
     car_tracker_manager.finalize_all_sessions(frame_idx)
+    # ทุก session ถูกปิดแล้ว - ไม่ต้องกู้คืนอะไรในการเริ่มครั้งถัดไป
+    if checkpoint_writer is not None:
+        checkpoint_writer.close(remove=True)
 
     # 2. ดึง event ทั้งหมดที่ถูกสร้างขึ้น (รวมถึง event สุดท้าย)
-    final_events = car_tracker_manager.get_parking_events_for_api()
+    final_events = car_tracker_manager.get_parking_events_for_api(wait=True)
 
     # 3. สร้าง Payload และส่งข้อมูลสุดท้ายไปที่ API
     if final_events:
         logger.info(f"[{cam_name}] Sending {len(final_events)} final events to API...")
-        final_payloads_to_send = []
         for event in final_events:
-            event_for_json = event.copy()
-            if 'entry_time' in event_for_json and isinstance(event_for_json['entry_time'], datetime):
-                event_for_json['entry_time'] = event_for_json['entry_time'].isoformat() + "Z"
-            if 'exit_time' in event_for_json and isinstance(event_for_json['exit_time'], datetime):
-                event_for_json['exit_time'] = event_for_json['exit_time'].isoformat() + "Z"
-
-            final_payloads_to_send.append({
-                "parking_violation": {
-                    "timestamp": datetime.utcnow().isoformat() + "Z",
-                    "branch": branch,
-                    "branch_id": branch_id,
-                    "camera_id": camera_id,
-                    **event_for_json
-                }
-            })
-
-        # ส่ง event ทั้งหมดพร้อมกัน
-        await asyncio.gather(*[send_data_to_api(camera_id, payload, api_key) for payload in final_payloads_to_send])
-        logger.info(f"[{cam_name}] Finished sending final events.")
+            event_uplink.submit(*build_event_payload(event, branch, branch_id, camera_id))
+
+    # รอให้ event ที่ค้างในคิวถูกส่งออก (sender task ส่งพร้อมกันตาม concurrency) แล้วปิด client
+    await event_uplink.close(config.get('api_uplink', {}).get('drain_timeout_seconds', 30.0))
+    logger.info(f"[{cam_name}] Finished sending final events. Uplink stats: {event_uplink.stats()}")
 
 
     # 4. ปล่อยทรัพยากร
-    cap.release()
+    frame_grabber.stop()
+    car_tracker_manager.evidence_encoder.shutdown()
+    if track_log_writer is not None:
+        track_log_writer.close()
+    if full_resolution_reader is not None:
+        full_resolution_reader.release()
     if video_writer:
         video_writer.release()
+    if display_ring is not None:
+        display_ring.close()
 
     # 5. ส่งสถิติสรุปสุดท้ายไปยัง process หลัก (ถ้ายังต้องการ)
     # หมายเหตุ: finalize_all_sessions ได้เก็บสถิติไว้ในตัวแล้ว
@@ -382,8 +545,8 @@ async def camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_
     logger.info(f"[{cam_name}] Worker has stopped.")
 
 # --- Wrapper function for multiprocessing.Process (โค้ดเดิม) ---
-def camera_worker(cam_cfg, config, display_queue, stats_queue, show_display_flag):
+def camera_worker(cam_cfg, config, display_queue, stats_queue, show_display_flag, inference_queues=None):
     try:
-        asyncio.run(camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_display_flag))
+        asyncio.run(camera_worker_async(cam_cfg, config, display_queue, stats_queue, show_display_flag, inference_queues))
     except Exception as e:
         logger.critical(f"Critical error in camera_worker for {cam_cfg.get('name', 'N/A')}. Process will exit. Error: {e}", exc_info=True)
@@ -1,19 +1,31 @@
 #car_tracker_manager.py
 import time
-from collections import deque
+import heapq
+import itertools
 import numpy as np
 # ### แก้ไข ###: Import ฟังก์ชันสำหรับหลายโซน
-from utils import is_point_in_any_polygon, get_bbox_center
+from utils import get_bbox_center
+from zone_index import ZoneIndex, NO_ZONE
 import json
 from datetime import datetime, timedelta
+from concurrent.futures import Future
 import cv2      # ### เพิ่ม ###: สำหรับการจัดการรูปภาพ (Image Processing)
 import base64   # ### เพิ่ม ###: สำหรับการเข้ารหัสรูปภาพเป็น Base64
+from evidence_encoder import EvidenceEncoder
+from track_record import TrackRecord, TrackStatus, PARKED_STATUSES, OCCUPANCY_STATUSES, ACTIVE_STATUSES
+from tracker_checkpoint import CHECKPOINT_VERSION, box_iou_matrix
+from detections import Detections
+
+# ชนิดของ timer ใน CarTrackerManager._timers
+TIMER_WARNING, TIMER_VIOLATION, TIMER_EXPIRY = range(3)
 
 class CarTrackerManager:
     # ### แก้ไข ###: เปลี่ยนชื่อ parameter จาก parking_zone_polygon เป็น parking_zones
-    def __init__(self, parking_zones, parking_time_limit_minutes, movement_threshold_px, movement_frame_window, warning_time_limit_minutes, fps, config):
+    def __init__(self, parking_zones, parking_time_limit_minutes, movement_threshold_px, movement_frame_window, warning_time_limit_minutes, fps, config, zone_index=None):
         # ### แก้ไข ###: เก็บเป็นลิสต์ของโซน
         self.parking_zones = [np.array(zone) for zone in parking_zones]
+        # ### เพิ่ม ###: label mask ของโซน (ใช้ตัวเดียวกับ worker ถ้าส่งมา) แทนการเรียก pointPolygonTest ทุกกล่อง
+        self.zone_index = zone_index if zone_index is not None else ZoneIndex(parking_zones)
         
         self.movement_threshold_px = movement_threshold_px
         self.movement_frame_window = movement_frame_window
@@ -54,36 +66,112 @@ class CarTrackerManager:
             self.parking_time_limit_seconds = parking_time_limit_minutes * 60
             self.warning_time_limit_seconds = warning_time_limit_minutes * 60
 
+        # ### เพิ่ม ###: encode ภาพหลักฐาน violation นอกลูปเฟรม
+        evidence_cfg = config.get('evidence_encoding', {})
+        self.evidence_encoder = EvidenceEncoder(
+            max_workers=evidence_cfg.get('max_workers', 2),
+            jpeg_quality=evidence_cfg.get('jpeg_quality', 95),
+            max_dimension=evidence_cfg.get('max_dimension')
+        )
+
         self.tracked_cars = {} 
+        self._reset_occupancy_counts()
+        self._reset_timers()
+        self._track_insert_counter = itertools.count()
         self.parking_sessions_count = 0 
         self.parking_statistics = []
         self.api_events_queue = []
 
+        # ### เพิ่ม ###: session ที่กู้คืนจาก checkpoint ซึ่งยังรอจับคู่กับ track ID ใหม่ {placeholder_id: bbox}
+        self.restore_match_iou = config.get('tracker_checkpoint', {}).get('match_iou', 0.3)
+        self._restored_bboxes = {}
+
     def reset(self):
         print("Resetting CarTrackerManager state...")
         self.tracked_cars.clear()
+        self._reset_occupancy_counts()
+        self._reset_timers()
+        self._restored_bboxes.clear()
         self.parking_statistics.clear()
         self.api_events_queue.clear()
 
     def _frame_to_datetime(self, frame_idx, current_frame_datetime=None):
         return datetime.utcnow()
 
+    # ### เพิ่ม ###: ตัวนับจำนวนรถตามสถานะ (ทั้งกล้องและแยกตามโซน) ปรับทุกครั้งที่สถานะหรือโซนของรถเปลี่ยน
+    # current_park ของ event และ HUD จึงอ่านได้ทันทีโดยไม่ต้องวนทุก track
+    def _reset_occupancy_counts(self):
+        self.occupancy_counts = dict.fromkeys(OCCUPANCY_STATUSES, 0)
+        self.zone_occupancy_counts = {}
+
+    def _count_occupancy(self, car_info, delta):
+        status = car_info.status
+        if status in self.occupancy_counts:
+            self.occupancy_counts[status] += delta
+            zone_counts = self.zone_occupancy_counts.setdefault(car_info.zone_id, dict.fromkeys(OCCUPANCY_STATUSES, 0))
+            zone_counts[status] += delta
+
+    def _set_status(self, car_info, status):
+        if car_info.status != status:
+            self._count_occupancy(car_info, -1)
+            car_info.status = status
+            self._count_occupancy(car_info, 1)
+
+    def _set_zone(self, car_info, zone_id):
+        if car_info.zone_id != zone_id:
+            self._count_occupancy(car_info, -1)
+            car_info.zone_id = zone_id
+            self._count_occupancy(car_info, 1)
+
+    def _remove_track(self, track_id):
+        self._count_occupancy(self.tracked_cars.pop(track_id), -1)
+
+    # ### เพิ่ม ###: timer (min-heap ตาม frame index) สำหรับ warning, violation และการลบ track ที่หายไป
+    # แต่ละเฟรมจะดูเฉพาะ timer ที่ถึงกำหนด แทนการวนทุก track; timer ที่ล้าสมัยจะถูกทิ้งตอนดึงออกมา
+    def _reset_timers(self):
+        self._timers = []
+        self._timer_seq = itertools.count()
+
+    def _schedule(self, deadline_frame, kind, track_id, car_info, session_start=None):
+        seq = next(self._timer_seq)
+        heapq.heappush(self._timers, (deadline_frame, seq, kind, track_id, car_info, session_start))
+        return seq
+
+    def _schedule_expiry(self, track_id, car_info):
+        timeout_seconds = self.parked_car_timeout_seconds if car_info.is_parking else 5.0
+        car_info.expiry_timer_seq = self._schedule(car_info.last_seen_frame_idx + timeout_seconds * self.fps, TIMER_EXPIRY, track_id, car_info)
+
+    def _schedule_session_timers(self, track_id, car_info):
+        start = car_info.parking_start_frame_idx
+        self._schedule(start + self.warning_time_limit_seconds * self.fps, TIMER_WARNING, track_id, car_info, start)
+        self._schedule(start + self.parking_time_limit_seconds * self.fps, TIMER_VIOLATION, track_id, car_info, start)
+
+    def _pop_due_timers(self, current_frame_idx):
+        """Pops every timer whose deadline (in frames) is before `current_frame_idx`."""
+        due = []
+        while self._timers and self._timers[0][0] < current_frame_idx:
+            due.append(heapq.heappop(self._timers))
+        return due
+
     # <<< แก้ไข: เปลี่ยนชื่อพารามิเตอร์และเพิ่ม original_frame
     def update(self, current_tracks, current_frame_idx, resized_frame, original_frame=None):
-        detected_ids_in_frame = {t['id'] for t in current_tracks}
+        # ### แก้ไข ###: รับ Detections (array เดียวทั้งเฟรม) - list ของ dict แบบเดิมจะถูกแปลงให้
+        detections = Detections.from_track_dicts(current_tracks)
+        track_ids = detections.ids.tolist()
+        detected_ids_in_frame = set(track_ids)
         alerts = []
 
-        for track_data in current_tracks:
-            track_id = track_data['id']
-            bbox = track_data['bbox']
-            conf = track_data['conf']
-            cls = track_data['cls']
+        # ### เพิ่ม ###: ส่ง session ที่กู้คืนจาก checkpoint ให้ track ID ใหม่ที่ bbox ทับกัน ก่อนประมวลผลตามปกติ
+        if self._restored_bboxes:
+            self._adopt_restored_tracks(detections)
+
+        for track_id, bbox, cls in zip(track_ids, detections.xyxy, detections.cls.tolist()):
             bbox_center_x, bbox_center_y = get_bbox_center(bbox)
 
             if track_id in self.tracked_cars:
                 car_info = self.tracked_cars[track_id]
-                if car_info['status'] in ['PARKED', 'WARNING_PARKED', 'VIOLATION']:
-                    last_center = get_bbox_center(car_info['current_bbox'])
+                if car_info.status in PARKED_STATUSES:
+                    last_center = get_bbox_center(car_info.current_bbox)
                     current_center = (bbox_center_x, bbox_center_y)
                     distance_moved = np.linalg.norm(np.array(last_center) - np.array(current_center))
                     
@@ -91,71 +179,66 @@ class CarTrackerManager:
                         print(f"WARNING: Potential ID switch for parked Car ID {track_id}. Dist: {distance_moved:.2f}px. Ignoring update.")
                         continue 
             
-            is_center_in_parking_zone = is_point_in_any_polygon((bbox_center_x, bbox_center_y), self.parking_zones)
+            zone_id = self.zone_index.zone_id_at((bbox_center_x, bbox_center_y))
+            is_center_in_parking_zone = zone_id != NO_ZONE
 
             if track_id not in self.tracked_cars:
-                self.tracked_cars[track_id] = {
-                    'current_bbox': bbox,
-                    'center_history': deque([(bbox_center_x, bbox_center_y, current_frame_idx)], maxlen=self.movement_frame_window),
-                    'last_seen_frame_idx': current_frame_idx,
-                    'is_still': False, 'is_parking': False,
-                    'parking_start_frame_idx': None, 'parking_start_time': None,
-                    'parking_session_id': None, 'has_left_zone': False,
-                    'status': 'NEW_DETECTION', 'cls': cls,
-                    'frames_outside_zone_count': 0,
-                    'api_event_sent_parked_start': False,
-                    'api_event_sent_warning': False,
-                    'api_event_sent_violation': False,
-                    'still_start_frame_idx': None
-                }
+                # ### แก้ไข ###: ใช้ TrackRecord (__slots__ + ring buffer numpy) แทน dict ต่อคัน
+                new_car = self.tracked_cars[track_id] = TrackRecord(bbox, cls, current_frame_idx, self.movement_frame_window, NO_ZONE)
+                new_car.insert_seq = next(self._track_insert_counter)
+                new_car.append_center(bbox_center_x, bbox_center_y, current_frame_idx)
+                self._schedule_expiry(track_id, new_car)
             
             car_info = self.tracked_cars[track_id]
-            car_info.update(current_bbox=bbox, last_seen_frame_idx=current_frame_idx)
-            car_info['center_history'].append((bbox_center_x, bbox_center_y, current_frame_idx))
+            car_info.current_bbox = bbox
+            car_info.last_seen_frame_idx = current_frame_idx
+            self._set_zone(car_info, zone_id)
+            car_info.append_center(bbox_center_x, bbox_center_y, current_frame_idx)
             
-            is_still = self._check_stillness(car_info['center_history'])
-            car_info['is_still'] = is_still
+            is_still = self._check_stillness(car_info)
+            car_info.is_still = is_still
 
-            if not car_info['is_parking']:
+            if not car_info.is_parking:
                 if is_center_in_parking_zone:
                     if is_still:
-                        if car_info.get('still_start_frame_idx') is None:
-                            car_info['still_start_frame_idx'] = current_frame_idx
-                            car_info['status'] = 'CONFIRMING_PARK'
+                        if car_info.still_start_frame_idx is None:
+                            car_info.still_start_frame_idx = current_frame_idx
+                            self._set_status(car_info, TrackStatus.CONFIRMING_PARK)
                         else:
-                            frames_still = current_frame_idx - car_info['still_start_frame_idx']
+                            frames_still = current_frame_idx - car_info.still_start_frame_idx
                             if frames_still >= self.parking_confirm_frames:
-                                car_info['is_parking'] = True
-                                car_info['parking_start_frame_idx'] = car_info['still_start_frame_idx']
-                                car_info['parking_start_time'] = datetime.utcnow() - timedelta(seconds=(frames_still / self.fps))
+                                car_info.is_parking = True
+                                car_info.parking_start_frame_idx = car_info.still_start_frame_idx
+                                car_info.parking_start_time = datetime.utcnow() - timedelta(seconds=(frames_still / self.fps))
                                 
                                 self.parking_sessions_count += 1
-                                car_info['parking_session_id'] = self.parking_sessions_count
-                                car_info['has_left_zone'] = False
-                                car_info['status'] = 'PARKED'
+                                car_info.parking_session_id = self.parking_sessions_count
+                                car_info.has_left_zone = False
+                                self._set_status(car_info, TrackStatus.PARKED)
                                 print(f"[{current_frame_idx}] Car ID {track_id} CONFIRMED parking.")
+                                self._schedule_session_timers(track_id, car_info)
                                 
-                                if not car_info['api_event_sent_parked_start']:
-                                    current_parked_count = len(self.get_current_parking_cars())
+                                if not car_info.api_event_sent_parked_start:
+                                    current_parked_count = self.get_current_parking_count()
                                     self.api_events_queue.append({
-                                        'event_type': 'parking_started', 'car_id': track_id,
+                                        'event_type': 'parking_started', 'car_id': track_id, 'zone_id': car_info.zone_id,
                                         'current_park': current_parked_count, 'total_parking_sessions': self.parking_sessions_count,
-                                        'entry_time': car_info['parking_start_time'], 'duration_minutes': 0.0,
+                                        'entry_time': car_info.parking_start_time, 'duration_minutes': 0.0,
                                         'is_violation': False
                                     })
-                                    car_info['api_event_sent_parked_start'] = True
+                                    car_info.api_event_sent_parked_start = True
                     else:
-                        car_info['still_start_frame_idx'] = None
-                        car_info['status'] = 'MOVING_IN_ZONE'
+                        car_info.still_start_frame_idx = None
+                        self._set_status(car_info, TrackStatus.MOVING_IN_ZONE)
                 else:
-                    car_info['still_start_frame_idx'] = None
-                    car_info['status'] = 'OUT_OF_ZONE'
+                    car_info.still_start_frame_idx = None
+                    self._set_status(car_info, TrackStatus.OUT_OF_ZONE)
             
-            elif car_info['is_parking']:
+            elif car_info.is_parking:
                 if not is_center_in_parking_zone:
-                    car_info['frames_outside_zone_count'] += 1
-                    if car_info['frames_outside_zone_count'] >= self.grace_period_frames_exit:
-                        parking_duration_frames = current_frame_idx - car_info['parking_start_frame_idx']
+                    car_info.frames_outside_zone_count += 1
+                    if car_info.frames_outside_zone_count >= self.grace_period_frames_exit:
+                        parking_duration_frames = current_frame_idx - car_info.parking_start_frame_idx
                         parking_duration_s = parking_duration_frames / self.fps
                         parking_duration_min = parking_duration_s / 60.0
 
@@ -167,221 +250,263 @@ class CarTrackerManager:
                             status_before_exit = 'VIOLATION_ENDED' if is_violation_status else 'PARKED_ENDED'
                             
                             self.parking_statistics.append({
-                                'session_id': car_info['parking_session_id'], 'car_id': track_id,
-                                'start_frame': car_info['parking_start_frame_idx'], 'end_frame': current_frame_idx,
+                                'session_id': car_info.parking_session_id, 'car_id': track_id,
+                                'start_frame': car_info.parking_start_frame_idx, 'end_frame': current_frame_idx,
                                 'duration_frames': parking_duration_frames, 'duration_s': parking_duration_s,
                                 'duration_min': parking_duration_min, 'final_status': status_before_exit
                             })
-                            print(f"[Parking Ended] Car ID {track_id}, Session ID {car_info['parking_session_id']}: Parked for {parking_duration_s:.2f} seconds.")
+                            print(f"[Parking Ended] Car ID {track_id}, Session ID {car_info.parking_session_id}: Parked for {parking_duration_s:.2f} seconds.")
                             
-                            current_parked_count = len([c_id for c_id, c in self.tracked_cars.items() if c_id != track_id and c['is_parking'] and c['status'] in ['PARKED', 'WARNING_PARKED', 'VIOLATION']])
+                            current_parked_count = self.get_current_parking_count() - (car_info.status in PARKED_STATUSES)
                             
                             self.api_events_queue.append({
                                 'event_type': 'parking_ended', 'car_id': track_id,
                                 'current_park': current_parked_count, 'total_parking_sessions': self.parking_sessions_count,
-                                'entry_time': car_info['parking_start_time'], 'exit_time': datetime.utcnow(),
+                                'entry_time': car_info.parking_start_time, 'exit_time': datetime.utcnow(),
                                 'duration_minutes': round(parking_duration_min, 2), 'is_violation': is_violation_status
                             })
 
-                        car_info.update(is_parking=False, parking_start_frame_idx=None, parking_start_time=None,
-                                        parking_session_id=None, has_left_zone=True, status='OUT_OF_ZONE',
-                                        frames_outside_zone_count=0, api_event_sent_parked_start=False,
-                                        api_event_sent_warning=False, api_event_sent_violation=False,
-                                        still_start_frame_idx=None)
+                        car_info.reset_session()
+                        car_info.has_left_zone = True
+                        car_info.frames_outside_zone_count = 0
+                        car_info.still_start_frame_idx = None
+                        self._set_status(car_info, TrackStatus.OUT_OF_ZONE)
+                        self._schedule_expiry(track_id, car_info)
                     else:
-                        car_info['status'] = 'OUT_OF_ZONE_GRACE_PERIOD'
+                        self._set_status(car_info, TrackStatus.OUT_OF_ZONE_GRACE_PERIOD)
                 else:
-                    car_info['frames_outside_zone_count'] = 0
+                    car_info.frames_outside_zone_count = 0
                     
                     if not is_still:
-                        if car_info['parking_start_frame_idx'] is not None:
-                            parking_duration_frames = current_frame_idx - car_info['parking_start_frame_idx']
+                        if car_info.parking_start_frame_idx is not None:
+                            parking_duration_frames = current_frame_idx - car_info.parking_start_frame_idx
                             parking_duration_s = parking_duration_frames / self.fps
                             parking_duration_min = parking_duration_s / 60.0
                             is_violation_status = (parking_duration_s > self.parking_time_limit_seconds)
 
                             self.parking_statistics.append({
-                                'session_id': car_info['parking_session_id'],
+                                'session_id': car_info.parking_session_id,
                                 'car_id': track_id,
-                                'start_frame': car_info['parking_start_frame_idx'],
+                                'start_frame': car_info.parking_start_frame_idx,
                                 'end_frame': current_frame_idx,
                                 'duration_frames': parking_duration_frames,
                                 'duration_s': parking_duration_s,
                                 'duration_min': parking_duration_min,
                                 'final_status': 'PARKED_MOVED_IN_ZONE'
                             })
-                            print(f"[Parking Ended - Moved In Zone] Car ID {track_id}, Session ID {car_info['parking_session_id']}: Parked for {parking_duration_s:.2f} seconds.")
+                            print(f"[Parking Ended - Moved In Zone] Car ID {track_id}, Session ID {car_info.parking_session_id}: Parked for {parking_duration_s:.2f} seconds.")
                             
-                            current_parked_count = len([c_id for c_id, c in self.tracked_cars.items() if c_id != track_id and c['is_parking'] and c['status'] in ['PARKED', 'WARNING_PARKED', 'VIOLATION']])
+                            current_parked_count = self.get_current_parking_count() - (car_info.status in PARKED_STATUSES)
                             
                             self.api_events_queue.append({
                                 'event_type': 'parking_ended_moved',
                                 'car_id': track_id,
                                 'current_park': current_parked_count,
                                 'total_parking_sessions': self.parking_sessions_count,
-                                'entry_time': car_info['parking_start_time'],
+                                'entry_time': car_info.parking_start_time,
                                 'exit_time': datetime.utcnow(),
                                 'duration_minutes': round(parking_duration_min, 2),
                                 'is_violation': is_violation_status
                             })
 
-                            car_info['is_parking'] = False
-                            car_info['parking_start_frame_idx'] = None
-                            car_info['parking_start_time'] = None
-                            car_info['parking_session_id'] = None 
-                            car_info['has_left_zone'] = False
-                            car_info['status'] = 'MOVING_IN_ZONE'
-                            car_info['api_event_sent_parked_start'] = False
-                            car_info['api_event_sent_warning'] = False
-                            car_info['api_event_sent_violation'] = False
+                            car_info.reset_session()
+                            car_info.has_left_zone = False
+                            self._set_status(car_info, TrackStatus.MOVING_IN_ZONE)
+                            self._schedule_expiry(track_id, car_info)
                         else:
-                            car_info['status'] = 'MOVING_IN_ZONE'
+                            self._set_status(car_info, TrackStatus.MOVING_IN_ZONE)
                     else:
-                        parking_duration_frames = current_frame_idx - car_info['parking_start_frame_idx']
-                        parking_duration_s = parking_duration_frames / self.fps
-                        parking_duration_min = parking_duration_s / 60.0
-                        
-                        if parking_duration_s > self.parking_time_limit_seconds:
-                            car_info['status'] = 'VIOLATION'
-                            if not car_info['api_event_sent_violation']:
-                                alerts.append(f"VIOLATION: Car ID {track_id} parked over {self.parking_time_limit_seconds/60:.2f} minutes ({parking_duration_min:.2f} min).")
-                                
-                                image_base64 = None
-                                try:
-                                    # ตรวจสอบว่ามีเฟรมต้นฉบับส่งมาหรือไม่
-                                    if original_frame is not None:
-                                        # Bbox ปัจจุบันอยู่ในพิกัดของเฟรมที่ย่อแล้ว (resized_frame)
-                                        x1_s, y1_s, x2_s, y2_s = map(int, car_info['current_bbox'])
-
-                                        # คำนวณอัตราส่วนเพื่อแปลงพิกัดกลับไปหาเฟรมต้นฉบับ
-                                        orig_h, orig_w = original_frame.shape[:2]
-                                        res_h, res_w = resized_frame.shape[:2]
-                                        scale_x = orig_w / res_w
-                                        scale_y = orig_h / res_h
-
-                                        # แปลงพิกัด bbox กลับไปเป็นพิกัดบนเฟรมต้นฉบับ
-                                        x1_o = int(x1_s * scale_x)
-                                        y1_o = int(y1_s * scale_y)
-                                        x2_o = int(x2_s * scale_x)
-                                        y2_o = int(y2_s * scale_y)
-
-                                        # Crop ภาพจากเฟรมต้นฉบับ (original_frame)
-                                        if x2_o > x1_o and y2_o > y1_o:
-                                            cropped_car_high_res = original_frame[y1_o:y2_o, x1_o:x2_o]
-                                            _, buffer = cv2.imencode('.jpg', cropped_car_high_res)
-                                            image_base64 = base64.b64encode(buffer).decode('utf-8')
-                                            print(f"Successfully captured high-resolution image for car ID {track_id}.")
-                                        else:
-                                            print(f"Warning: Invalid scaled bbox dimensions for car ID {track_id}. Cannot crop image.")
-                                    else:
-                                        print(f"Warning: Original frame not provided. Cannot capture high-resolution image.")
-                                except Exception as e:
-                                    print(f"ERROR: Could not capture image for car ID {track_id}: {e}")
-                                
-                                current_parked_count = len(self.get_current_parking_cars())
-                                self.api_events_queue.append({
-                                    'event_type': 'parking_violation_triggered',
-                                    'car_id': track_id, 'current_park': current_parked_count,
-                                    'total_parking_sessions': self.parking_sessions_count,
-                                    'entry_time': car_info['parking_start_time'],
-                                    'duration_minutes': round(parking_duration_min, 2),
-                                    'is_violation': True, 'image_base64': image_base64
-                                })
-                                car_info['api_event_sent_violation'] = True
-                        elif parking_duration_s > self.warning_time_limit_seconds:
-                            car_info['status'] = 'WARNING_PARKED'
-                            if not car_info['api_event_sent_warning']:
-                                alerts.append(f"WARNING: Car ID {track_id} parked over {self.warning_time_limit_seconds/60:.2f} minutes ({parking_duration_min:.2f} min).")
-                                current_parked_count = len(self.get_current_parking_cars())
-                                self.api_events_queue.append({
-                                    'event_type': 'parking_warning_triggered',
-                                    'car_id': track_id, 'current_park': current_parked_count,
-                                    'total_parking_sessions': self.parking_sessions_count,
-                                    'entry_time': car_info['parking_start_time'],
-                                    'duration_minutes': round(parking_duration_min, 2),
-                                    'is_violation': False
-                                })
-                                car_info['api_event_sent_warning'] = True
-                        else:
-                            car_info['status'] = 'PARKED'
-
-        # Clean up old tracks (cars that disappeared)
-        ids_to_remove = []
-        for track_id, car_info in list(self.tracked_cars.items()):
-            if track_id not in detected_ids_in_frame:
-                
-                # ### แก้ไข ###: เพิ่มเงื่อนไขพิเศษสำหรับรถที่จอดอยู่
-                is_parked = car_info.get('is_parking', False)
+                        self._update_parked_status(track_id, car_info, current_frame_idx, resized_frame, original_frame, alerts)
+
+        # ### แก้ไข ###: ใช้ timer ที่ถึงกำหนดแทนการวนทุก track ทุกเฟรม
+        # warning / violation ของรถที่จอดอยู่แต่ไม่ถูกตรวจพบในเฟรมนี้ (detection กระพริบ) ยังเกิดตรงเวลา
+        due_parked, ids_to_remove, reschedule = [], [], []
+        for timer in self._pop_due_timers(current_frame_idx):
+            deadline, seq, kind, track_id, car_info, session_start = timer
+            if self.tracked_cars.get(track_id) is not car_info:
+                continue
+            if kind == TIMER_EXPIRY:
+                if car_info.expiry_timer_seq != seq:
+                    continue
+                # คำนวณเวลาที่หายไป (เป็นวินาที) - รถที่จอดอยู่จะได้รับเวลา timeout นานกว่ามาก เพื่อป้องกันการ "ลืม" ID โดยไม่จำเป็น
+                seconds_disappeared = (current_frame_idx - car_info.last_seen_frame_idx) / self.fps
+                timeout_seconds = self.parked_car_timeout_seconds if car_info.is_parking else 5.0
+                if track_id in detected_ids_in_frame or seconds_disappeared <= timeout_seconds:
+                    reschedule.append((track_id, car_info))
+                else:
+                    ids_to_remove.append((car_info.insert_seq, track_id, car_info))
+            elif car_info.is_parking and car_info.parking_start_frame_idx == session_start and not car_info.api_event_sent_violation \
+                    and not (kind == TIMER_WARNING and car_info.api_event_sent_warning):
+                limit_seconds = self.warning_time_limit_seconds if kind == TIMER_WARNING else self.parking_time_limit_seconds
+                if (current_frame_idx - session_start) / self.fps <= limit_seconds:
+                    heapq.heappush(self._timers, timer)  # ปัดเศษ float - ยังไม่ถึงเวลาจริง ลองใหม่เฟรมถัดไป
+                elif car_info.last_seen_frame_idx != current_frame_idx and car_info.status in PARKED_STATUSES:
+                    due_parked.append((car_info.insert_seq, track_id, car_info))
+                else:
+                    # ถูกตรวจพบในเฟรมนี้แต่ไม่ได้ผ่าน _update_parked_status (เฟรมที่เพิ่งยืนยันการจอดโดย still_start เดิมเลยกำหนดแล้ว)
+                    # หรืออยู่ใน grace period - ตรวจใหม่เฟรมถัดไป ถ้ารถหายไปก่อนจะได้ไม่พลาด alert
+                    # (detection ที่ถูกข้ามเพราะ ID สลับไม่ได้อัปเดต last_seen จึงเข้า due_parked ด้านบนแล้ว)
+                    heapq.heappush(self._timers, timer)
+
+        for _, track_id, car_info in sorted(set(due_parked), key=lambda item: item[0]):
+            self._update_parked_status(track_id, car_info, current_frame_idx, resized_frame, original_frame, alerts)
+
+        for track_id, car_info in reschedule:
+            self._schedule_expiry(track_id, car_info)
+
+        # Clean up old tracks (cars that disappeared) - ตามลำดับที่ track ถูกเพิ่มเข้ามา
+        ids_to_remove.sort(key=lambda item: item[0])
+        for _, track_id, car_info in ids_to_remove:
+            is_parked = car_info.is_parking
+            seconds_disappeared = (current_frame_idx - car_info.last_seen_frame_idx) / self.fps
+            print(f"[Info] Removing track ID {track_id} after being lost for {seconds_disappeared:.2f} seconds (is_parked={is_parked}).")
+            if car_info.is_parking:
+                parking_duration_frames = current_frame_idx - car_info.parking_start_frame_idx
+                parking_duration_s = parking_duration_frames / self.fps
+                parking_duration_min = parking_duration_s / 60.0
                 
-                # คำนวณเวลาที่หายไป (เป็นวินาที)
-                frames_disappeared = current_frame_idx - car_info['last_seen_frame_idx']
-                seconds_disappeared = frames_disappeared / self.fps
-
-                # กำหนดเวลา timeout ตามสถานะ
-                # รถที่จอดอยู่จะได้รับเวลา timeout นานกว่ามาก เพื่อป้องกันการ "ลืม" ID โดยไม่จำเป็น
-                timeout_seconds = self.parked_car_timeout_seconds if is_parked else 5.0
-
-                if seconds_disappeared > timeout_seconds:
-                    print(f"[Info] Removing track ID {track_id} after being lost for {seconds_disappeared:.2f} seconds (is_parked={is_parked}).")
-                    if car_info['is_parking']:
-                        parking_duration_frames = current_frame_idx - car_info['parking_start_frame_idx']
-                        parking_duration_s = parking_duration_frames / self.fps
-                        parking_duration_min = parking_duration_s / 60.0
-                        
-                        if parking_duration_min < 1.0 and not self.debug_mode_enabled:
-                            print(f"[Info] Short parking session ({parking_duration_min:.2f} min) for disappeared Car ID {track_id} ignored. Correcting session count.")
-                            self.parking_sessions_count -= 1
-                        else:
-                            is_violation_status = (parking_duration_s > self.parking_time_limit_seconds)
-                            status_before_disappeared = 'VIOLATION_DISAPPEARED' if is_violation_status else 'PARKED_DISAPPEARED'
-                            self.parking_statistics.append({
-                                'session_id': car_info['parking_session_id'], 'car_id': track_id,
-                                'start_frame': car_info['parking_start_frame_idx'], 'end_frame': current_frame_idx,
-                                'duration_frames': parking_duration_frames, 'duration_s': parking_duration_s,
-                                'duration_min': parking_duration_min, 'final_status': status_before_disappeared
-                            })
-                            print(f"[Parking Ended - Disappeared] Car ID {track_id}, Session ID {car_info['parking_session_id']}: Parked for {parking_duration_s:.2f} seconds.")
-                            current_parked_count = len([c_id for c_id, c in self.tracked_cars.items() if c_id != track_id and c['is_parking'] and c['status'] in ['PARKED', 'WARNING_PARKED', 'VIOLATION']])
-                            self.api_events_queue.append({
-                                'event_type': 'parking_ended_disappeared', 'car_id': track_id,
-                                'current_park': current_parked_count, 'total_parking_sessions': self.parking_sessions_count,
-                                'entry_time': car_info['parking_start_time'], 'exit_time': datetime.utcnow(),
-                                'duration_minutes': round(parking_duration_min, 2), 'is_violation': is_violation_status
-                            })
-                    ids_to_remove.append(track_id)
-
-        for track_id in ids_to_remove:
-            if track_id in self.tracked_cars:
-                del self.tracked_cars[track_id]
+                if parking_duration_min < 1.0 and not self.debug_mode_enabled:
+                    print(f"[Info] Short parking session ({parking_duration_min:.2f} min) for disappeared Car ID {track_id} ignored. Correcting session count.")
+                    self.parking_sessions_count -= 1
+                else:
+                    is_violation_status = (parking_duration_s > self.parking_time_limit_seconds)
+                    status_before_disappeared = 'VIOLATION_DISAPPEARED' if is_violation_status else 'PARKED_DISAPPEARED'
+                    self.parking_statistics.append({
+                        'session_id': car_info.parking_session_id, 'car_id': track_id,
+                        'start_frame': car_info.parking_start_frame_idx, 'end_frame': current_frame_idx,
+                        'duration_frames': parking_duration_frames, 'duration_s': parking_duration_s,
+                        'duration_min': parking_duration_min, 'final_status': status_before_disappeared
+                    })
+                    print(f"[Parking Ended - Disappeared] Car ID {track_id}, Session ID {car_info.parking_session_id}: Parked for {parking_duration_s:.2f} seconds.")
+                    current_parked_count = self.get_current_parking_count() - (car_info.status in PARKED_STATUSES)
+                    self.api_events_queue.append({
+                        'event_type': 'parking_ended_disappeared', 'car_id': track_id,
+                        'current_park': current_parked_count, 'total_parking_sessions': self.parking_sessions_count,
+                        'entry_time': car_info.parking_start_time, 'exit_time': datetime.utcnow(),
+                        'duration_minutes': round(parking_duration_min, 2), 'is_violation': is_violation_status
+                    })
+        for _, track_id, _ in ids_to_remove:
+            self._remove_track(track_id)
 
         return alerts
 
-    def _check_stillness(self, center_history):
-        if len(center_history) < self.movement_frame_window: return False
-        dist = np.linalg.norm(np.array(center_history[0][:2]) - np.array(center_history[-1][:2]))
-        return dist < self.movement_threshold_px
+    # ### เพิ่ม ###: ตรวจเวลาจอดของรถที่จอดนิ่งอยู่ (เรียกจากลูป detection และจาก timer ของรถที่ไม่ถูกตรวจพบ)
+    def _update_parked_status(self, track_id, car_info, current_frame_idx, resized_frame, original_frame, alerts):
+        parking_duration_frames = current_frame_idx - car_info.parking_start_frame_idx
+        parking_duration_s = parking_duration_frames / self.fps
+        parking_duration_min = parking_duration_s / 60.0
+        
+        if parking_duration_s > self.parking_time_limit_seconds:
+            self._set_status(car_info, TrackStatus.VIOLATION)
+            if not car_info.api_event_sent_violation:
+                alerts.append(f"VIOLATION: Car ID {track_id} parked over {self.parking_time_limit_seconds/60:.2f} minutes ({parking_duration_min:.2f} min).")
+                
+                # ### แก้ไข ###: ส่ง crop + encode ภาพหลักฐานไปทำใน EvidenceEncoder (thread pool) แทนการทำในลูปเฟรม
+                # event จะถูกส่งออกเมื่อ Future ของภาพเสร็จ (ดู get_parking_events_for_api)
+                image_jpeg = None
+                if original_frame is not None:
+                    image_jpeg = self.evidence_encoder.submit(original_frame, car_info.current_bbox, resized_frame.shape)
+                else:
+                    print(f"Warning: Original frame not provided. Cannot capture high-resolution image.")
+                
+                current_parked_count = self.get_current_parking_count()
+                self.api_events_queue.append({
+                    'event_type': 'parking_violation_triggered',
+                    'car_id': track_id, 'zone_id': car_info.zone_id, 'current_park': current_parked_count,
+                    'total_parking_sessions': self.parking_sessions_count,
+                    'entry_time': car_info.parking_start_time,
+                    'duration_minutes': round(parking_duration_min, 2),
+                    'is_violation': True, 'image_jpeg': image_jpeg
+                })
+                car_info.api_event_sent_violation = True
+        elif parking_duration_s > self.warning_time_limit_seconds:
+            self._set_status(car_info, TrackStatus.WARNING_PARKED)
+            if not car_info.api_event_sent_warning:
+                alerts.append(f"WARNING: Car ID {track_id} parked over {self.warning_time_limit_seconds/60:.2f} minutes ({parking_duration_min:.2f} min).")
+                current_parked_count = self.get_current_parking_count()
+                self.api_events_queue.append({
+                    'event_type': 'parking_warning_triggered',
+                    'car_id': track_id, 'zone_id': car_info.zone_id, 'current_park': current_parked_count,
+                    'total_parking_sessions': self.parking_sessions_count,
+                    'entry_time': car_info.parking_start_time,
+                    'duration_minutes': round(parking_duration_min, 2),
+                    'is_violation': False
+                })
+                car_info.api_event_sent_warning = True
+        else:
+            self._set_status(car_info, TrackStatus.PARKED)
+
+    def _check_stillness(self, car_info):
+        if car_info.history_len < self.movement_frame_window: return False
+        return car_info.center_displacement() < self.movement_threshold_px
 
     def get_parking_count(self):
         return self.parking_sessions_count
 
     def get_current_parking_cars(self):
-        parking_statuses = ['PARKED', 'WARNING_PARKED', 'VIOLATION']
-        return [id for id, info in self.tracked_cars.items() if info.get('is_parking') and info.get('status') in parking_statuses]
+        return [id for id, info in self.tracked_cars.items() if info.is_parking and info.status in PARKED_STATUSES]
+
+    def get_current_parking_count(self):
+        """Same as len(get_current_parking_cars()), read from the running counters."""
+        return sum(self.occupancy_counts[status] for status in PARKED_STATUSES)
+
+    def get_occupancy_counts(self, zone_id=None):
+        """Number of PARKED / WARNING_PARKED / VIOLATION cars on this camera, or in one zone if `zone_id` is given."""
+        counts = self.occupancy_counts if zone_id is None else self.zone_occupancy_counts.get(zone_id, {})
+        return {status.name: counts.get(status, 0) for status in PARKED_STATUSES}
+
+    def _open_session_count(self):
+        """Number of cars with is_parking=True (parked, or parked and inside the exit grace period)."""
+        return sum(self.occupancy_counts.values())
     
+    # ### เพิ่ม ###: สรุปสถานะของฉากสำหรับ AdaptiveFrameSampler
+    def get_scene_state(self):
+        """
+        Returns 'ACTIVE' if any car is moving in, confirming or leaving a parking zone,
+        'PARKED' if the only cars in the zones are parked, or 'EMPTY' if no car is in a zone.
+        """
+        has_parked_car = False
+        for info in self.tracked_cars.values():
+            if info.status in ACTIVE_STATUSES:
+                return 'ACTIVE'
+            if info.status in PARKED_STATUSES:
+                has_parked_car = True
+        return 'PARKED' if has_parked_car else 'EMPTY'
+
     def get_parking_statistics(self):
         return self.parking_statistics
 
+    # ### เพิ่ม ###: สถานะแบบตัวเลขของหลาย track พร้อมกัน (ใช้กับ track log)
+    def get_status_codes(self, track_ids):
+        """TrackStatus value of each id as an int8 array, -1 for ids that are not tracked."""
+        return np.array([int(self.tracked_cars[track_id].status) if track_id in self.tracked_cars else -1 for track_id in track_ids], dtype=np.int8)
+
     def get_car_status(self, track_id, current_frame_idx):
         car_info = self.tracked_cars.get(track_id)
         if not car_info: return {'status': 'OUT_OF_SCENE', 'time_parked_str': ''}
-        status = car_info.get('status', 'UNKNOWN')
+        status = car_info.status.name
         time_parked_str = ""
-        if car_info.get('is_parking') and car_info.get('parking_start_frame_idx') is not None:
-            parking_duration_s = (current_frame_idx - car_info['parking_start_frame_idx']) / self.fps
+        if car_info.is_parking and car_info.parking_start_frame_idx is not None:
+            parking_duration_s = (current_frame_idx - car_info.parking_start_frame_idx) / self.fps
             minutes, seconds = divmod(int(parking_duration_s), 60)
             time_parked_str = f"{minutes:02d}m {seconds:02d}s"
         return {'status': status, 'time_parked_str': time_parked_str}
 
+    # ### เพิ่ม ###: ข้อมูลขั้นต่ำสำหรับวาด overlay นอก worker (ส่งผ่านคิวได้ ไม่มี numpy array)
+    def get_render_snapshot(self, current_frame_idx):
+        tracks = []
+        for track_id, car_info in self.tracked_cars.items():
+            if car_info.current_bbox is not None:
+                x1, y1, x2, y2 = map(int, car_info.current_bbox)
+                status_info = self.get_car_status(track_id, current_frame_idx)
+                tracks.append((track_id, x1, y1, x2, y2, status_info['status'], status_info['time_parked_str']))
+        return {
+            'tracks': tracks,
+            'current_parked': self.get_current_parking_count(),
+            'occupancy': self.get_occupancy_counts(),
+            'total_sessions': self.get_parking_count()
+        }
+
     def save_all_parking_sessions(self, output_dir, final_frame_idx):
         if output_dir:
             output_file_path = output_dir / "parking_sessions_summary.json"
@@ -390,11 +515,11 @@ class CarTrackerManager:
             return
         
         for track_id, car_info in list(self.tracked_cars.items()):
-            if car_info['is_parking']:
-                parking_duration_frames = final_frame_idx - car_info['parking_start_frame_idx']
+            if car_info.is_parking:
+                parking_duration_frames = final_frame_idx - car_info.parking_start_frame_idx
                 parking_duration_s = parking_duration_frames / self.fps
                 
-                status_on_shutdown = car_info['status'] 
+                status_on_shutdown = car_info.status.name 
                 if parking_duration_s > self.parking_time_limit_seconds:
                     status_on_shutdown = 'VIOLATION_SHUTDOWN'
                 elif parking_duration_s > self.warning_time_limit_seconds:
@@ -403,25 +528,25 @@ class CarTrackerManager:
                     status_on_shutdown = 'PARKED_SHUTDOWN'
 
                 self.parking_statistics.append({
-                    'session_id': car_info['parking_session_id'],
+                    'session_id': car_info.parking_session_id,
                     'car_id': track_id,
-                    'start_frame': car_info['parking_start_frame_idx'],
+                    'start_frame': car_info.parking_start_frame_idx,
                     'end_frame': final_frame_idx,
                     'duration_frames': parking_duration_frames,
                     'duration_s': parking_duration_s,
                     'duration_min': parking_duration_s / 60.0,
                     'final_status': status_on_shutdown
                 })
-                print(f"[Parking Ended - App Shutdown] Car ID {track_id}, Session ID {car_info['parking_session_id']}: Parked for {parking_duration_s:.2f} seconds.")
+                print(f"[Parking Ended - App Shutdown] Car ID {track_id}, Session ID {car_info.parking_session_id}: Parked for {parking_duration_s:.2f} seconds.")
                 
-                current_parked_count = len([c_id for c_id, c in self.tracked_cars.items() if c_id != track_id and c['is_parking'] and c['status'] in ['PARKED', 'WARNING_PARKED', 'VIOLATION']])
+                current_parked_count = self.get_current_parking_count() - (car_info.status in PARKED_STATUSES)
                 
                 self.api_events_queue.append({
                     'event_type': 'parking_ended_shutdown',
                     'car_id': track_id,
                     'current_park': current_parked_count,
                     'total_parking_sessions': self.parking_sessions_count,
-                    'entry_time': car_info['parking_start_time'],
+                    'entry_time': car_info.parking_start_time,
                     'exit_time': datetime.utcnow(),
                     'duration_minutes': round(parking_duration_s / 60.0, 2),
                     'is_violation': (parking_duration_s > self.parking_time_limit_seconds)
@@ -438,11 +563,11 @@ class CarTrackerManager:
         all_sessions_for_summary = list(self.parking_statistics) 
 
         for track_id, car_info in list(self.tracked_cars.items()):
-            if car_info['is_parking']:
-                parking_duration_frames = total_frames - car_info['parking_start_frame_idx']
+            if car_info.is_parking:
+                parking_duration_frames = total_frames - car_info.parking_start_frame_idx
                 parking_duration_s = parking_duration_frames / self.fps
                 
-                status_on_summary = car_info['status'] 
+                status_on_summary = car_info.status.name 
                 if parking_duration_s > self.parking_time_limit_seconds:
                     status_on_summary = 'VIOLATION_ACTIVE'
                 elif parking_duration_s > self.warning_time_limit_seconds:
@@ -451,9 +576,9 @@ class CarTrackerManager:
                     status_on_summary = 'PARKED_ACTIVE'
 
                 all_sessions_for_summary.append({
-                    'session_id': car_info['parking_session_id'],
+                    'session_id': car_info.parking_session_id,
                     'car_id': track_id,
-                    'start_frame': car_info['parking_start_frame_idx'],
+                    'start_frame': car_info.parking_start_frame_idx,
                     'end_frame': total_frames,
                     'duration_frames': parking_duration_frames,
                     'duration_s': parking_duration_s,
@@ -482,8 +607,8 @@ class CarTrackerManager:
 
         for track_id in active_car_ids:
             car_info = self.tracked_cars.get(track_id)
-            if car_info and car_info.get('is_parking'):
-                parking_duration_frames = final_frame_idx - car_info['parking_start_frame_idx']
+            if car_info and car_info.is_parking:
+                parking_duration_frames = final_frame_idx - car_info.parking_start_frame_idx
                 parking_duration_s = parking_duration_frames / self.fps
                 parking_duration_min = parking_duration_s / 60.0
                 is_violation_status = (parking_duration_s > self.parking_time_limit_seconds)
@@ -491,26 +616,151 @@ class CarTrackerManager:
                 # เพิ่มข้อมูลลงในสถิติ
                 final_status = 'VIOLATION_ENDED_ON_SHUTDOWN' if is_violation_status else 'PARKED_ENDED_ON_SHUTDOWN'
                 self.parking_statistics.append({
-                    'session_id': car_info['parking_session_id'], 'car_id': track_id,
-                    'start_frame': car_info['parking_start_frame_idx'], 'end_frame': final_frame_idx,
+                    'session_id': car_info.parking_session_id, 'car_id': track_id,
+                    'start_frame': car_info.parking_start_frame_idx, 'end_frame': final_frame_idx,
                     'duration_s': parking_duration_s, 'duration_min': parking_duration_min,
                     'final_status': final_status
                 })
 
                 # เพิ่ม event เข้าคิวเพื่อส่งไปที่ API
-                current_parked_count = len([c_id for c_id, c in self.tracked_cars.items() if c_id != track_id and c.get('is_parking')])
+                current_parked_count = self._open_session_count() - 1
                 self.api_events_queue.append({
                     'event_type': 'parking_ended_shutdown', 'car_id': track_id,
                     'current_park': current_parked_count, 'total_parking_sessions': self.parking_sessions_count,
-                    'entry_time': car_info['parking_start_time'], 'exit_time': datetime.utcnow(),
+                    'entry_time': car_info.parking_start_time, 'exit_time': datetime.utcnow(),
                     'duration_minutes': round(parking_duration_min, 2), 'is_violation': is_violation_status
                 })
-                print(f"[Parking Ended - Video End] Car ID {track_id}, Session ID {car_info['parking_session_id']}: Parked for {parking_duration_s:.2f} seconds.")
+                print(f"[Parking Ended - Video End] Car ID {track_id}, Session ID {car_info.parking_session_id}: Parked for {parking_duration_s:.2f} seconds.")
 
         # ล้างข้อมูลรถที่ติดตามทั้งหมดหลังประมวลผลเสร็จ
         self.tracked_cars.clear()
+        self._reset_occupancy_counts()
+        self._reset_timers()
+        self._restored_bboxes.clear()
 
-    def get_parking_events_for_api(self):
-        events = list(self.api_events_queue)
-        self.api_events_queue.clear()
+    # ### เพิ่ม ###: checkpoint / restore ของ session ที่เปิดอยู่ เพื่อให้ worker ที่ restart (crash, แก้ config, reboot) ทำงานต่อจากเดิม
+    def export_state(self, current_frame_idx):
+        """
+        JSON-ready snapshot of the open parking sessions and the session counter, for
+        tracker_checkpoint.CheckpointWriter. Only cars with is_parking=True are kept; every other
+        track is rebuilt from the detections within a few frames after a restart.
+        """
+        sessions = []
+        for car_info in self.tracked_cars.values():
+            if not car_info.is_parking:
+                continue
+            sessions.append({
+                'bbox': [float(v) for v in car_info.current_bbox],
+                'cls': float(car_info.cls),
+                'status': car_info.status.name,
+                'parked_seconds': (current_frame_idx - car_info.parking_start_frame_idx) / self.fps,
+                'parking_start_time': car_info.parking_start_time.isoformat() if car_info.parking_start_time else None,
+                'parking_session_id': car_info.parking_session_id,
+                'frames_outside_zone_count': car_info.frames_outside_zone_count,
+                'api_event_sent_parked_start': car_info.api_event_sent_parked_start,
+                'api_event_sent_warning': car_info.api_event_sent_warning,
+                'api_event_sent_violation': car_info.api_event_sent_violation,
+            })
+        return {
+            'version': CHECKPOINT_VERSION, 'saved_at': time.time(), 'frame_idx': current_frame_idx,
+            'parking_sessions_count': self.parking_sessions_count, 'sessions': sessions
+        }
+
+    def restore_state(self, state, current_frame_idx=0):
+        """
+        Loads the sessions of an export_state() snapshot into a fresh manager, as placeholder
+        tracks with negative ids. The time since the snapshot counts as parked time. On the next
+        update() each placeholder is handed to the new track id whose bbox overlaps it most
+        (IoU >= restore_match_iou), keeping its sent-event flags, so no second 'parking_started'
+        is sent. A placeholder that is never matched expires like any lost parked car.
+        Returns the number of restored sessions.
+        """
+        elapsed_seconds = max(0.0, time.time() - state['saved_at'])
+        self.parking_sessions_count = max(self.parking_sessions_count, state['parking_sessions_count'])
+        for i, session in enumerate(state['sessions']):
+            track_id = -(i + 1)  # ID จาก tracker เป็นบวกเสมอ จึงไม่ชนกัน
+            bbox = np.array(session['bbox'], dtype=np.float64)
+            center_x, center_y = get_bbox_center(bbox)
+            car_info = TrackRecord(bbox, session['cls'], current_frame_idx, self.movement_frame_window, self.zone_index.zone_id_at((center_x, center_y)))
+            # เติมประวัติด้วยตำแหน่งเดิม เพื่อให้รถที่ยังจอดนิ่งถูกนับว่า "นิ่ง" ตั้งแต่ detection แรก
+            for _ in range(max(1, self.movement_frame_window)):
+                car_info.append_center(center_x, center_y, current_frame_idx)
+            car_info.is_still = True
+            car_info.is_parking = True
+            car_info.parking_start_frame_idx = current_frame_idx - int(round((session['parked_seconds'] + elapsed_seconds) * self.fps))
+            car_info.still_start_frame_idx = car_info.parking_start_frame_idx
+            car_info.parking_start_time = datetime.fromisoformat(session['parking_start_time']) if session['parking_start_time'] else None
+            car_info.parking_session_id = session['parking_session_id']
+            car_info.status = TrackStatus[session['status']]
+            car_info.frames_outside_zone_count = session['frames_outside_zone_count']
+            car_info.api_event_sent_parked_start = session['api_event_sent_parked_start']
+            car_info.api_event_sent_warning = session['api_event_sent_warning']
+            car_info.api_event_sent_violation = session['api_event_sent_violation']
+            self._load_track(track_id, car_info)
+            self._restored_bboxes[track_id] = bbox
+        print(f"[Info] Restored {len(state['sessions'])} parking sessions from checkpoint ({elapsed_seconds:.0f}s old).")
+        return len(state['sessions'])
+
+    def _adopt_restored_tracks(self, detections):
+        # placeholder ที่หมดเวลาไปแล้ว (ถูกลบแบบรถหาย) ไม่ต้องจับคู่อีก
+        for placeholder_id in [t for t in self._restored_bboxes if not self._has_track(t)]:
+            del self._restored_bboxes[placeholder_id]
+        new_rows = [row for row, track_id in enumerate(detections.ids.tolist()) if not self._has_track(track_id)]
+        if not new_rows or not self._restored_bboxes:
+            return
+        new_ids = detections.ids[new_rows].tolist()
+        placeholder_ids = list(self._restored_bboxes)
+        iou = box_iou_matrix(detections.xyxy[new_rows], [self._restored_bboxes[t] for t in placeholder_ids])
+        # จับคู่แบบ greedy จากคู่ที่ IoU สูงสุดก่อน
+        for row, col in zip(*np.unravel_index(np.argsort(-iou, axis=None, kind='stable'), iou.shape)):
+            if iou[row, col] < self.restore_match_iou:
+                break
+            placeholder_id, track_id = placeholder_ids[col], new_ids[row]
+            if placeholder_id in self._restored_bboxes and not self._has_track(track_id):
+                self._rekey_track(placeholder_id, track_id)
+                del self._restored_bboxes[placeholder_id]
+                print(f"[Info] Restored track {placeholder_id} matched to Car ID {track_id} (IoU {iou[row, col]:.2f}).")
+
+    # --- จุดที่ engine แต่ละแบบเก็บ track ต่างกัน (VectorizedCarTrackerManager override) ---
+    def _has_track(self, track_id):
+        return track_id in self.tracked_cars
+
+    def _load_track(self, track_id, car_info):
+        car_info.insert_seq = next(self._track_insert_counter)
+        self.tracked_cars[track_id] = car_info
+        self._count_occupancy(car_info, 1)
+        self._schedule_expiry(track_id, car_info)
+        self._schedule_session_timers(track_id, car_info)
+
+    def _rekey_track(self, old_track_id, new_track_id):
+        # นับเป็น track ใหม่ (ลำดับต่อท้าย) - timer ของ ID เดิมจะถูกทิ้งเองเมื่อถึงกำหนด
+        car_info = self.tracked_cars.pop(old_track_id)
+        car_info.insert_seq = next(self._track_insert_counter)
+        self.tracked_cars[new_track_id] = car_info
+        self._schedule_expiry(new_track_id, car_info)
+        if car_info.is_parking:
+            self._schedule_session_timers(new_track_id, car_info)
+
+    def get_parking_events_for_api(self, wait=False):
+        """
+        Returns the queued events in order. An event whose evidence image is still being encoded
+        (and every event after it) stays queued until the encoding finishes, unless `wait` is True.
+        """
+        events = []
+        while self.api_events_queue:
+            event = self.api_events_queue[0]
+            image_future = event.get('image_jpeg')
+            if isinstance(image_future, Future):
+                if not image_future.done() and not wait:
+                    break
+                try:
+                    event['image_jpeg'] = image_future.result()
+                    if event['image_jpeg'] is not None:
+                        print(f"Successfully captured high-resolution image for car ID {event['car_id']}.")
+                    else:
+                        print(f"Warning: Invalid scaled bbox dimensions for car ID {event['car_id']}. Cannot crop image.")
+                except Exception as e:
+                    print(f"ERROR: Could not capture image for car ID {event['car_id']}: {e}")
+                    event['image_jpeg'] = None
+            events.append(self.api_events_queue.pop(0))
         return events
@@ -1,8 +1,9 @@
 #database.py
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Boolean, JSON , Text
+from sqlalchemy import create_engine, inspect, or_, text, Column, Integer, String, DateTime, Float, Boolean, JSON , Text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, deferred, column_property
 from datetime import datetime
+from evidence_store import evidence_store
 
 DATABASE_URL = "sqlite:///./data/ซอยตั้งสิน_BG_19486.sqlite" #Path batabase data folder
 
@@ -30,13 +31,21 @@ class DBParkingViolation(Base):
     is_violation= Column(Boolean)
     total_parking_sessions = Column(Integer, nullable=True)
     total_parking_sessions_hourly = Column(Integer, nullable=True)
-    # ### FIX: เพิ่มคอลัมน์สำหรับเก็บภาพ Base64 ###
-    image_base64 = Column(Text, nullable=True)
+    # ภาพหลักฐานเก็บใน evidence_store (POST /evidence/) - event อ้างถึงด้วย SHA-256
+    image_sha256 = Column(String(64), nullable=True)
+    # ภาพ Base64 ของข้อมูลเก่า - ย้ายไป evidence_store ตอนเริ่ม app (move_inline_images)
+    # deferred: query ปกติไม่อ่านคอลัมน์นี้
+    image_base64 = deferred(Column(Text, nullable=True))
     def __repr__(self):
         return (f"<ParkingViolation(id={self.id}, car_id={self.car_id}, "
                 f"camera_id='{self.camera_id}', event_type='{self.event_type}', "
                 f"timestamp='{self.timestamp}')>")
     
+# คำนวณใน SQL จึงรู้ว่ามีภาพโดยไม่ต้องโหลดภาพ
+DBParkingViolation.has_image = column_property(
+    or_(DBParkingViolation.image_sha256.isnot(None), DBParkingViolation.image_base64.isnot(None))
+)
+
 class DBTableOccupancy(Base):
     __tablename__= "table_occupancy"
     id= Column(Integer, primary_key=True, index=True)
@@ -70,8 +79,46 @@ class DBChilledBasketAlert(Base):
 # Function to create tables (call this once when the app starts)
 def create_db_tables():
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
     print("Database tables created/updated.")
 
+# create_all ไม่เพิ่มคอลัมน์ใหม่ให้ตารางที่มีอยู่แล้ว - เพิ่มเองสำหรับฐานข้อมูลเดิม
+def add_missing_columns():
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"))
+                    print(f"Added column {table.name}.{column.name}.")
+
+# ย้ายภาพ Base64 ที่ยังอยู่ใน parking_violations (ข้อมูลเก่า) ไป evidence_store และอ้างถึงด้วย image_sha256
+# ทำทีละ batch (commit ต่อ batch) ภาพที่ถอดรหัสไม่ได้คงไว้ในตาราง
+def move_inline_images(batch_size=200):
+    moved = 0
+    last_id = 0
+    with SessionLocal() as db:
+        while True:
+            rows = db.query(DBParkingViolation.id, DBParkingViolation.image_base64)\
+                .filter(DBParkingViolation.id > last_id, DBParkingViolation.image_base64.isnot(None))\
+                .order_by(DBParkingViolation.id).limit(batch_size).all()
+            if not rows:
+                break
+            for row_id, image_base64 in rows:
+                sha256 = evidence_store.put_base64(image_base64)
+                if sha256 is not None:
+                    db.query(DBParkingViolation).filter(DBParkingViolation.id == row_id)\
+                        .update({"image_sha256": sha256, "image_base64": None}, synchronize_session=False)
+                    moved += 1
+            db.commit()
+            last_id = rows[-1].id
+    if moved:
+        print(f"Moved {moved} evidence images to {evidence_store.root}.")
+    return moved
+
 # Dependency for FastAPI to get DB session
 def get_db():
     db= SessionLocal()
@@ -0,0 +1,37 @@
+# detection_tracker.py
+import numpy as np
+
+from ultralytics.tracker.track import TRACKER_MAP
+from ultralytics.yolo.engine.results import Boxes
+from ultralytics.yolo.utils import IterableSimpleNamespace, yaml_load
+from ultralytics.yolo.utils.checks import check_yaml
+
+
+class DetectionTracker:
+    """
+    Runs the Ultralytics tracker (ByteTrack / BoT-SORT) on detections that were produced
+    outside of `model.track` (e.g. by the shared inference server).
+    Behaves like `model.track(..., persist=True)` for a single camera.
+    """
+    def __init__(self, tracker_config_file="bytetrack.yaml", frame_rate=30):
+        tracker_cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker_config_file)))
+        if tracker_cfg.tracker_type not in TRACKER_MAP:
+            raise ValueError(f"Unsupported tracker type: {tracker_cfg.tracker_type}")
+        self.tracker = TRACKER_MAP[tracker_cfg.tracker_type](args=tracker_cfg, frame_rate=int(frame_rate))
+
+    def update(self, detections, frame):
+        """
+        Args:
+            detections (np.ndarray): (N, 6) array of [x1, y1, x2, y2, conf, cls] in frame coordinates.
+            frame (np.ndarray): The frame the detections belong to (used by BoT-SORT for motion compensation).
+        Returns:
+            np.ndarray: (M, 8) array of [x1, y1, x2, y2, track_id, conf, cls, det_idx].
+        """
+        # เหมือนกับ model.track: ถ้าไม่มี detection ในเฟรมนี้ จะไม่อัปเดต tracker
+        if detections is None or len(detections) == 0:
+            return np.empty((0, 8), dtype=np.float32)
+        boxes = Boxes(np.asarray(detections, dtype=np.float32), frame.shape[:2])
+        tracks = self.tracker.update(boxes, frame)
+        if len(tracks) == 0:
+            return np.empty((0, 8), dtype=np.float32)
+        return tracks
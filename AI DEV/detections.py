@@ -0,0 +1,71 @@
+# detections.py
+import numpy as np
+
+
+class Detections:
+    """
+    Tracked detections of one frame, backed by a single contiguous (N, 7) float64 array of
+    [x1, y1, x2, y2, track_id, conf, cls] rows (the layout of Ultralytics `boxes.data` and of
+    DetectionTracker.update()[:, :7]).
+
+    The columns are numpy views, so class / zone filtering are boolean masks over the whole
+    frame and CarTrackerManager reads ids and boxes straight from the array instead of from a
+    dict per vehicle.
+    """
+    __slots__ = ('data',)
+    COLUMNS = 7
+
+    def __init__(self, data=None):
+        if data is None:
+            data = np.empty((0, self.COLUMNS))
+        self.data = np.ascontiguousarray(data, dtype=np.float64).reshape(-1, self.COLUMNS)
+
+    @classmethod
+    def from_tracker_output(cls, raw_tracks):
+        """Copies tracker output into a new Detections with the boxes truncated to whole pixels (as the worker always did)."""
+        detections = cls(np.array(raw_tracks, dtype=np.float64).reshape(-1, cls.COLUMNS))
+        np.trunc(detections.data[:, :4], out=detections.data[:, :4])
+        return detections
+
+    @classmethod
+    def from_track_dicts(cls, tracks):
+        """Builds Detections from the legacy list of {'id', 'bbox', 'conf', 'cls'} dicts."""
+        if isinstance(tracks, Detections):
+            return tracks
+        data = np.empty((len(tracks), cls.COLUMNS))
+        for row, track in enumerate(tracks):
+            data[row, :4] = track['bbox']
+            data[row, 4:] = (track['id'], track.get('conf', -1), track.get('cls', -1))
+        return cls(data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, mask):
+        """Subset of the rows (boolean mask, index array or slice) as a new Detections."""
+        return Detections(self.data[mask])
+
+    @property
+    def xyxy(self):
+        return self.data[:, 0:4]
+
+    @property
+    def ids(self):
+        return self.data[:, 4].astype(np.int64)
+
+    @property
+    def conf(self):
+        return self.data[:, 5]
+
+    @property
+    def cls(self):
+        return self.data[:, 6].astype(np.int64)
+
+    @property
+    def centers(self):
+        return (self.data[:, 0:2] + self.data[:, 2:4]) / 2
+
+    def as_track_dicts(self):
+        """The legacy list of dicts (for utils.write_mot_results and other per-track consumers)."""
+        return [{'id': track_id, 'bbox': bbox, 'conf': conf, 'cls': cls}
+                for track_id, bbox, conf, cls in zip(self.ids.tolist(), self.xyxy.astype(int), self.conf.tolist(), self.cls.tolist())]
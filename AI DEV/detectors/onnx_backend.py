@@ -0,0 +1,266 @@
+import time
+import logging
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMPTY_DETECTIONS = np.empty((0, 6), dtype=np.float32)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def letterbox(frame, new_size=640, color=(114, 114, 114)):
+    """
+    Resizes a frame to fit in a `new_size` x `new_size` square while keeping its aspect ratio
+    (same padding as Ultralytics). Returns (padded_image, ratio, (pad_x, pad_y)).
+    """
+    height, width = frame.shape[:2]
+    ratio = min(new_size / height, new_size / width)
+    resized_width, resized_height = int(round(width * ratio)), int(round(height * ratio))
+    pad_x, pad_y = (new_size - resized_width) / 2, (new_size - resized_height) / 2
+    if (resized_width, resized_height) != (width, height):
+        frame = cv2.resize(frame, (resized_width, resized_height), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    padded = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return padded, ratio, (left, top)
+
+
+def preprocess(frame, imgsz):
+    """BGR frame -> (1, 3, imgsz, imgsz) float32 RGB blob in [0, 1], plus the letterbox parameters."""
+    padded, ratio, pad = letterbox(frame, imgsz)
+    blob = cv2.dnn.blobFromImage(padded, scalefactor=1 / 255.0, swapRB=True)
+    return blob, ratio, pad
+
+
+def non_max_suppression(boxes, scores, class_ids, iou_threshold=0.45, max_detections=300):
+    """
+    Class-aware NMS on xyxy boxes (numpy only). Boxes of different classes never suppress
+    each other. Returns the indices of the kept boxes, highest score first.
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    # เลื่อนกล่องของแต่ละ class ออกจากกันเพื่อให้ NMS ครั้งเดียวแยก class ได้
+    offset_boxes = boxes + (class_ids * (boxes.max() + 1))[:, None]
+    x1, y1, x2, y2 = offset_boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0 and len(keep) < max_detections:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-7)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(output, ratio, pad, frame_shape, conf_threshold=0.25, iou_threshold=0.45, classes=None):
+    """
+    Decodes a raw YOLOv8 detection output ((1, 4 + num_classes, num_anchors), boxes as cx, cy, w, h)
+    into an (N, 6) float32 array of [x1, y1, x2, y2, conf, cls] in original frame coordinates.
+    """
+    predictions = np.asarray(output)[0].T
+    class_scores = predictions[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(class_scores)), class_ids]
+
+    mask = scores >= conf_threshold
+    if classes is not None:
+        mask &= np.isin(class_ids, classes)
+    if not mask.any():
+        return EMPTY_DETECTIONS
+    predictions, class_ids, scores = predictions[mask], class_ids[mask], scores[mask]
+
+    cx, cy, w, h = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    keep = non_max_suppression(boxes, scores, class_ids, iou_threshold)
+    boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+    # แปลงกลับจากพิกัด letterbox เป็นพิกัดของเฟรมจริง
+    boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / ratio
+    boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, frame_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, frame_shape[0])
+    return np.column_stack([boxes, scores, class_ids]).astype(np.float32)
+
+
+def export_onnx(weights_path, imgsz, cache_dir):
+    """
+    Exports Ultralytics weights to ONNX once and caches the file as `<stem>_<imgsz>_fp32.onnx`.
+    The export is redone if the weights are newer than the cached file.
+    """
+    weights_path = Path(weights_path)
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    onnx_path = cache_dir / f"{weights_path.stem}_{imgsz}_fp32.onnx"
+    if onnx_path.exists() and (not weights_path.exists() or onnx_path.stat().st_mtime >= weights_path.stat().st_mtime):
+        return onnx_path
+
+    from ultralytics.yolo.engine.model import YOLO
+    logger.info(f"Exporting {weights_path} to ONNX (imgsz={imgsz})...")
+    exported_path = YOLO(str(weights_path)).export(format='onnx', imgsz=imgsz, opset=12, simplify=False, dynamic=False)
+    Path(exported_path).replace(onnx_path)
+    logger.info(f"ONNX model cached at {onnx_path}")
+    return onnx_path
+
+
+def iter_calibration_frames(calibration_source, max_frames=200):
+    """Yields up to `max_frames` BGR frames from a directory of images or a recorded video file."""
+    calibration_source = Path(calibration_source)
+    if calibration_source.is_dir():
+        image_paths = sorted(p for p in calibration_source.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        step = max(1, len(image_paths) // max_frames)
+        for image_path in image_paths[::step][:max_frames]:
+            frame = cv2.imread(str(image_path))
+            if frame is not None:
+                yield frame
+        return
+
+    cap = cv2.VideoCapture(str(calibration_source))
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    step = max(1, total_frames // max_frames) if total_frames > 0 else 1
+    frame_idx, yielded = 0, 0
+    try:
+        while yielded < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame_idx % step == 0:
+                yielded += 1
+                yield frame
+            frame_idx += 1
+    finally:
+        cap.release()
+
+
+class FrameCalibrationReader:
+    """Calibration data reader for `onnxruntime.quantization.quantize_static` over recorded frames."""
+    def __init__(self, calibration_source, input_name, imgsz, max_frames=200):
+        self.input_name = input_name
+        self.blobs = [preprocess(frame, imgsz)[0] for frame in iter_calibration_frames(calibration_source, max_frames)]
+        if not self.blobs:
+            raise ValueError(f"No calibration frames found in '{calibration_source}'.")
+        self._iterator = iter(self.blobs)
+
+    def get_next(self):
+        blob = next(self._iterator, None)
+        return None if blob is None else {self.input_name: blob}
+
+    def rewind(self):
+        self._iterator = iter(self.blobs)
+
+
+def quantize_int8(fp32_path, calibration_source, max_frames=200, imgsz=640):
+    """
+    Builds (once) a static INT8 (QDQ) copy of an FP32 ONNX model, calibrated on frames recorded
+    from our own cameras. Returns the path of the cached `<name>_int8.onnx` file.
+    """
+    fp32_path = Path(fp32_path)
+    int8_path = fp32_path.with_name(fp32_path.stem.replace('_fp32', '') + '_int8.onnx')
+    if int8_path.exists() and int8_path.stat().st_mtime >= fp32_path.stat().st_mtime:
+        return int8_path
+    if not calibration_source:
+        raise ValueError("detector_backend.calibration_source is required for INT8 quantization.")
+
+    import onnxruntime as ort
+    from onnxruntime.quantization import quantize_static, QuantFormat, QuantType, CalibrationMethod
+
+    input_name = ort.InferenceSession(str(fp32_path), providers=['CPUExecutionProvider']).get_inputs()[0].name
+    reader = FrameCalibrationReader(calibration_source, input_name, imgsz, max_frames)
+    logger.info(f"Quantizing {fp32_path.name} to INT8 with {len(reader.blobs)} calibration frames...")
+    quantize_static(
+        str(fp32_path), str(int8_path), reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+    logger.info(f"INT8 model cached at {int8_path}")
+    return int8_path
+
+
+class OnnxDetector:
+    """
+    YOLOv8 detector running an exported ONNX model on CPU through ONNX Runtime or OpenVINO.
+
+    `detect(frame)` returns the same (N, 6) [x1, y1, x2, y2, conf, cls] array that the inference
+    server produces, so the result can go straight into DetectionTracker.
+    """
+    def __init__(self, model_path, runtime='onnxruntime', imgsz=640, conf_threshold=0.25,
+                 iou_threshold=0.45, classes=None, num_threads=None):
+        self.model_path = Path(model_path)
+        self.runtime = runtime
+        self.imgsz = imgsz
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.classes = list(classes) if classes is not None else None
+
+        if runtime == 'onnxruntime':
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if num_threads:
+                options.intra_op_num_threads = int(num_threads)
+            self.session = ort.InferenceSession(str(self.model_path), options, providers=['CPUExecutionProvider'])
+            self.input_name = self.session.get_inputs()[0].name
+            self._run = lambda blob: self.session.run(None, {self.input_name: blob})[0]
+        elif runtime == 'openvino':
+            from openvino.runtime import Core
+            core = Core()
+            compile_config = {'PERFORMANCE_HINT': 'LATENCY'}
+            if num_threads:
+                compile_config['INFERENCE_NUM_THREADS'] = str(int(num_threads))
+            self.compiled_model = core.compile_model(core.read_model(str(self.model_path)), 'CPU', compile_config)
+            self.output_layer = self.compiled_model.output(0)
+            self._run = lambda blob: self.compiled_model([blob])[self.output_layer]
+        else:
+            raise ValueError(f"Unsupported ONNX runtime: {runtime}")
+        logger.info(f"Loaded {self.model_path.name} with {runtime} (imgsz={imgsz}).")
+
+    def detect(self, frame):
+        blob, ratio, pad = preprocess(frame, self.imgsz)
+        output = self._run(blob)
+        return postprocess(output, ratio, pad, frame.shape[:2], self.conf_threshold, self.iou_threshold, self.classes)
+
+    def detect_batch(self, frames):
+        # โมเดลถูก export แบบ batch คงที่ = 1 จึงรันทีละเฟรม
+        return [self.detect(frame) for frame in frames]
+
+
+def create_detector(config):
+    """
+    Builds the detector described by `config['detector_backend']`.
+    Returns None for the default Ultralytics backend (the caller keeps using `model.track`).
+    """
+    backend_cfg = config.get('detector_backend', {})
+    backend_type = backend_cfg.get('type', 'ultralytics').lower()
+    if backend_type == 'ultralytics':
+        return None
+    if backend_type not in ('onnxruntime', 'openvino'):
+        raise ValueError(f"Unsupported detector backend: {backend_type}")
+
+    imgsz = backend_cfg.get('imgsz', 640)
+    model_path = Path(backend_cfg.get('onnx_model') or config['yolo_model'])
+    if model_path.suffix.lower() != '.onnx':
+        model_path = export_onnx(model_path, imgsz, backend_cfg.get('cache_dir', 'models/onnx'))
+    if backend_cfg.get('precision', 'fp32').lower() == 'int8':
+        model_path = quantize_int8(model_path, backend_cfg.get('calibration_source'),
+                                   backend_cfg.get('calibration_max_frames', 200), imgsz)
+
+    start_time = time.time()
+    detector = OnnxDetector(
+        model_path, runtime=backend_type, imgsz=imgsz,
+        conf_threshold=config.get('detection_confidence_threshold', 0.25),
+        iou_threshold=backend_cfg.get('iou_threshold', 0.45),
+        classes=config.get('car_class_id'),
+        num_threads=backend_cfg.get('num_threads'),
+    )
+    logger.info(f"Detector backend '{backend_type}' ready in {time.time() - start_time:.1f}s.")
+    return detector
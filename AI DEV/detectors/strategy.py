@@ -1,4 +1,5 @@
 from detectors.yolo_processor import YoloV8Strategy
+from detectors.onnx_backend import OnnxDetector
 
 def get_yolo_inferer(yolo_model_path):
     """
@@ -6,8 +7,11 @@ def get_yolo_inferer(yolo_model_path):
     Args:
         yolo_model_path (Path): Path to the YOLO model file.
     Returns:
-        class: A YOLO strategy class (e.g., YoloV8Strategy).
+        class: A YOLO strategy class (e.g., YoloV8Strategy, or OnnxDetector for exported .onnx models).
     """
+    # Exported ONNX models (FP32 or INT8) run through ONNX Runtime / OpenVINO
+    if str(yolo_model_path).lower().endswith(".onnx"):
+        return OnnxDetector
     # Check for YOLOv8 models (e.g., yolov8n.pt, yolov8s.pt, etc.)
     if "yolov8" in str(yolo_model_path).lower():
         return YoloV8Strategy
@@ -0,0 +1,115 @@
+# event_outbox.py
+import json
+import sqlite3
+import time
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest')
+
+
+class EventOutbox:
+    """
+    Append-only on-disk outbox of the events a camera worker could not deliver.
+
+    Events are rows of a SQLite database in WAL mode: the JSON payload plus, for violations, the
+    JPEG evidence image as a BLOB. Every event gets an increasing sequence number (the rowid)
+    when it is appended and stays on disk until it is acknowledged with `ack()`, so a backend
+    outage or a worker restart loses nothing. The stored size (payload + image) is
+    capped at `max_bytes`; when it is exceeded `overflow_policy` decides what is dropped:
+    'drop_oldest' deletes the oldest events to make room, 'drop_newest' refuses the new one.
+
+    The methods block on disk I/O. EventUplink calls them from its own thread, never from the
+    frame loop; a connection may be used from any one thread at a time.
+    """
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, overflow_policy='drop_oldest'):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}, got {overflow_policy!r}")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.overflow_policy = overflow_policy
+        self.dropped = 0
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # มีผลเฉพาะตอนสร้างไฟล์ใหม่
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL: commit ไม่ fsync ทุกครั้ง แต่ข้อมูลไม่หายเมื่อ process crash (หายได้เฉพาะไฟดับ)
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS outbox (seq INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, size INTEGER NOT NULL, payload TEXT NOT NULL, image BLOB)")
+        if 'image' not in [row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")]:
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN image BLOB")  # outbox ที่สร้างก่อนมีช่องทางส่งภาพแยก
+        self.depth, self.size_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM outbox").fetchone()
+        if self.depth:
+            logger.info(f"Outbox {self.path} has {self.depth} undelivered events from a previous run.")
+
+    def append(self, events):
+        """Stores a list of (payload, image bytes or None) in one transaction. Returns their sequence numbers (None for an event refused by 'drop_newest')."""
+        now = time.time()
+        rows = [(json.dumps(payload), image) for payload, image in events]
+        seqs = []
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for row, image in rows:
+                size = len(row) + (len(image) if image is not None else 0)
+                if not self._make_room(size):
+                    self.dropped += 1
+                    seqs.append(None)
+                    continue
+                seqs.append(self._conn.execute("INSERT INTO outbox (created_at, size, payload, image) VALUES (?, ?, ?, ?)", (now, size, row, image)).lastrowid)
+                self.depth += 1
+                self.size_bytes += size
+        return seqs
+
+    def _make_room(self, size):
+        if self.size_bytes + size <= self.max_bytes:
+            return True
+        if self.overflow_policy == 'drop_newest' or size > self.max_bytes:
+            return False
+        # drop_oldest: ลบ event เก่าสุดจนมีที่พอ
+        freed, removed, last_seq = 0, 0, None
+        for seq, row_size in self._conn.execute("SELECT seq, size FROM outbox ORDER BY seq"):
+            freed += row_size
+            removed += 1
+            last_seq = seq
+            if self.size_bytes - freed + size <= self.max_bytes:
+                break
+        self._conn.execute("DELETE FROM outbox WHERE seq <= ?", (last_seq,))
+        self.depth -= removed
+        self.size_bytes -= freed
+        self.dropped += removed
+        logger.warning(f"Outbox {self.path} is full ({self.max_bytes} bytes); dropped the {removed} oldest events.")
+        return True
+
+    def peek(self, limit):
+        """The oldest `limit` events as (seq, created_at, payload, image) tuples, without removing them."""
+        rows = self._conn.execute("SELECT seq, created_at, payload, image FROM outbox ORDER BY seq LIMIT ?", (limit,)).fetchall()
+        return [(seq, created_at, json.loads(payload), image) for seq, created_at, payload, image in rows]
+
+    def ack(self, seqs):
+        """Removes delivered events by sequence number (one transaction)."""
+        if not seqs:
+            return
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            removed, freed = 0, 0
+            for seq in seqs:
+                row = self._conn.execute("SELECT size FROM outbox WHERE seq = ?", (seq,)).fetchone()
+                if row is not None:
+                    self._conn.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+                    removed += 1
+                    freed += row[0]
+            self.depth -= removed
+            self.size_bytes -= freed
+        if self.depth == 0:
+            # คืนพื้นที่ดิสก์หลัง backlog ถูกส่งหมด
+            self._conn.executescript("PRAGMA incremental_vacuum")  # executescript รันจนจบ (execute คืนเพียงหน้าเดียว)
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def oldest_created_at(self):
+        row = self._conn.execute("SELECT created_at FROM outbox ORDER BY seq LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self._conn.close()
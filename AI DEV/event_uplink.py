@@ -0,0 +1,308 @@
+# event_uplink.py
+import asyncio
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# คำตอบที่ส่งซ้ำก็ไม่ผ่าน (ข้อมูลผิดรูปแบบ / ใหญ่เกิน) - สถานะอื่น (3xx, 401, 404, 429, 5xx) เก็บ event ไว้ส่งใหม่
+PERMANENT_REJECT_STATUS_CODES = frozenset({400, 413, 415, 422})
+
+
+class EventUplink:
+    """
+    Sends the API events of one camera worker without blocking its frame loop.
+
+    `submit()` only puts the payload on a bounded asyncio queue. `concurrency` sender tasks
+    post it through one keep-alive httpx.AsyncClient while the worker keeps processing frames
+    (they run whenever the frame loop awaits, e.g. while waiting for the next frame). Every
+    event has a deadline: time spent in the queue counts against it, and the request timeout
+    is cut to what is left.
+
+    Events that fail to send, miss their deadline or do not fit in the queue are written to
+    `outbox` (an EventOutbox on disk) and stay there until the backend acknowledges them. While
+    the outbox has a backlog (or a write to it is still pending), new events go straight to it
+    and a replay task resends it `replay_batch_size` events at a time at full link speed; during
+    an outage it probes the backend with a single event every `retry_interval_seconds`. All
+    outbox I/O runs on one background thread.
+
+    Arrival order at the backend is not guaranteed: senders and the requests of one batch run
+    concurrently, and an event that fails is retried after newer ones. Every event carries its
+    own timestamp, which is what the backend stores and aggregates by.
+
+    With `batch_url` set and `coalesce_max_events` > 1 the uplink coalesces: a sender waits up
+    to `coalesce_max_delay_ms` after the first event for up to `coalesce_max_events` events and
+    posts them to the backend's /analytics/batch endpoint in one request (one transaction on the
+    backend). The replay task then also sends its batches that way.
+
+    An event can carry an evidence image (JPEG bytes) next to its payload. The image is posted
+    as raw image/jpeg to `image_url` (the backend's content-addressed evidence store) before the
+    event, which references it by `image_sha256`; it is kept with the event in the outbox until
+    both are delivered. Uploads are idempotent, so a replayed event simply uploads again.
+    """
+    def __init__(self, url, api_key, outbox, name="uplink", max_queue_size=1000, concurrency=2, timeout_seconds=10.0,
+                 deadline_seconds=30.0, retry_interval_seconds=5.0, replay_batch_size=50,
+                 batch_url=None, coalesce_max_events=1, coalesce_max_delay_ms=200, image_url=None):
+        self.url = url
+        self.image_url = image_url
+        self.batch_url = batch_url
+        self.coalesce_max_events = max(1, int(coalesce_max_events))
+        self.coalesce_max_delay = coalesce_max_delay_ms / 1000
+        self.coalescing = batch_url is not None and self.coalesce_max_events > 1
+        self.name = name
+        self.headers = {"X-API-Key": api_key, "Content-Type": "application/json"}
+        self.concurrency = max(1, int(concurrency))
+        self.timeout_seconds = timeout_seconds
+        self.deadline_seconds = deadline_seconds
+        self.retry_interval_seconds = retry_interval_seconds
+        self.replay_batch_size = max(1, int(replay_batch_size))
+        self.outbox = outbox
+        self._queue = asyncio.Queue(maxsize=max_queue_size)
+        self._outbox_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"EventOutbox-{name}")
+        self._replay_wakeup = None
+        self._pending_writes = set()
+        self._client = None
+        self._tasks = []
+        self._latencies = deque(maxlen=500)
+        self.sent = self.failed = self.rejected = self.expired = self.overflowed = 0
+        self.requests = 0
+        self.images_uploaded = self.image_bytes = 0
+        self.replayed = 0
+        self.replay_rate = 0.0
+        self._replay_lag_seconds = 0.0
+        self._replay_started = None
+        self._replayed_since_start = 0
+
+    async def start(self):
+        """Opens the HTTP client and starts the sender and replay tasks (call from inside the worker's event loop)."""
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        self._client = httpx.AsyncClient(headers=self.headers, limits=limits, timeout=self.timeout_seconds)
+        self._replay_wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._sender()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._replayer()))
+
+    def submit(self, payload, image=None):
+        """Queues a payload (and its evidence JPEG bytes, if any) for sending. Never blocks; returns False if the queue was full (the event then goes to the outbox)."""
+        try:
+            self._queue.put_nowait((time.monotonic(), payload, image))
+            return True
+        except asyncio.QueueFull:
+            self.overflowed += 1
+            self._store([(payload, image)])
+            return False
+
+    def _store(self, events):
+        """Hands (payload, image) events to the outbox thread (fire and forget) and wakes the replay task."""
+        future = self._outbox_executor.submit(self._append_to_outbox, events)
+        # นับเป็น backlog ตั้งแต่ตอนนี้ - outbox.depth จะเพิ่มก็ต่อเมื่อ thread เขียนเสร็จ
+        self._pending_writes.add(future)
+        future.add_done_callback(self._pending_writes.discard)
+        if self._replay_wakeup is not None:
+            self._replay_wakeup.set()
+
+    def _append_to_outbox(self, events):
+        try:
+            self.outbox.append(events)
+        except Exception as e:
+            logger.error(f"[{self.name}] Could not write {len(events)} events to the outbox: {e}")
+
+    async def _outbox_call(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._outbox_executor, method, *args)
+
+    async def _post(self, payload, timeout):
+        """Posts one payload. Returns True if it was delivered or permanently rejected (PERMANENT_REJECT_STATUS_CODES), False if it should be retried."""
+        start = time.monotonic()
+        self.requests += 1
+        try:
+            response = await self._client.post(self.url, json=payload, timeout=timeout)
+            response.raise_for_status()
+        except (httpx.RequestError, httpx.TimeoutException) as e:
+            self.failed += 1
+            logger.warning(f"[{self.name}] Could not send data: {e}. Keeping it in the outbox.")
+            return False
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in PERMANENT_REJECT_STATUS_CODES:
+                self.failed += 1
+                logger.warning(f"[{self.name}] Backend answered {e.response.status_code} for event. Keeping it in the outbox.")
+                return False
+            self.rejected += 1
+            logger.error(f"[{self.name}] Backend rejected event ({e.response.status_code}): {e.response.text[:200]}")
+            return True
+        self._latencies.append(time.monotonic() - start)
+        self.sent += 1
+        return True
+
+    async def _post_batch(self, payloads, timeout):
+        """Posts payloads to the batch endpoint in one request. Returns True if the backend accepted the batch (items it rejected are counted and logged) or rejected it permanently, False if it should be retried."""
+        start = time.monotonic()
+        self.requests += 1
+        try:
+            response = await self._client.post(self.batch_url, json=payloads, timeout=timeout)
+            response.raise_for_status()
+        except (httpx.RequestError, httpx.TimeoutException) as e:
+            self.failed += len(payloads)
+            logger.warning(f"[{self.name}] Could not send batch of {len(payloads)} events: {e}. Keeping it in the outbox.")
+            return False
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in PERMANENT_REJECT_STATUS_CODES:
+                self.failed += len(payloads)
+                logger.warning(f"[{self.name}] Backend answered {e.response.status_code} for batch of {len(payloads)} events. Keeping it in the outbox.")
+                return False
+            self.rejected += len(payloads)
+            logger.error(f"[{self.name}] Backend rejected batch of {len(payloads)} events ({e.response.status_code}): {e.response.text[:200]}")
+            return True
+        self._latencies.append(time.monotonic() - start)
+        body = response.json()
+        self.sent += body['inserted']
+        self.rejected += body['failed']
+        for result in body['results']:
+            if result['error']:
+                logger.error(f"[{self.name}] Backend rejected event {result['index']} of batch: {result['error']}")
+        return True
+
+    async def _upload_image(self, image, timeout):
+        """Uploads one evidence JPEG to image_url. Returns True if it is stored (or was permanently rejected), False if its event should be retried."""
+        if image is None:
+            return True
+        self.requests += 1
+        try:
+            response = await self._client.post(self.image_url, content=image, headers={"Content-Type": "image/jpeg"}, timeout=timeout)
+            response.raise_for_status()
+        except (httpx.RequestError, httpx.TimeoutException) as e:
+            self.failed += 1
+            logger.warning(f"[{self.name}] Could not upload evidence image: {e}. Keeping its event in the outbox.")
+            return False
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in PERMANENT_REJECT_STATUS_CODES:
+                self.failed += 1
+                logger.warning(f"[{self.name}] Backend answered {e.response.status_code} for evidence image. Keeping its event in the outbox.")
+                return False
+            # ส่งซ้ำก็ไม่ผ่าน - ส่ง event ต่อไปโดยไม่มีภาพ
+            logger.error(f"[{self.name}] Backend rejected evidence image ({e.response.status_code}): {e.response.text[:200]}")
+            return True
+        self.images_uploaded += 1
+        self.image_bytes += len(image)
+        return True
+
+    async def _deliver(self, events, timeout):
+        """Uploads the evidence images, then sends the payloads whose image is stored. Returns one delivered flag per (payload, image) event."""
+        uploaded = await asyncio.gather(*(self._upload_image(image, timeout) for _, image in events))
+        sent = iter(await self._send([payload for (payload, _), ready in zip(events, uploaded) if ready], timeout))
+        return [ready and next(sent) for ready in uploaded]
+
+    async def _send(self, payloads, timeout):
+        """Sends payloads concurrently (batch requests of up to coalesce_max_events when coalescing). Returns one delivered flag per payload."""
+        if not self.coalescing:
+            return await asyncio.gather(*(self._post(payload, timeout) for payload in payloads))
+        chunks = [payloads[i:i + self.coalesce_max_events] for i in range(0, len(payloads), self.coalesce_max_events)]
+        results = await asyncio.gather(*(self._post_batch(chunk, timeout) for chunk in chunks))
+        return [delivered for chunk, delivered in zip(chunks, results) for _ in chunk]
+
+    async def _collect(self, batch):
+        """Adds queued events to `batch` until it has coalesce_max_events or coalesce_max_delay_ms has passed."""
+        flush_at = time.monotonic() + self.coalesce_max_delay
+        while len(batch) < self.coalesce_max_events:
+            remaining = flush_at - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                return
+
+    async def _sender(self):
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                if self.coalescing:
+                    await self._collect(batch)
+                events = [(payload, image) for _, payload, image in batch]
+                remaining = self.deadline_seconds - (time.monotonic() - batch[0][0])
+                if self.outbox.depth or self._pending_writes:
+                    # มี backlog อยู่ (backend ล่มหรือเพิ่งกลับมา) - ต่อท้าย outbox ให้ replay task ส่ง
+                    self._store(events)
+                elif remaining <= 0:
+                    self.expired += len(events)
+                    self._store(events)
+                else:
+                    results = await self._deliver(events, min(self.timeout_seconds, remaining))
+                    undelivered = [event for event, delivered in zip(events, results) if not delivered]
+                    if undelivered:
+                        self._store(undelivered)
+            except asyncio.CancelledError:
+                self._store([(payload, image) for _, payload, image in batch])
+                raise
+            except Exception:
+                logger.exception(f"[{self.name}] Unexpected error while sending an event:")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _replayer(self):
+        probing = False
+        while True:
+            batch = await self._outbox_call(self.outbox.peek, 1 if probing else self.replay_batch_size)
+            if not batch:
+                self._replay_lag_seconds = 0.0
+                self._replay_started = None
+                self._replay_wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._replay_wakeup.wait(), self.retry_interval_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._replay_lag_seconds = time.time() - batch[0][1]
+            if self._replay_started is None:
+                self._replay_started, self._replayed_since_start = time.monotonic(), 0
+            results = await self._deliver([(payload, image) for _, _, payload, image in batch], self.timeout_seconds)
+            acked = [seq for (seq, _, _, _), delivered in zip(batch, results) if delivered]
+            await self._outbox_call(self.outbox.ack, acked)
+            self.replayed += len(acked)
+            self._replayed_since_start += len(acked)
+            self.replay_rate = self._replayed_since_start / max(time.monotonic() - self._replay_started, 1e-6)
+            probing = len(acked) < len(batch)
+            if probing:
+                # backend ยังไม่พร้อม - รอแล้วลองใหม่ทีละ event (event ยังอยู่ใน outbox)
+                self._replay_started = None
+                await asyncio.sleep(self.retry_interval_seconds)
+
+    def stats(self):
+        """Queue and outbox depths, delivery and image upload counters, send latency (ms) of the recent events, and replay throughput / lag."""
+        latencies = np.array(self._latencies) * 1000 if self._latencies else np.zeros(1)
+        return {
+            'queue_depth': self._queue.qsize(), 'outbox_depth': self.outbox.depth, 'outbox_bytes': self.outbox.size_bytes,
+            'sent': self.sent, 'requests': self.requests, 'images_uploaded': self.images_uploaded, 'image_bytes': self.image_bytes, 'failed': self.failed, 'rejected': self.rejected,
+            'expired': self.expired, 'overflowed': self.overflowed, 'dropped': self.outbox.dropped,
+            'latency_p50_ms': float(np.percentile(latencies, 50)), 'latency_p95_ms': float(np.percentile(latencies, 95)),
+            'replayed': self.replayed, 'replay_rate_eps': self.replay_rate if self._replay_started is not None else 0.0,
+            'replay_lag_seconds': self._replay_lag_seconds if self.outbox.depth else 0.0
+        }
+
+    async def close(self, drain_timeout_seconds=30.0):
+        """
+        Waits (up to `drain_timeout_seconds`) for the queued events to be sent, then stops the tasks and
+        closes the client and the outbox. Events that were not delivered stay in the outbox for the next run.
+        """
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout_seconds)
+        except asyncio.TimeoutError:
+            logger.warning(f"[{self.name}] {self._queue.qsize()} events still queued at shutdown; keeping them in the outbox.")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        leftover = []
+        while not self._queue.empty():
+            _, payload, image = self._queue.get_nowait()
+            leftover.append((payload, image))
+        if leftover:
+            self._store(leftover)
+        if self._client is not None:
+            await self._client.aclose()
+        self._outbox_executor.submit(self.outbox.close)
+        self._outbox_executor.shutdown(wait=True)
+        if self.outbox.depth:
+            logger.info(f"[{self.name}] {self.outbox.depth} undelivered events kept in {self.outbox.path}.")
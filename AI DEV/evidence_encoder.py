@@ -0,0 +1,65 @@
+# evidence_encoder.py
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+
+def encode_evidence(frame, bbox, reference_shape, jpeg_quality=95, max_dimension=None):
+    """
+    Crops `bbox` (in `reference_shape` coordinates, i.e. the resized inference frame) out of
+    `frame` (usually the full-resolution frame), optionally shrinks it so its longest side is at
+    most `max_dimension`, and returns it as JPEG bytes, or None if the crop is empty.
+    """
+    orig_h, orig_w = frame.shape[:2]
+    res_h, res_w = reference_shape[:2]
+    scale_x = orig_w / res_w
+    scale_y = orig_h / res_h
+
+    x1_s, y1_s, x2_s, y2_s = map(int, bbox)
+    x1_o, y1_o = max(0, int(x1_s * scale_x)), max(0, int(y1_s * scale_y))
+    x2_o, y2_o = min(orig_w, int(x2_s * scale_x)), min(orig_h, int(y2_s * scale_y))
+    if x2_o <= x1_o or y2_o <= y1_o:
+        return None
+
+    crop = frame[y1_o:y2_o, x1_o:x2_o]
+    if max_dimension and max(crop.shape[:2]) > max_dimension:
+        ratio = max_dimension / max(crop.shape[:2])
+        crop = cv2.resize(crop, (max(1, int(crop.shape[1] * ratio)), max(1, int(crop.shape[0] * ratio))), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', crop, [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)])
+    if not ok:
+        return None
+    return buffer.tobytes()
+
+
+class EvidenceEncoder:
+    """
+    Small thread pool that crops and JPEG-encodes violation evidence off the frame loop.
+
+    `submit()` only keeps a reference to the frame (or a callable that loads the full-resolution
+    frame) and returns a Future with the JPEG bytes, so CarTrackerManager.update never waits
+    on image encoding. cv2 releases the GIL while resizing/encoding, so the pool runs in parallel
+    with tracking.
+    """
+    def __init__(self, max_workers=2, jpeg_quality=95, max_dimension=None):
+        self.jpeg_quality = jpeg_quality
+        self.max_dimension = max_dimension
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="EvidenceEncoder")
+
+    def _encode(self, frame_source, bbox, reference_shape):
+        frame = frame_source() if callable(frame_source) else frame_source
+        if frame is None:
+            return None
+        return encode_evidence(frame, bbox, reference_shape, self.jpeg_quality, self.max_dimension)
+
+    def submit(self, frame_source, bbox, reference_shape):
+        """
+        Args:
+            frame_source (np.ndarray | callable): The frame to crop from, or a callable returning it.
+            bbox: [x1, y1, x2, y2] in `reference_shape` coordinates (copied, the caller may keep updating it).
+            reference_shape (tuple): Shape of the frame the bbox belongs to.
+        Returns:
+            concurrent.futures.Future: Resolves to the JPEG bytes, or None.
+        """
+        return self._executor.submit(self._encode, frame_source, tuple(bbox), tuple(reference_shape))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
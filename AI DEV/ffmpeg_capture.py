@@ -0,0 +1,257 @@
+# ffmpeg_capture.py
+import json
+import logging
+import socket
+import subprocess
+import threading
+from collections import deque
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def probe_video(source_path, ffprobe_path='ffprobe'):
+    """Returns (width, height, fps) of the first video stream, or (0, 0, 0.0) if ffprobe fails."""
+    command = [ffprobe_path, '-v', 'error', '-select_streams', 'v:0',
+               '-show_entries', 'stream=width,height,avg_frame_rate,r_frame_rate', '-of', 'json', str(source_path)]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=30, check=True)
+        stream = json.loads(result.stdout)['streams'][0]
+    except (OSError, subprocess.SubprocessError, ValueError, KeyError, IndexError) as e:
+        logger.error(f"ffprobe failed for {source_path}: {e}")
+        return 0, 0, 0.0
+
+    fps = 0.0
+    for key in ('avg_frame_rate', 'r_frame_rate'):
+        num, _, den = stream.get(key, '0/0').partition('/')
+        if den and float(den) > 0 and float(num) > 0:
+            fps = float(num) / float(den)
+            break
+    return int(stream.get('width', 0)), int(stream.get('height', 0)), fps
+
+
+class FFmpegCapture:
+    """
+    cv2.VideoCapture-like reader that lets an ffmpeg subprocess decode and scale the video
+    (`scale` and optional `fps` filters) and reads raw BGR frames from its stdout pipe straight
+    into numpy arrays (no intermediate bytes objects). Only the pixels we actually use are ever
+    produced, instead of decoding at full camera resolution and shrinking every frame with cv2.resize.
+
+    Every frame returned by `read()` is a new array owned by the caller: the FrameGrabber slot,
+    the worker loop and the evidence encoder may all still hold earlier frames, so buffers are
+    never reused behind their back.
+
+    `get(CAP_PROP_FRAME_WIDTH/HEIGHT)` return the size of the frames that `read()` returns;
+    the camera's own resolution is in `source_width` / `source_height`.
+
+    With `full_resolution_frames` > 0 (live streams, which cannot be seeked for evidence) the same
+    ffmpeg process also sends every frame at full resolution as yuv420p over a loopback TCP
+    connection, and the last `full_resolution_frames` of them are kept; `read_full_resolution(n)`
+    returns the n-th frame that `read()` returned at full resolution while it is still kept.
+    """
+    def __init__(self, source_path, output_width=None, output_fps=None, is_stream=False,
+                 ffmpeg_path='ffmpeg', ffprobe_path='ffprobe', rtsp_transport='tcp', full_resolution_frames=0):
+        self.source_path = str(source_path)
+        self.source_width, self.source_height, self.source_fps = probe_video(self.source_path, ffprobe_path)
+        self.process = None
+        self._full_frames = None
+        self._full_thread = None
+        if self.source_width == 0 or self.source_height == 0:
+            return
+
+        # คำนวณความสูงแบบเดียวกับ camera_worker (int(h * target_w / w)) เพื่อให้ได้ขนาดเฟรมตรงกัน
+        self.width = int(output_width) if output_width else self.source_width
+        self.height = int(self.source_height * (self.width / self.source_width))
+        self.fps = float(output_fps) if output_fps else self.source_fps
+        self.frame_bytes = self.width * self.height * 3
+
+        filters = []
+        if output_fps:
+            filters.append(f"fps={self.fps}")
+        if (self.width, self.height) != (self.source_width, self.source_height):
+            filters.append(f"scale={self.width}:{self.height}:flags=area")
+
+        command = [ffmpeg_path, '-nostdin', '-hide_banner', '-loglevel', 'error']
+        if is_stream and self.source_path.startswith('rtsp://'):
+            command += ['-rtsp_transport', rtsp_transport]
+        command += ['-i', self.source_path, '-an', '-sn', '-dn']
+        if filters:
+            command += ['-vf', ','.join(filters)]
+        command += ['-pix_fmt', 'bgr24', '-f', 'rawvideo', 'pipe:1']
+
+        # output ที่สอง (ความละเอียดเต็ม) ส่งผ่าน TCP loopback เพราะบน Windows ส่ง pipe เพิ่มให้ subprocess ไม่ได้
+        full_listener = None
+        if full_resolution_frames > 0 and (self.width, self.height) != (self.source_width, self.source_height):
+            if self.source_width % 2 or self.source_height % 2:
+                logger.warning(f"Full-resolution frames need an even frame size ({self.source_width}x{self.source_height}): {self.source_path}")
+            else:
+                full_listener = socket.create_server(('127.0.0.1', 0))
+                command += ['-an', '-sn', '-dn']
+                if output_fps:
+                    command += ['-vf', f"fps={self.fps}"]
+                command += ['-pix_fmt', 'yuv420p', '-f', 'rawvideo', f"tcp://127.0.0.1:{full_listener.getsockname()[1]}"]
+
+        try:
+            self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=self.frame_bytes)
+        except OSError as e:
+            logger.error(f"Could not start ffmpeg for {self.source_path}: {e}")
+            self.process = None
+            if full_listener is not None:
+                full_listener.close()
+            return
+
+        if full_listener is not None:
+            self._full_frames = deque(maxlen=int(full_resolution_frames))
+            self._full_seq = 0
+            self._full_closed = False
+            self._full_condition = threading.Condition()
+            self._full_thread = threading.Thread(target=self._receive_full_resolution, args=(full_listener,),
+                                                 name="FFmpegFullResolution", daemon=True)
+            self._full_thread.start()
+
+        logger.info(f"ffmpeg capture {self.source_width}x{self.source_height} -> {self.width}x{self.height} @ {self.fps:.2f} fps: {self.source_path}")
+
+    def isOpened(self):
+        return self.process is not None and self.process.poll() is None
+
+    def read(self):
+        if self.process is None:
+            return False, None
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        view = memoryview(frame).cast('B')
+        filled = 0
+        while filled < self.frame_bytes:
+            count = self.process.stdout.readinto(view[filled:])
+            if not count:
+                return False, None
+            filled += count
+        return True, frame
+
+    def _receive_full_resolution(self, listener):
+        """Background thread: keeps the newest full-resolution frames (I420 layout) from the second ffmpeg output."""
+        shape = (self.source_height * 3 // 2, self.source_width)
+        try:
+            listener.settimeout(30)
+            connection, _ = listener.accept()
+        except OSError as e:
+            logger.error(f"ffmpeg did not open the full-resolution output for {self.source_path}: {e}")
+            connection = None
+        finally:
+            listener.close()
+
+        if connection is not None:
+            with connection:
+                connection.settimeout(None)
+                # buffer ที่หลุดออกจาก ring ถูกใช้ซ้ำ (read_full_resolution แปลงเป็นภาพใหม่ภายใต้ lock เดียวกัน)
+                buffer = np.empty(shape, dtype=np.uint8)
+                while self._receive_into(connection, memoryview(buffer).cast('B')):
+                    with self._full_condition:
+                        evicted = self._full_frames[0][1] if len(self._full_frames) == self._full_frames.maxlen else None
+                        self._full_seq += 1
+                        self._full_frames.append((self._full_seq, buffer))
+                        self._full_condition.notify_all()
+                    buffer = evicted if evicted is not None else np.empty(shape, dtype=np.uint8)
+
+        with self._full_condition:
+            self._full_closed = True
+            self._full_condition.notify_all()
+
+    @staticmethod
+    def _receive_into(connection, view):
+        filled = 0
+        while filled < len(view):
+            try:
+                count = connection.recv_into(view[filled:])
+            except OSError:
+                return False
+            if not count:
+                return False
+            filled += count
+        return True
+
+    def read_full_resolution(self, seq, timeout=1.0):
+        """Full-resolution BGR copy of the `seq`-th frame returned by `read()` (1-based), or None if it is not kept (any more)."""
+        if self._full_frames is None:
+            return None
+        with self._full_condition:
+            # output ความละเอียดเต็มอาจตามหลังเฟรมที่ย่อแล้วเล็กน้อย
+            self._full_condition.wait_for(lambda: self._full_seq >= seq or self._full_closed, timeout)
+            for frame_seq, buffer in self._full_frames:
+                if frame_seq == seq:
+                    return cv2.cvtColor(buffer, cv2.COLOR_YUV2BGR_I420)
+        return None
+
+    def get(self, prop_id):
+        if self.process is None:
+            return 0
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0
+
+    def set(self, prop_id, value):
+        return False
+
+    def release(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdout.close()
+        except OSError:
+            pass
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+        if self._full_thread is not None:
+            self._full_thread.join(timeout=5)
+
+
+class FullResolutionReader:
+    """
+    Rarely used full-resolution path next to a downscaled FFmpegCapture (evidence crops).
+    Video files are seeked to the matching frame. Live streams cannot be seeked: their
+    FFmpegCapture keeps the last few full-resolution frames (`full_resolution_frames`), and the
+    frame is looked up there through `frame_grabber`, so the evidence shows the same moment.
+    """
+    def __init__(self, source_path, is_stream, frame_step=1.0, frame_grabber=None):
+        self.source_path = str(source_path)
+        self.is_stream = is_stream
+        # สตรีม: FrameGrabber ที่ถือ FFmpegCapture ตัวปัจจุบัน (เปลี่ยนตัวเมื่อ reconnect)
+        self.frame_grabber = frame_grabber
+        # จำนวนเฟรมของต้นฉบับต่อ 1 เฟรมที่ ffmpeg ส่งออกมา (เมื่อใช้ fps filter)
+        self.frame_step = frame_step
+        self._cap = None
+        # ถูกเรียกจาก thread pool ของ EvidenceEncoder ได้หลาย thread พร้อมกัน
+        self._lock = threading.Lock()
+
+    def read(self, frame_idx, fallback=None):
+        """Returns the full-resolution BGR frame for `frame_idx` (1-based, as counted by FrameGrabber), or `fallback` (e.g. the downscaled frame) if it cannot be read."""
+        if self.is_stream:
+            if self.frame_grabber is None:
+                return fallback
+            # frame_idx นับต่อเนื่องข้าม reconnect ส่วน capture แต่ละตัวนับเฟรมของตัวเองจาก 1
+            offset = self.frame_grabber.capture_frame_offset
+            read_full_resolution = getattr(self.frame_grabber.cap, 'read_full_resolution', None)
+            frame = read_full_resolution(frame_idx - offset) if read_full_resolution is not None and frame_idx > offset else None
+            return frame if frame is not None else fallback
+
+        with self._lock:
+            if self._cap is None:
+                self._cap = cv2.VideoCapture(self.source_path)
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, int(round((frame_idx - 1) * self.frame_step)))
+            ret, frame = self._cap.read()
+        return frame if ret else fallback
+
+    def release(self):
+        with self._lock:
+            if self._cap is not None:
+                self._cap.release()
+                self._cap = None
@@ -0,0 +1,129 @@
+# frame_grabber.py
+import threading
+import time
+import logging
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+def is_stream_source(source_path):
+    """Returns True for live sources (RTSP/HTTP URLs or webcam indexes), False for video files."""
+    source_path = str(source_path)
+    return source_path.startswith(('rtsp://', 'http://', 'https://')) or source_path.isnumeric()
+
+
+class FrameGrabber:
+    """
+    Decodes frames on a background thread and keeps only the newest one in a single slot.
+
+    - Live streams: the decoder never waits for the consumer. If a new frame arrives before the
+      previous one was taken, the old one is overwritten and counted in `dropped_frames`.
+    - Video files: the decoder waits until the slot is consumed, so every frame is processed
+      (same result as reading the file inline).
+
+    `frame_idx` counts every decoded frame (including dropped ones), so `frame_idx / fps`
+    keeps matching the real elapsed time of the source.
+    """
+    def __init__(self, source_path, name=None, reconnect_delay_seconds=15, open_capture=None):
+        self.source_path = str(source_path)
+        self.name = name or self.source_path
+        self.is_stream = is_stream_source(self.source_path)
+        self.reconnect_delay_seconds = reconnect_delay_seconds
+        self._open_capture = open_capture or self._open_opencv_capture
+
+        self.cap = self._open_capture(self.source_path)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+
+        self._condition = threading.Condition()
+        self._frame = None
+        self._frame_idx = 0
+        self._timestamp = None
+        self._has_new_frame = False
+        self.dropped_frames = 0
+        # frame_idx ก่อนเฟรมแรกของ capture ตัวปัจจุบัน (FullResolutionReader ใช้จับคู่เฟรมของสตรีมหลัง reconnect)
+        self.capture_frame_offset = 0
+        self.finished = False
+
+        # บางแหล่ง (เช่น RTSP บางรุ่น) ไม่รายงานขนาดเฟรม ให้ลองอ่านเฟรมแรกเพื่อหาขนาด แล้วเก็บเฟรมนั้นไว้ใช้ต่อ
+        if self.width == 0 or self.height == 0:
+            ret, first_frame = self.cap.read()
+            if ret:
+                self.height, self.width = first_frame.shape[:2]
+                self._publish(first_frame)
+
+        # ขนาดจริงของกล้อง (ต่างจาก width/height เมื่อ capture ย่อเฟรมมาให้แล้ว เช่น FFmpegCapture)
+        self.source_width = getattr(self.cap, 'source_width', self.width)
+        self.source_height = getattr(self.cap, 'source_height', self.height)
+
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"FrameGrabber-{self.name}", daemon=True)
+
+    def _open_opencv_capture(self, source_path):
+        cap = cv2.VideoCapture(source_path)
+        if self.is_stream:
+            # ลด buffer ภายใน OpenCV เพื่อไม่ให้เฟรมเก่าค้าง (บาง backend ไม่รองรับ ก็ไม่เป็นไร)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _publish(self, frame):
+        with self._condition:
+            if not self.is_stream:
+                while self._has_new_frame and not self._stop_event.is_set():
+                    self._condition.wait(0.1)
+            elif self._has_new_frame:
+                self.dropped_frames += 1
+            self._frame_idx += 1
+            self._frame = frame
+            self._timestamp = time.time()
+            self._has_new_frame = True
+            self._condition.notify_all()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                if not self.is_stream:
+                    logger.warning(f"[{self.name}] End of video file.")
+                    break
+                logger.warning(f"[{self.name}] Stream ended or connection lost. Reconnecting in {self.reconnect_delay_seconds}s...")
+                self.cap.release()
+                # รอบน thread ของ grabber เอง จึงไม่บล็อก asyncio loop ของ worker
+                if self._stop_event.wait(self.reconnect_delay_seconds):
+                    break
+                self.capture_frame_offset = self._frame_idx
+                self.cap = self._open_capture(self.source_path)
+                continue
+            self._publish(frame)
+
+        with self._condition:
+            self.finished = True
+            self._condition.notify_all()
+
+    def read(self, timeout=None):
+        """
+        Takes the newest frame out of the slot.
+        Returns (frame, frame_idx, capture_timestamp), or None if no new frame arrived within
+        `timeout` seconds or the source has finished (check `finished`).
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._has_new_frame or self.finished, timeout)
+            if not self._has_new_frame:
+                return None
+            self._has_new_frame = False
+            self._condition.notify_all()
+            return self._frame, self._frame_idx, self._timestamp
+
+    def stop(self):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self.cap.release()
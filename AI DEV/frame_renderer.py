@@ -0,0 +1,84 @@
+# frame_renderer.py
+import cv2
+from utils import draw_parking_zones
+
+# สี (พื้นหลังป้าย, กรอบรถ) ตามสถานะ
+STATUS_COLORS = {
+    'PARKED': ((0, 128, 0), (0, 255, 0)),
+    'WARNING_PARKED': ((0, 100, 200), (0, 255, 255)),
+    'VIOLATION': ((0, 0, 200), (0, 0, 255)),
+    'OUT_OF_ZONE': ((128, 0, 0), (255, 0, 0)),
+    'MOVING_IN_ZONE': ((150, 150, 0), (255, 255, 0)),
+}
+DEFAULT_COLORS = ((50, 50, 50), (128, 128, 128))
+
+
+def draw_tracks(frame, tracks, draw_bounding_box=True):
+    """Draws the box and the "ID:<id> <status> (<time parked>)" label of every track in the snapshot."""
+    text_color = (255, 255, 255)
+    font, font_scale, font_thickness = cv2.FONT_HERSHEY_SIMPLEX, 0.3, 1
+    padding_x, padding_y, margin_from_bbox = 2, 1, 4
+    frame_height, frame_width = frame.shape[:2]
+
+    for track_id, x1, y1, x2, y2, status, time_parked_str in tracks:
+        background_color, draw_box_color = STATUS_COLORS.get(status, DEFAULT_COLORS)
+        full_label_text = f"ID:{track_id} {status}"
+        if time_parked_str: full_label_text += f" ({time_parked_str})"
+        (text_width, text_height), baseline = cv2.getTextSize(full_label_text, font, font_scale, font_thickness)
+
+        rect_x1 = x1
+        rect_x2 = rect_x1 + text_width + padding_x * 2
+        if rect_x2 > frame_width:
+            rect_x2 = x2
+            rect_x1 = rect_x2 - text_width - padding_x * 2
+
+        rect_y1 = y2 + margin_from_bbox
+        rect_y2 = rect_y1 + text_height + padding_y * 2 + baseline
+        if rect_y2 > frame_height:
+            rect_y2 = y1 - margin_from_bbox
+            rect_y1 = rect_y2 - (text_height + padding_y * 2 + baseline)
+
+        if draw_bounding_box:
+            cv2.rectangle(frame, (x1, y1), (x2, y2), draw_box_color, 2)
+
+        if rect_x2 > rect_x1 and rect_y2 > rect_y1:
+            cv2.rectangle(frame, (rect_x1, rect_y1), (rect_x2, rect_y2), background_color, -1)
+            cv2.putText(frame, full_label_text, (rect_x1 + padding_x, rect_y1 + text_height + padding_y), font, font_scale, text_color, font_thickness, cv2.LINE_AA)
+
+
+def draw_hud(frame, cam_name, current_parked, total_sessions, occupancy=None):
+    """Draws the total sessions / current parked / camera name block in the bottom-right corner."""
+    frame_height, frame_width = frame.shape[:2]
+    font, small_font_scale, small_font_thickness = cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1
+
+    text_total_sessions = f"Total Parking Sessions: {total_sessions}"
+    (w_total, h_total), _ = cv2.getTextSize(text_total_sessions, font, small_font_scale, small_font_thickness)
+    pos_total_y = frame_height - 10
+    cv2.putText(frame, text_total_sessions, (frame_width - w_total - 10, pos_total_y), font, small_font_scale, (255, 255, 255), small_font_thickness)
+
+    text_current_parked = f"Current Parked: {current_parked}"
+    if occupancy:
+        text_current_parked += f" (Warning: {occupancy.get('WARNING_PARKED', 0)}, Violation: {occupancy.get('VIOLATION', 0)})"
+    (w_parked, _), _ = cv2.getTextSize(text_current_parked, font, small_font_scale, small_font_thickness)
+    pos_parked_y = pos_total_y - h_total - 5
+    cv2.putText(frame, text_current_parked, (frame_width - w_parked - 10, pos_parked_y), font, small_font_scale, (255, 255, 255), small_font_thickness)
+
+    text_cam_name = f"{cam_name}"
+    (w_cam, h_cam), _ = cv2.getTextSize(text_cam_name, font, small_font_scale, small_font_thickness)
+    pos_cam_y = pos_parked_y - h_cam - 5
+    cv2.putText(frame, text_cam_name, (frame_width - w_cam - 10, pos_cam_y), font, small_font_scale, (255, 255, 0), small_font_thickness)
+
+
+def render_frame(frame, snapshot, draw_bounding_box=True):
+    """
+    Draws zones, tracks and HUD from a render snapshot onto `frame` (in place) and returns it.
+    The snapshot is the small dict built by the camera worker:
+    {'cam_name', 'zones', 'tracks': [(id, x1, y1, x2, y2, status, time_parked_str), ...],
+     'current_parked', 'occupancy', 'total_sessions'}.
+    """
+    if snapshot is None:
+        return frame
+    draw_parking_zones(frame, snapshot['zones'])
+    draw_tracks(frame, snapshot['tracks'], draw_bounding_box)
+    draw_hud(frame, snapshot['cam_name'], snapshot['current_parked'], snapshot['total_sessions'], snapshot.get('occupancy'))
+    return frame
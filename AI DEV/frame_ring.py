@@ -0,0 +1,98 @@
+# frame_ring.py
+from multiprocessing import shared_memory
+import numpy as np
+
+# ค่าใน header ของ slot ที่ยังไม่มีเฟรม หรือกำลังถูกเขียนอยู่
+EMPTY_SLOT = -1
+
+class SharedFrameRing:
+    """
+    Fixed-size ring of frame slots in shared memory (one ring per camera).
+
+    The camera worker writes (or `cv2.resize(..., dst=...)`s) frames directly into the next slot
+    and only sends a small metadata tuple through the display queue. main_monitor attaches to
+    the same memory and copies the announced slot out, so no frame is pickled between processes.
+
+    The display queue can hold more announcements than there are slots, so a slot may be
+    rewritten before (or while) it is read. Each slot therefore has a header with the frame_idx
+    it holds (seqlock): next_slot() marks it EMPTY_SLOT before the frame is written, write()
+    stamps the frame_idx afterwards, and read() only returns its copy if the header held the
+    announced frame_idx both before and after copying - a torn or newer frame is dropped.
+    """
+    def __init__(self, shm, shape, num_slots, owner):
+        self._shm = shm
+        self.name = shm.name
+        self.shape = tuple(shape)
+        self.num_slots = num_slots
+        self._owner = owner
+        self._frame_ids = np.ndarray((num_slots,), dtype=np.int64, buffer=shm.buf)
+        self._frames = np.ndarray((num_slots, *self.shape), dtype=np.uint8, buffer=shm.buf,
+                                  offset=self._frame_ids.nbytes)
+        if owner:
+            self._frame_ids[:] = EMPTY_SLOT
+        else:
+            self._frame_ids.flags.writeable = False
+            self._frames.flags.writeable = False
+        self._next_slot = 0
+
+    @classmethod
+    def create(cls, shape, num_slots=4):
+        """Creates a new ring (called by the camera worker that owns it)."""
+        size = np.dtype(np.int64).itemsize * num_slots + int(np.prod(shape)) * num_slots
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        return cls(shm, shape, num_slots, owner=True)
+
+    @classmethod
+    def attach(cls, name, shape, num_slots):
+        """Attaches to a ring created by another process (called by main_monitor)."""
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            # ป้องกันไม่ให้ resource_tracker ของ process ที่แค่ attach ไป unlink หน่วยความจำของ worker ตอนจบ
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return cls(shm, shape, num_slots, owner=False)
+
+    def next_slot(self):
+        """Returns (slot_idx, writable view) of the next slot to fill. The slot reads as empty until write()."""
+        slot_idx = self._next_slot
+        self._next_slot = (self._next_slot + 1) % self.num_slots
+        self._frame_ids[slot_idx] = EMPTY_SLOT
+        return slot_idx, self._frames[slot_idx]
+
+    def write(self, slot_idx, frame, frame_idx):
+        """Copies `frame` into the slot (unless it was already produced in place) and stamps it with `frame_idx`."""
+        slot_view = self._frames[slot_idx]
+        if not np.may_share_memory(frame, slot_view):
+            np.copyto(slot_view, frame)
+        self._frame_ids[slot_idx] = frame_idx
+
+    def read(self, slot_idx, frame_idx):
+        """Copy of the slot if it still holds `frame_idx`, otherwise None (the worker has reused the slot)."""
+        if self._frame_ids[slot_idx] != frame_idx:
+            return None
+        frame = self._frames[slot_idx].copy()
+        # ตรวจซ้ำหลังคัดลอก - ถ้า worker เริ่มเขียนทับระหว่างคัดลอก header จะไม่ใช่ frame_idx เดิมแล้ว
+        if self._frame_ids[slot_idx] != frame_idx:
+            return None
+        return frame
+
+    def metadata(self, slot_idx, frame_idx, timestamp):
+        return {
+            'shm_name': self.name, 'shape': self.shape, 'num_slots': self.num_slots,
+            'slot': slot_idx, 'frame_idx': frame_idx, 'timestamp': timestamp
+        }
+
+    def close(self):
+        self._frames = self._frame_ids = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # ยังมี view ของ slot ค้างอยู่ (เช่นเฟรมล่าสุดที่กำลังแสดงผล) หน่วยความจำจะถูกคืนเมื่อ process จบ
+            pass
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,127 @@
+# inference_server.py
+import time
+import queue
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(name)s] - %(message)s')
+logger = logging.getLogger(__name__)
+
+EMPTY_DETECTIONS = np.empty((0, 6), dtype=np.float32)
+
+
+class InferenceClient:
+    """
+    Camera-side handle to the shared inference server.
+    Sends a frame and waits for its detections ((N, 6) array of [x1, y1, x2, y2, conf, cls]).
+    """
+    def __init__(self, cam_name, request_queue, response_queue, response_timeout_seconds=10.0):
+        self.cam_name = cam_name
+        self.request_queue = request_queue
+        self.response_queue = response_queue
+        self.response_timeout_seconds = response_timeout_seconds
+
+    def infer(self, frame, frame_idx):
+        self.request_queue.put((self.cam_name, frame_idx, frame))
+        deadline = time.monotonic() + self.response_timeout_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"[{self.cam_name}] Inference server did not answer frame {frame_idx} in time.")
+                return EMPTY_DETECTIONS
+            try:
+                response_frame_idx, detections = self.response_queue.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            # คำตอบของเฟรมเก่า (ที่เคย timeout ไปแล้ว) ให้ทิ้งไป
+            if response_frame_idx == frame_idx:
+                return detections
+
+
+def _collect_batch(request_queue, max_batch_size, max_wait_seconds):
+    """Waits for the first request, then keeps collecting until the batch is full or the deadline passes."""
+    first_request = request_queue.get(timeout=1.0)
+    if first_request is None:
+        return None
+    batch = [first_request]
+    deadline = time.monotonic() + max_wait_seconds
+    while len(batch) < max_batch_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            request = request_queue.get(timeout=remaining)
+        except queue.Empty:
+            break
+        if request is None:
+            # ส่ง sentinel กลับเข้าคิวเพื่อหยุดหลังจากประมวลผล batch นี้เสร็จ
+            request_queue.put(None)
+            break
+        batch.append(request)
+    return batch
+
+
+def inference_server(config, request_queue, response_queues):
+    """
+    Process entry point. Owns the single YOLO model for all cameras and runs their frames
+    as dynamic batches. Stops when it receives `None` on `request_queue`.
+    Args:
+        config (dict): The full config.yaml content.
+        request_queue (multiprocessing.Queue): Receives (cam_name, frame_idx, frame) tuples.
+        response_queues (dict): {cam_name: multiprocessing.Queue} receiving (frame_idx, detections).
+    """
+    # Import ตอนเริ่ม process เพื่อให้ torch/ultralytics ถูกโหลดเฉพาะใน process ของ server
+    import torch
+    from camera_worker_process import load_yolo_model
+    from detectors.onnx_backend import create_detector
+
+    server_cfg = config.get('inference_server', {})
+    max_batch_size = server_cfg.get('max_batch_size', 8)
+    max_wait_seconds = server_cfg.get('max_wait_ms', 20) / 1000.0
+    num_threads = server_cfg.get('num_threads')
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+
+    # ### เพิ่ม ###: ใช้ backend ONNX Runtime / OpenVINO ถ้าตั้งไว้ใน config ไม่อย่างนั้นใช้ Ultralytics เหมือนเดิม
+    detector = create_detector(config)
+    model = load_yolo_model(config) if detector is None else None
+    logger.info(f"Inference server ready (max_batch_size={max_batch_size}, max_wait_ms={max_wait_seconds * 1000:.0f}).")
+
+    while True:
+        try:
+            batch = _collect_batch(request_queue, max_batch_size, max_wait_seconds)
+        except queue.Empty:
+            continue
+        if batch is None:
+            break
+
+        frames = [frame for _, _, frame in batch]
+        if detector is not None:
+            try:
+                detections_list = detector.detect_batch(frames)
+            except Exception:
+                logger.exception(f"Inference failed for a batch of {len(batch)} frames:")
+                detections_list = [EMPTY_DETECTIONS] * len(batch)
+            for (cam_name, frame_idx, _), detections in zip(batch, detections_list):
+                response_queue = response_queues.get(cam_name)
+                if response_queue is not None:
+                    response_queue.put((frame_idx, detections))
+            continue
+
+        try:
+            with torch.no_grad():
+                results = model.predict(frames, conf=config['detection_confidence_threshold'], classes=config['car_class_id'], verbose=False)
+        except Exception:
+            logger.exception(f"Inference failed for a batch of {len(batch)} frames:")
+            results = [None] * len(batch)
+
+        for (cam_name, frame_idx, _), result in zip(batch, results):
+            if result is not None and result.boxes is not None and len(result.boxes) > 0:
+                detections = result.boxes.data.cpu().numpy().astype(np.float32)
+            else:
+                detections = EMPTY_DETECTIONS
+            response_queue = response_queues.get(cam_name)
+            if response_queue is not None:
+                response_queue.put((frame_idx, detections))
+
+    logger.info("Inference server has stopped.")
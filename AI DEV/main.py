@@ -7,13 +7,15 @@ from sqlalchemy import func
 import logging
 import asyncio 
 # ### เพิ่ม ###: Import Header และ Depends สำหรับ API Key (FEATURE 5)
-from fastapi import FastAPI, Depends, HTTPException, status, Query, Header 
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, Response, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy import func # Import func for aggregate functions
 import schemas
 import database
+from evidence_store import EVIDENCE_MAX_BYTES, IMMUTABLE_CACHE_CONTROL, JPEG_MAGIC, decode_base64_image, evidence_store
 
 thailand_tz = pytz.timezone('Asia/Bangkok')
 # Configure logging for this Worker Process (โค้ดเดิม)
@@ -37,6 +39,7 @@ async def lifespan(app: FastAPI):
 
     logger.info("Application startup: Initializing database tables and other services...")
     database.create_db_tables()
+    database.move_inline_images()
     logger.info("Database tables ensured and ready.")
 
     with next(get_db()) as db_session:
@@ -131,6 +134,13 @@ async def create_inference_result(
             else:
                 timestamp_aware_utc = pv_data.timestamp.astimezone(pytz.utc)
 
+            # ภาพหลักฐานอ้างถึงด้วย image_sha256 (อัปโหลดที่ POST /evidence/ ก่อน); sender เก่าที่ส่ง Base64 มาจะถูกย้ายเข้า evidence_store
+            image_sha256, image_base64 = pv_data.image_sha256, None
+            if pv_data.image_base64 and not image_sha256:
+                image_sha256 = evidence_store.put_base64(pv_data.image_base64)
+                if image_sha256 is None:
+                    image_base64 = pv_data.image_base64
+
             db_item = database.DBParkingViolation( 
                 timestamp=timestamp_aware_utc,
                 branch=pv_data.branch,
@@ -143,10 +153,9 @@ async def create_inference_result(
                 exit_time=pv_data.exit_time.astimezone(pytz.utc) if pv_data.exit_time else None,
                 duration_minutes=pv_data.duration_minutes,
                 is_violation=pv_data.is_violation,
-                total_parking_sessions=pv_data.total_parking_sessions, 
-                # ### เพิ่ม ###: เพิ่มการบันทึกข้อมูลภาพ Base64 (FEATURE 4)
-                # หมายเหตุ: ต้องไปแก้ database.py และ schemas.py ให้มี field นี้ก่อน
-                image_base64=pv_data.image_base64 
+                total_parking_sessions=pv_data.total_parking_sessions,
+                image_sha256=image_sha256,
+                image_base64=image_base64
             )
             db.add(db_item)
             message = "Parking violation data received."
@@ -180,8 +189,52 @@ async def create_inference_result(
             detail=f"Failed to process inference result: {e}"
         )
 
+# --- Evidence Image Upload / Download ---
+async def _read_image(request: Request) -> bytes:
+    """The uploaded image: a raw image/jpeg body, or the `file` part of a multipart/form-data body."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "image/jpeg":
+        return await request.body()
+    if content_type == "multipart/form-data":
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing 'file' part.")
+        return await upload.read()
+    raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Send the image as image/jpeg or as the 'file' part of multipart/form-data.")
+
+@app.post("/evidence/", status_code=status.HTTP_201_CREATED, response_model=schemas.EvidenceUploadResponse,
+    summary="Upload an Evidence Image", dependencies=[Depends(verify_api_key)])
+async def upload_evidence(request: Request, response: Response):
+    """
+    Stores a JPEG evidence image and returns its SHA-256. Events reference the image by that hash
+    (`image_sha256`). Uploading an image that is already stored returns 200 with the same hash.
+    """
+    data = await _read_image(request)
+    if not data:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty image.")
+    if len(data) > EVIDENCE_MAX_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Image too large ({len(data)} bytes, max {EVIDENCE_MAX_BYTES}).")
+    if not data.startswith(JPEG_MAGIC):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Not a JPEG image.")
+
+    sha256, created = await run_in_threadpool(evidence_store.put, data)
+    if not created:
+        response.status_code = status.HTTP_200_OK
+    return {"sha256": sha256, "url": f"/evidence/{sha256}", "size": len(data), "created": created}
+
+@app.get("/evidence/{sha256}", response_class=FileResponse, summary="Get an Evidence Image")
+def get_evidence(sha256: str, if_none_match: Optional[str] = Header(None)):
+    path = evidence_store.get_path(sha256)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found.")
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{sha256}"'}
+    if if_none_match and sha256 in if_none_match:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
 # --- Get Parking Violations Endpoint (โค้ดเดิม) ---
-@app.get("/DBParkingViolation/", response_model=List[schemas.ParkingViolationData], summary="Get Parking Violations")
+@app.get("/DBParkingViolation/", response_model=List[schemas.ParkingViolationListItem], summary="Get Parking Violations")
 def get_DBParkingViolation(
     skip: int = 0,
     limit: int = 100,
@@ -201,8 +254,10 @@ def get_DBParkingViolation(
     logger.info(f"Retrieved {len(violations)} parking violations.")
     
     # ### แก้ไข ###: ปรับปรุงการแปลงเวลาให้ถูกต้องตามชนิดข้อมูลใน DB (naive UTC)
+    # ### แก้ไข ###: ไม่ส่งภาพในรายการ - ส่งแค่ has_image และ URL ของภาพ (โหลดทีละภาพที่ /DBParkingViolation/{id}/image)
     return [
-        schemas.ParkingViolationData(
+        schemas.ParkingViolationListItem(
+            id=v.id,
             timestamp=v.timestamp.replace(tzinfo=pytz.utc).astimezone(thailand_tz) if v.timestamp else None,
             branch=v.branch,
             branch_id=v.branch_id,
@@ -215,10 +270,27 @@ def get_DBParkingViolation(
             duration_minutes=v.duration_minutes,
             is_violation=v.is_violation,
             total_parking_sessions=v.total_parking_sessions,
-            image_base64=v.image_base64 # ### เพิ่ม ###: ส่งข้อมูลภาพกลับไปด้วย
+            has_image=v.has_image,
+            image_url=f"/DBParkingViolation/{v.id}/image" if v.has_image else None
         ) for v in violations
     ]
 
+# --- Get Parking Violation Image Endpoint ---
+@app.get("/DBParkingViolation/{violation_id}/image", response_class=FileResponse, summary="Get the Evidence Image of a Parking Violation")
+def get_DBParkingViolation_image(violation_id: int, db: Session = Depends(get_db)):
+    row = db.query(database.DBParkingViolation.image_sha256, database.DBParkingViolation.image_base64)\
+            .filter(database.DBParkingViolation.id == violation_id).first()
+    if row is not None and row.image_sha256:
+        path = evidence_store.get_path(row.image_sha256)
+        if path is not None:
+            return FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{row.image_sha256}"'})
+    if row is not None and row.image_base64:
+        # ข้อมูลเก่าที่ย้ายเข้า evidence_store ไม่ได้ (move_inline_images ทำตอนเริ่ม app)
+        data = decode_base64_image(row.image_base64)
+        if data is not None:
+            return Response(content=data, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=86400"})
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found.")
+
 # --- Get Table Occupancy Events Endpoint (โค้ดเดิม) ---
 @app.get("/table_occupancy/", response_model=List[schemas.TableOccupancyData], summary="Get Table Occupancy Events")
 def get_table_occupancy(
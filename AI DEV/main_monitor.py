@@ -11,6 +11,9 @@ from pathlib import Path
 import sys 
 # Import the worker function
 from camera_worker_process import camera_worker
+from inference_server import inference_server
+from frame_ring import SharedFrameRing
+from frame_renderer import render_frame
 
 # Import your utility functions
 from utils import load_config, save_parking_statistics
@@ -42,6 +45,17 @@ def run(args):
     stats_queue = Queue()
     
     processes = []
+
+    # ### เพิ่ม ###: Inference server กลาง (โหลดโมเดลครั้งเดียว แล้วรวมเฟรมจากทุกกล้องเป็น batch)
+    inference_server_process = None
+    inference_request_queue = None
+    inference_response_queues = {}
+    if config.get('inference_server', {}).get('enabled', False):
+        inference_request_queue = Queue()
+        inference_response_queues = {cam_cfg['name']: Queue() for cam_cfg in camera_configs}
+        inference_server_process = Process(target=inference_server, args=(config, inference_request_queue, inference_response_queues))
+        inference_server_process.start()
+        print(f"Shared inference server started (PID {inference_server_process.pid}).")
     
     # Start processes for each camera
     for cam_cfg in camera_configs:
@@ -58,7 +72,8 @@ def run(args):
             print(f"Error: ROI file '{roi_file}' for camera '{cam_name}' not found. Skipping.")
             continue
 
-        p = Process(target=camera_worker, args=(cam_cfg, config, display_queue, stats_queue, args.show_display))
+        inference_queues = (inference_request_queue, inference_response_queues[cam_name]) if inference_server_process else None
+        p = Process(target=camera_worker, args=(cam_cfg, config, display_queue, stats_queue, args.show_display, inference_queues))
         processes.append(p)
         p.start()
 
@@ -68,16 +83,35 @@ def run(args):
     print("Press 'q' to quit.")
 
     latest_frames = {}
+    frame_rings = {}
+    draw_bounding_box = config.get('performance_settings', {}).get('draw_bounding_box', True)
     active_processes = {p.pid: p for p in processes}
 
     # Main loop for receiving and displaying frames
     while True:
-        try:
-            cam_name, frame_to_display = display_queue.get(timeout=0.005)
-            latest_frames[cam_name] = frame_to_display
-            #print(f"[Monitor] Received frame for {cam_name}. latest_frames size: {len(latest_frames)}") 
-        except queue.Empty:
-            pass 
+        # ### แก้ไข ###: คิวส่งมาแค่ metadata ส่วนเฟรมอ่านจาก shared memory ของแต่ละกล้องโดยตรง
+        # อ่านทุกข้อความที่ค้างอยู่ เก็บเฉพาะเฟรมล่าสุดของแต่ละกล้อง
+        timeout = 0.005
+        new_frames = {}
+        while True:
+            try:
+                cam_name, frame_meta = display_queue.get(timeout=timeout) if timeout else display_queue.get_nowait()
+            except queue.Empty:
+                break
+            timeout = None
+            ring = frame_rings.get(cam_name)
+            if ring is None or ring.name != frame_meta['shm_name']:
+                ring = SharedFrameRing.attach(frame_meta['shm_name'], frame_meta['shape'], frame_meta['num_slots'])
+                frame_rings[cam_name] = ring
+            new_frames[cam_name] = (ring, frame_meta)
+
+        # ### เพิ่ม ###: วาด overlay ที่นี่ (worker ส่งมาแค่ภาพดิบ + snapshot) เฉพาะเฟรมล่าสุดของแต่ละกล้อง
+        # ring.read คืนสำเนาของ slot เฉพาะเมื่อยังเป็นเฟรมเดียวกับ metadata (snapshot จึงตรงกับภาพเสมอ)
+        # ถ้า worker เขียนทับไปแล้วก็ข้ามไป เฟรมใหม่กว่ากำลังตามมาในคิว
+        for cam_name, (ring, frame_meta) in new_frames.items():
+            frame = ring.read(frame_meta['slot'], frame_meta['frame_idx'])
+            if frame is not None:
+                latest_frames[cam_name] = render_frame(frame, frame_meta.get('render'), draw_bounding_box)
 
         if args.show_display:
             if not latest_frames: # <--- เพิ่มการตรวจสอบนี้:
@@ -125,7 +159,17 @@ def run(args):
             p.terminate()
             p.join()
 
+    if inference_server_process is not None:
+        inference_request_queue.put(None)
+        inference_server_process.join(timeout=10)
+        if inference_server_process.is_alive():
+            inference_server_process.terminate()
+            inference_server_process.join()
+
     cv2.destroyAllWindows()
+    latest_frames.clear()
+    for ring in frame_rings.values():
+        ring.close()
     print("All processes terminated and windows closed.")
 
     all_parking_stats = {}
@@ -0,0 +1,62 @@
+# motion_gate.py
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Decides whether a frame needs a full YOLO pass.
+
+    Compares a small, blurred grayscale copy of the frame against the frame of the last full
+    detection, counting only pixels inside the parking zones. If too few pixels changed, the
+    worker can reuse the previous tracks instead of running the model. A full detection is
+    still forced every `max_skip_seconds` so the tracker never goes stale.
+    """
+    def __init__(self, parking_zones, frame_width, frame_height, fps, downscale_width=160,
+                 pixel_threshold=25, min_changed_ratio=0.005, max_skip_seconds=2.0):
+        self.scale = downscale_width / frame_width if frame_width > 0 else 1.0
+        self.small_size = (max(1, int(frame_width * self.scale)), max(1, int(frame_height * self.scale)))
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_ratio = min_changed_ratio
+        self.max_skip_frames = max(1, int(max_skip_seconds * fps))
+
+        # Mask ของโซนจอดรถที่ความละเอียดต่ำ (ตรวจเฉพาะพิกเซลในโซน)
+        self.zone_mask = np.zeros((self.small_size[1], self.small_size[0]), dtype=np.uint8)
+        for polygon in parking_zones:
+            if len(polygon) >= 3:
+                small_polygon = np.round(np.array(polygon, dtype=np.float32) * self.scale).astype(np.int32)
+                cv2.fillPoly(self.zone_mask, [small_polygon], 255)
+        self.zone_pixels = max(1, cv2.countNonZero(self.zone_mask))
+
+        self.reference_frame = None
+        self.last_detection_frame_idx = None
+        self.skipped_frames = 0
+        self.detected_frames = 0
+
+    def _prepare(self, frame):
+        small = cv2.resize(frame, self.small_size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_detect(self, frame, frame_idx):
+        """Returns True if YOLO should run on this frame, False if the previous tracks can be reused."""
+        prepared = self._prepare(frame)
+
+        needs_detection = (
+            self.reference_frame is None
+            or frame_idx - self.last_detection_frame_idx >= self.max_skip_frames
+            or self.changed_ratio(prepared) >= self.min_changed_ratio
+        )
+        if needs_detection:
+            self.reference_frame = prepared
+            self.last_detection_frame_idx = frame_idx
+            self.detected_frames += 1
+        else:
+            self.skipped_frames += 1
+        return needs_detection
+
+    def changed_ratio(self, prepared_frame):
+        diff = cv2.absdiff(prepared_frame, self.reference_frame)
+        _, changed = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        changed = cv2.bitwise_and(changed, self.zone_mask)
+        return cv2.countNonZero(changed) / self.zone_pixels
@@ -5,6 +5,7 @@ from pathlib import Path
 import cv2
 import numpy as np
 from collections import deque # <<< NEW: Import deque
+from zone_index import ZoneIndex, NO_ZONE
 
 # สามารถเพิ่มหรือปรับเปลี่ยนโครงสร้างของคลาสนี้ตามความต้องการของ logic การจอดรถของคุณ
 # นี่คือตัวอย่างโครงสร้างพื้นฐาน
@@ -17,6 +18,11 @@ class GlobalParkingMonitor:
     def __init__(self, parking_zone_polygons_by_camera, parking_time_limit_minutes=15, movement_threshold_px=5.0, movement_frame_window=10):
         # NEW: parking_zone_polygons_by_camera is now a dictionary {camera_id: parking_zone_polygon_coords_list}
         self.parking_zone_polygons_by_camera = parking_zone_polygons_by_camera
+        # ### เพิ่ม ###: สร้าง ZoneIndex ต่อกล้องครั้งเดียว (รับได้ทั้ง ZoneIndex, list ของ polygon หรือ polygon เดียวแบบเดิม)
+        self.zone_index_by_camera = {
+            camera_id: zones if isinstance(zones, ZoneIndex) else ZoneIndex(self._as_polygon_list(zones))
+            for camera_id, zones in parking_zone_polygons_by_camera.items()
+        }
         self.parking_time_limit_ms = parking_time_limit_minutes * 60 * 1000 # Convert minutes to milliseconds
 
         self.movement_threshold_px = movement_threshold_px
@@ -87,13 +93,15 @@ class GlobalParkingMonitor:
             current_center_x, current_center_y = (g_info['bbox'][0] + g_info['bbox'][2]) / 2, (g_info['bbox'][1] + g_info['bbox'][3]) / 2
             
             # Use the correct parking zone for the last seen camera
-            current_parking_zone = self.parking_zone_polygons_by_camera.get(last_seen_camera_id)
+            zone_index = self.zone_index_by_camera.get(last_seen_camera_id)
             
-            is_in_parking_zone_now = False
-            if current_parking_zone is not None and len(current_parking_zone) > 0:
-                is_in_parking_zone_now = cv2.pointPolygonTest(np.array(current_parking_zone, np.int32), (current_center_x, current_center_y), False) >= 0
+            zone_id = NO_ZONE
+            if zone_index is not None:
+                zone_id = zone_index.zone_id_at((current_center_x, current_center_y))
+            is_in_parking_zone_now = zone_id != NO_ZONE
             
             car_state['is_in_parking_zone'] = is_in_parking_zone_now
+            car_state['zone_id'] = zone_id
 
             # Determine movement
             is_moving = self._check_movement(car_state['history_bboxes_centers'])
@@ -148,6 +156,15 @@ class GlobalParkingMonitor:
             car_state['current_status'] = 'OUT OF ZONE'
             car_state['parking_start_time_ms'] = None # Reset parking time
 
+    @staticmethod
+    def _as_polygon_list(zones):
+        """Wraps a single polygon ([[x, y], ...]) into a list of polygons."""
+        if zones is None or len(zones) == 0:
+            return []
+        if np.asarray(zones[0]).ndim == 1:
+            return [zones]
+        return zones
+
     def _check_movement(self, history_bboxes_centers):
         """
         Checks if the car has moved significantly based on its history of bounding box centers.
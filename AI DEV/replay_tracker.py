@@ -0,0 +1,300 @@
+# replay_tracker.py
+"""
+Replays recorded or synthetic tracks through CarTrackerManager without a model or a video, to
+benchmark the parking logic on a plain CPU box and to check its events against a golden file.
+
+    # ผล track ที่ worker บันทึกไว้ (save_mot_results: True) - โซนจะถูกย่อแบบเดียวกับใน worker
+    python replay_tracker.py --mot runs/.../mot_results/mot.txt --zones parking_zone_camera1.json --source-size 1920 1080
+
+    # รถสังเคราะห์ 60 คัน 20000 เฟรม แล้วเก็บ event ไว้เป็น golden file
+    python replay_tracker.py --zones parking_zone_camera1.json --source-size 1920 1080 --synthetic 60 --frames 20000 --write-golden golden.jsonl
+
+    # รันซ้ำหลังแก้โค้ด (หรือกับ engine อื่น) แล้วเทียบกับ golden file
+    python replay_tracker.py --zones parking_zone_camera1.json --source-size 1920 1080 --synthetic 60 --frames 20000 --golden golden.jsonl --engine vectorized
+
+    # dict กับ vectorized ต้องได้ event เหมือนกันทุกตัว - รันทั้งสองแบบหลังแก้ engine ใดก็ตาม:
+    # รถไม่กระพริบ และรถที่ detection หายบ่อยกับเวลาจำกัดสั้นๆ (warning / violation มาจาก timer ของรถที่ไม่ถูกตรวจพบ)
+    python replay_tracker.py --zones parking_zone_camera1.json --source-size 1920 1080 --synthetic 60 --frames 20000 --dropout 0 --compare-engines
+    python replay_tracker.py --zones parking_zone_camera1.json --source-size 1920 1080 --synthetic 100 --frames 15000 --dropout 0.2 --debug-limits 2 1 --parked-timeout 20 --compare-engines
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+import tracemalloc
+from collections import Counter
+import numpy as np
+
+from utils import load_config, load_parking_zone
+from zone_index import ZoneIndex
+from detections import Detections
+from car_tracker_manager import CarTrackerManager
+from vectorized_tracker_manager import VectorizedCarTrackerManager
+
+# ค่าของ event ที่ขึ้นกับเวลาจริงตอนรัน จึงไม่นำมาเทียบกับ golden file
+WALL_CLOCK_FIELDS = ('entry_time', 'exit_time', 'image_jpeg')
+
+
+def read_mot_frames(mot_path, frame_step=1, default_cls=2):
+    """
+    Streams a MOTChallenge file written by utils.write_mot_results as (frame_idx, tracks) pairs,
+    for every `frame_step`-th frame from the first frame in the file to the last one (a frame
+    without lines gives an empty list). frame_idx is 0-based again and the tracks are dicts in
+    the same form the worker passes to CarTrackerManager.update. The MOT format has no class,
+    so every track gets `default_cls`.
+    """
+    next_frame, tracks = None, []
+    with open(mot_path, 'r') as f:
+        for line in f:
+            fields = line.split(',')
+            if len(fields) < 7:
+                continue
+            frame_idx = int(fields[0]) - 1
+            if next_frame is None:
+                next_frame = frame_idx
+            while frame_idx >= next_frame + frame_step:
+                yield next_frame, tracks
+                next_frame, tracks = next_frame + frame_step, []
+            if frame_idx != next_frame:
+                continue  # เฟรมที่ไม่ตรงกับ frame_step
+            left, top, width, height = (float(v) for v in fields[2:6])
+            tracks.append({
+                'id': int(fields[1]),
+                'bbox': np.array([round(left), round(top), round(left + width), round(top + height)], dtype=int),
+                'conf': float(fields[6]),
+                'cls': default_cls
+            })
+    if next_frame is not None:
+        yield next_frame, tracks
+
+
+def synthetic_frames(zone_index, num_cars, num_frames, fps, seed=0, dropout=0.05, cls=2):
+    """
+    Deterministic synthetic traffic for `num_frames` frames. Each of `num_cars` parking slots
+    repeatedly gets a car that drives in from the frame edge to a random point inside a zone,
+    stays there (with 1 px of detector jitter) for 10 s to 30 min and drives out again; every
+    arrival gets a new track id. A visible car is missed by the detector with probability
+    `dropout` on each frame.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = zone_index.width, zone_index.height
+
+    def random_target():
+        for _ in range(1000):
+            point = rng.uniform((0, 0), (width, height))
+            if zone_index.zone_id_at(point):
+                return point
+        raise ValueError("Could not place a synthetic car inside the parking zones.")
+
+    def new_visit(start_frame):
+        entry = np.array([rng.choice([0.0, width]), rng.uniform(0, height)])
+        drive_frames = int(rng.uniform(3, 8) * fps)
+        park_frames = int(rng.uniform(10, 30 * 60) * fps)
+        return {
+            'id': next(track_ids), 'size': rng.uniform((40, 25), (80, 50)), 'entry': entry, 'target': random_target(),
+            'arrive': start_frame, 'parked': start_frame + drive_frames,
+            'leave': start_frame + drive_frames + park_frames, 'gone': start_frame + 2 * drive_frames + park_frames
+        }
+
+    track_ids = iter(range(1, 1 << 62))
+    visits = [new_visit(int(rng.uniform(0, 60) * fps)) for _ in range(num_cars)]
+    for frame_idx in range(num_frames):
+        tracks = []
+        for slot, visit in enumerate(visits):
+            if frame_idx >= visit['gone']:
+                visit = visits[slot] = new_visit(frame_idx + int(rng.uniform(1, 120) * fps))
+            if frame_idx < visit['arrive']:
+                continue
+            if frame_idx < visit['parked']:
+                progress = (frame_idx - visit['arrive']) / (visit['parked'] - visit['arrive'])
+                center = visit['entry'] + (visit['target'] - visit['entry']) * progress
+            elif frame_idx < visit['leave']:
+                center = visit['target'] + rng.integers(-1, 2, 2)
+            else:
+                progress = (frame_idx - visit['leave']) / (visit['gone'] - visit['leave'])
+                center = visit['target'] + (visit['entry'] - visit['target']) * progress
+            if rng.random() < dropout:
+                continue
+            half = visit['size'] / 2
+            tracks.append({'id': visit['id'], 'bbox': np.concatenate([center - half, center + half]).astype(int), 'conf': 0.9, 'cls': cls})
+        yield frame_idx, tracks
+
+
+def filter_tracks_in_zones(tracks, zone_index):
+    """Same box filter as the worker: Detections of the tracks whose bbox center is inside a parking zone."""
+    detections = Detections.from_track_dicts(tracks)
+    return detections[zone_index.contains(detections.centers)]
+
+
+def build_manager(config, cam_cfg, zones, zone_index, fps, engine):
+    """Creates the tracker manager with the same parameters as camera_worker_async."""
+    parking_time_limit_minutes = cam_cfg.get('parking_time_limit_minutes', config.get('parking_time_limit_minutes', 15))
+    warning_time_limit_minutes = cam_cfg.get('warning_time_limit_minutes', config.get('warning_time_limit_minutes'))
+    if warning_time_limit_minutes is None:
+        warning_time_limit_minutes = parking_time_limit_minutes - 2 if isinstance(parking_time_limit_minutes, int) and parking_time_limit_minutes > 2 else 13
+    manager_class = VectorizedCarTrackerManager if engine == 'vectorized' else CarTrackerManager
+    return manager_class(
+        zones,
+        parking_time_limit_minutes,
+        cam_cfg.get('movement_threshold_px', config.get('movement_threshold_px', 5)),
+        cam_cfg.get('movement_frame_window', config.get('movement_frame_window', 30)),
+        warning_time_limit_minutes,
+        fps,
+        config,
+        zone_index=zone_index
+    )
+
+
+def normalize_event(event, frame_idx):
+    """JSON-ready copy of an API event without its wall-clock fields, tagged with the frame it was emitted on."""
+    record = {'frame_idx': frame_idx}
+    record.update((key, value) for key, value in event.items() if key not in WALL_CLOCK_FIELDS)
+    return record
+
+
+def replay(manager, frames, zone_index, trace_memory=False):
+    """
+    Feeds `frames` ((frame_idx, tracks) pairs) through `manager.update` and then finalizes the
+    remaining sessions like the worker does at the end of a video. Only the update() calls are
+    timed. Returns (per-frame latencies in seconds, normalized events, peak traced bytes or None).
+    """
+    resized_frame = np.zeros((zone_index.height, zone_index.width, 3), dtype=np.uint8)
+    latencies, events = [], []
+    frame_idx = 0
+    if trace_memory:
+        tracemalloc.start()
+    for frame_idx, tracks in frames:
+        tracks = filter_tracks_in_zones(tracks, zone_index)
+        start = time.perf_counter()
+        manager.update(tracks, frame_idx, resized_frame)
+        latencies.append(time.perf_counter() - start)
+        events.extend(normalize_event(event, frame_idx) for event in manager.get_parking_events_for_api())
+    manager.finalize_all_sessions(frame_idx)
+    events.extend(normalize_event(event, frame_idx) for event in manager.get_parking_events_for_api(wait=True))
+    peak_bytes = None
+    if trace_memory:
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    manager.evidence_encoder.shutdown()
+    return np.array(latencies), events, peak_bytes
+
+
+def diff_events(events, golden_events, max_differences=10):
+    """Returns human-readable differences between two event sequences (empty if they are identical)."""
+    differences = []
+    for i, (event, golden) in enumerate(zip(events, golden_events)):
+        if event != golden:
+            differences.append(f"event #{i}: expected {golden}, got {event}")
+            if len(differences) >= max_differences:
+                return differences
+    if len(events) != len(golden_events):
+        differences.append(f"expected {len(golden_events)} events, got {len(events)}")
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay MOT or synthetic tracks through CarTrackerManager (no model, no video).")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--mot", type=str, help="MOT file written by the worker (save_mot_results: True).")
+    source.add_argument("--synthetic", type=int, metavar="NUM_CARS", help="Generate synthetic traffic with this many parking slots.")
+    parser.add_argument("--config-file", type=str, default="config.yaml", help="Configuration file (thresholds, tracker_engine, ...).")
+    parser.add_argument("--camera", type=str, help="Name of a video_sources entry: its parking_zone_file and per-camera overrides are used.")
+    parser.add_argument("--zones", type=str, help="Parking zone JSON file (overrides the camera's parking_zone_file).")
+    parser.add_argument("--source-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="Resolution the zones were drawn on; they are scaled to target_inference_width like in the worker.")
+    parser.add_argument("--fps", type=float, default=30.0, help="FPS of the recorded or synthetic source.")
+    parser.add_argument("--engine", choices=["dict", "vectorized"], help="Tracker engine (default: tracker_engine in the config).")
+    parser.add_argument("--compare-engines", action="store_true", help="Replay through both engines and fail (exit code 1) if their events differ.")
+    parser.add_argument("--debug-limits", type=float, nargs=2, metavar=("VIOLATION_MIN", "WARNING_MIN"), help="Enable debug_settings with these violation / warning limits in minutes.")
+    parser.add_argument("--parked-timeout", type=float, metavar="SECONDS", help="Override parked_car_timeout_seconds.")
+    parser.add_argument("--frames", type=int, default=10000, help="Number of synthetic frames.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic traffic.")
+    parser.add_argument("--dropout", type=float, default=0.05, help="Per-frame probability that a synthetic car is not detected.")
+    parser.add_argument("--frame-step", type=int, default=1, help="Replay every N-th MOT frame (use the worker's frames_to_skip).")
+    parser.add_argument("--golden", type=str, help="Compare the emitted events with this JSON-lines file (exit code 1 if they differ).")
+    parser.add_argument("--write-golden", type=str, help="Write the emitted events to this JSON-lines file.")
+    parser.add_argument("--trace-memory", action="store_true", help="Report the peak Python memory (tracemalloc, slows the replay down).")
+    parser.add_argument("--verbose", action="store_true", help="Show the manager's own log output.")
+    args = parser.parse_args()
+
+    config = load_config(args.config_file)
+    if args.debug_limits:
+        config['debug_settings'] = dict(config.get('debug_settings', {}), enabled=True, mock_violation_minutes=args.debug_limits[0], mock_warning_minutes=args.debug_limits[1])
+    if args.parked_timeout is not None:
+        config['parked_car_timeout_seconds'] = args.parked_timeout
+    cam_cfg = next((cam for cam in config.get('video_sources', []) if cam.get('name') == args.camera), {}) if args.camera else {}
+    zone_file = args.zones or cam_cfg.get('parking_zone_file')
+    zones = load_parking_zone(zone_file) if zone_file else None
+    if not zones:
+        parser.error("No parking zones: use --zones or --camera with a valid parking_zone_file.")
+
+    if args.source_size:
+        source_width, source_height = args.source_size
+        target_width = config.get('performance_settings', {}).get('target_inference_width', 640)
+        target_height = int(source_height * (target_width / source_width))
+        scale_x, scale_y = target_width / source_width, target_height / source_height
+        zones = [[[int(p[0] * scale_x), int(p[1] * scale_y)] for p in polygon] for polygon in zones]
+        zone_index = ZoneIndex(zones, target_width, target_height)
+    else:
+        zone_index = ZoneIndex(zones)
+
+    engines = ['dict', 'vectorized'] if args.compare_engines else [args.engine or config.get('tracker_engine', 'dict')]
+    events_by_engine = {}
+    for engine in engines:
+        log_output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with log_output:
+            manager = build_manager(config, cam_cfg, zones, zone_index, args.fps, engine)
+            if args.mot:
+                frames = read_mot_frames(args.mot, args.frame_step)
+            else:
+                frames = synthetic_frames(zone_index, args.synthetic, args.frames, args.fps, args.seed, args.dropout)
+            wall_start = time.perf_counter()
+            latencies, events, peak_bytes = replay(manager, frames, zone_index, args.trace_memory)
+            wall_seconds = time.perf_counter() - wall_start
+
+        if len(latencies) == 0:
+            print("No frames to replay.")
+            return 1
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+        print(f"Frames: {len(latencies)} (engine={engine}, zones={zone_index.zone_count}, {zone_index.width}x{zone_index.height})")
+        print(f"update(): {len(latencies) / latencies.sum():.0f} frames/s, latency p50 {p50:.3f} ms, p90 {p90:.3f} ms, p99 {p99:.3f} ms, max {latencies.max() * 1000:.3f} ms")
+        print(f"Total wall time (incl. track generation): {wall_seconds:.2f} s")
+        if peak_bytes is not None:
+            print(f"Peak traced memory: {peak_bytes / 1e6:.2f} MB")
+        event_counts = Counter(event['event_type'] for event in events)
+        print(f"Events: {len(events)} ({', '.join(f'{name}: {count}' for name, count in sorted(event_counts.items()))})")
+        events_by_engine[engine] = events
+
+    if args.compare_engines:
+        # เทียบผ่าน JSON แบบเดียวกับ golden file
+        differences = diff_events(json.loads(json.dumps(events_by_engine['vectorized'])), json.loads(json.dumps(events_by_engine['dict'])))
+        if differences:
+            print("Engine check FAILED (expected = dict, got = vectorized):")
+            for difference in differences:
+                print(f"  {difference}")
+            return 1
+        print(f"Engine check passed ({len(events_by_engine['dict'])} identical events).")
+
+    if args.write_golden:
+        with open(args.write_golden, 'w', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+        print(f"Golden events written to {args.write_golden}")
+
+    if args.golden:
+        with open(args.golden, 'r', encoding='utf-8') as f:
+            golden_events = [json.loads(line) for line in f if line.strip()]
+        # เทียบผ่าน JSON เพื่อให้ชนิดตัวเลข (numpy / tuple) ตรงกับที่อ่านจากไฟล์
+        differences = diff_events(json.loads(json.dumps(events)), golden_events)
+        if differences:
+            print(f"Golden check FAILED against {args.golden}:")
+            for difference in differences:
+                print(f"  {difference}")
+            return 1
+        print(f"Golden check passed ({len(golden_events)} events).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,7 +11,7 @@ class BaseAnalyticsEvents(BaseModel):
     camera_id: str =Field(..., examples="cam_01")
     event_type: str = Field(...,description= "Type of event (e.g., 'parking_violation', 'table_occupancy', 'chilled_basket_alert', 'beverage_stock_update')")
 
-class ParkingViolationData(BaseAnalyticsEvents):
+class ParkingViolationRecord(BaseAnalyticsEvents):
     event_type: str
     # vehicle_id: str = Field(...,examples="ABC-1234")
     car_id: Optional[int] = Field(None, examples=101, description="Unique tracking ID for the vehicle.")
@@ -22,8 +22,17 @@ class ParkingViolationData(BaseAnalyticsEvents):
     duration_minutes: float= Field(...,examples=20.5)
     is_violation: bool= Field(...,examples=True)
     total_parking_sessions: int = Field(..., examples=15, description="Accumulated total parking sessions for this camera since start or last reset.")
+
+class ParkingViolationData(ParkingViolationRecord):
      # ### FIX: เพิ่ม field สำหรับรับภาพ Base64 ###
-    image_base64: Optional[str] = Field(None, description="Base64 encoded snapshot of the violation.")
+    image_base64: Optional[str] = Field(None, description="Base64 encoded snapshot of the violation (older senders; stored as image_sha256 on ingestion).")
+    image_sha256: Optional[str] = Field(None, pattern=r"^[0-9a-f]{64}$", description="SHA-256 of the snapshot uploaded to POST /evidence/.")
+
+# ### เพิ่ม ###: รายการใน GET /DBParkingViolation/ - ไม่มีตัวภาพ มีแค่ flag และ URL ของภาพ
+class ParkingViolationListItem(ParkingViolationRecord):
+    id: int
+    has_image: bool = Field(..., examples=True)
+    image_url: Optional[str] = Field(None, examples="/DBParkingViolation/123/image")
 
 class TableOccupancyData(BaseAnalyticsEvents):
     event_type: Literal["table_occupancy"] = "table_occupancy"
@@ -55,6 +64,12 @@ class InferenceResultResponse(BaseModel):
     message: str = Field(..., examples="Parking violation data received.")
     id: int = Field(..., examples=123)
 
+class EvidenceUploadResponse(BaseModel):
+    sha256: str = Field(..., description="Content hash of the image; reference it as `image_sha256` in the event.")
+    url: str = Field(..., examples="/evidence/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08")
+    size: int = Field(..., examples=48213)
+    created: bool = Field(..., description="False if the same image was already stored.")
+
 
 
 
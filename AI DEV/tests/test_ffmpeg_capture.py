@@ -0,0 +1,230 @@
+# tests/test_ffmpeg_capture.py
+"""
+Runs the real ffmpeg/ffprobe binaries on a short generated clip (skipped when they are not on PATH).
+
+    cd "AI DEV" && python -m pytest -q tests
+"""
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from ffmpeg_capture import FFmpegCapture, FullResolutionReader, probe_video  # noqa: E402
+from frame_grabber import FrameGrabber  # noqa: E402
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None,
+                                reason="ffmpeg/ffprobe not found on PATH")
+
+CLIP_WIDTH, CLIP_HEIGHT, CLIP_FPS, CLIP_SECONDS = 320, 240, 10, 3
+CLIP_FRAMES = CLIP_FPS * CLIP_SECONDS
+OUTPUT_WIDTH = 160
+OUTPUT_HEIGHT = int(CLIP_HEIGHT * (OUTPUT_WIDTH / CLIP_WIDTH))
+# ffmpeg (swscale) กับ OpenCV แปลงสี/ย่อภาพต่างกันเล็กน้อย - ค่าเฉลี่ยต่างกันไม่เกินนี้ถือว่าเป็นเฟรมเดียวกัน
+MAX_MEAN_DIFF = 8.0
+
+
+@pytest.fixture(scope='module')
+def clip(tmp_path_factory):
+    path = tmp_path_factory.mktemp('clip') / 'clip.mp4'
+    subprocess.run(['ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error',
+                    '-f', 'lavfi', '-i', f"testsrc2=size={CLIP_WIDTH}x{CLIP_HEIGHT}:rate={CLIP_FPS}",
+                    '-t', str(CLIP_SECONDS), '-c:v', 'mpeg4', '-q:v', '2', '-pix_fmt', 'yuv420p', str(path)],
+                   check=True, timeout=60)
+    return path
+
+
+def opencv_frames(path, width=None):
+    cap = cv2.VideoCapture(str(path))
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if width:
+            frame = cv2.resize(frame, (width, int(frame.shape[0] * (width / frame.shape[1]))), interpolation=cv2.INTER_AREA)
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def mean_diff(a, b):
+    return float(np.mean(np.abs(a.astype(np.int16) - b.astype(np.int16))))
+
+
+def read_all(cap):
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            return frames
+        frames.append(frame)
+
+
+def test_probe_video(clip):
+    width, height, fps = probe_video(clip)
+    assert (width, height) == (CLIP_WIDTH, CLIP_HEIGHT)
+    assert fps == pytest.approx(CLIP_FPS)
+
+
+def test_reads_every_frame_downscaled_then_eof(clip):
+    cap = FFmpegCapture(clip, output_width=OUTPUT_WIDTH)
+    try:
+        assert cap.isOpened()
+        assert (cap.source_width, cap.source_height) == (CLIP_WIDTH, CLIP_HEIGHT)
+        assert cap.get(cv2.CAP_PROP_FRAME_WIDTH) == OUTPUT_WIDTH
+        assert cap.get(cv2.CAP_PROP_FRAME_HEIGHT) == OUTPUT_HEIGHT
+        assert cap.get(cv2.CAP_PROP_FPS) == pytest.approx(CLIP_FPS)
+
+        frames = read_all(cap)
+        assert len(frames) == CLIP_FRAMES
+        for frame in frames:
+            assert frame.shape == (OUTPUT_HEIGHT, OUTPUT_WIDTH, 3)
+            assert frame.dtype == np.uint8
+
+        # EOF: อ่านซ้ำก็ยังได้ (False, None) ไม่ค้างหรือ raise
+        assert cap.read() == (False, None)
+        assert cap.read() == (False, None)
+    finally:
+        cap.release()
+    assert cap.process is None
+    assert not cap.isOpened()
+    assert cap.read() == (False, None)
+    cap.release()
+
+    # ต้องเป็นภาพเดียวกับเส้นทางเดิม (cv2.VideoCapture + cv2.resize INTER_AREA) ทีละเฟรม
+    expected = opencv_frames(clip, OUTPUT_WIDTH)
+    assert len(expected) == CLIP_FRAMES
+    for frame, reference in zip(frames, expected):
+        assert mean_diff(frame, reference) < MAX_MEAN_DIFF
+
+
+def test_frames_are_not_reused(clip):
+    cap = FFmpegCapture(clip, output_width=OUTPUT_WIDTH)
+    try:
+        frames = read_all(cap)
+    finally:
+        cap.release()
+    first = frames[0].copy()
+    assert not any(np.shares_memory(frames[0], frame) for frame in frames[1:])
+    assert np.array_equal(frames[0], first)
+    # testsrc2 เปลี่ยนทุกเฟรม ถ้า buffer ถูกใช้ซ้ำ เฟรมแรกจะกลายเป็นเฟรมสุดท้าย
+    assert not np.array_equal(frames[0], frames[-1])
+
+
+def test_restart_reads_from_the_first_frame(clip):
+    first_pass = FFmpegCapture(clip, output_width=OUTPUT_WIDTH)
+    try:
+        expected = read_all(first_pass)
+    finally:
+        first_pass.release()
+
+    second_pass = FFmpegCapture(clip, output_width=OUTPUT_WIDTH)
+    try:
+        frames = read_all(second_pass)
+    finally:
+        second_pass.release()
+    assert len(frames) == CLIP_FRAMES
+    assert all(np.array_equal(a, b) for a, b in zip(frames, expected))
+
+
+def test_release_before_eof(clip):
+    cap = FFmpegCapture(clip, output_width=OUTPUT_WIDTH)
+    ret, frame = cap.read()
+    assert ret and frame.shape == (OUTPUT_HEIGHT, OUTPUT_WIDTH, 3)
+    process = cap.process
+    cap.release()
+    assert process.poll() is not None
+    assert cap.read() == (False, None)
+
+
+def test_fps_filter(clip):
+    cap = FFmpegCapture(clip, output_width=OUTPUT_WIDTH, output_fps=CLIP_FPS / 2)
+    try:
+        assert cap.get(cv2.CAP_PROP_FPS) == pytest.approx(CLIP_FPS / 2)
+        frames = read_all(cap)
+    finally:
+        cap.release()
+    assert abs(len(frames) - CLIP_FRAMES // 2) <= 1
+
+
+def test_missing_source(tmp_path):
+    cap = FFmpegCapture(tmp_path / 'missing.mp4', output_width=OUTPUT_WIDTH)
+    assert not cap.isOpened()
+    assert cap.get(cv2.CAP_PROP_FRAME_WIDTH) == 0
+    assert cap.read() == (False, None)
+    cap.release()
+
+
+def test_full_resolution_frames_match_downscaled_frames(clip):
+    kept = 5
+    cap = FFmpegCapture(clip, output_width=OUTPUT_WIDTH, full_resolution_frames=kept)
+    try:
+        frames = read_all(cap)
+        assert len(frames) == CLIP_FRAMES
+        for seq in range(CLIP_FRAMES - kept + 1, CLIP_FRAMES + 1):
+            full = cap.read_full_resolution(seq)
+            assert full is not None and full.shape == (CLIP_HEIGHT, CLIP_WIDTH, 3)
+            small = cv2.resize(full, (OUTPUT_WIDTH, OUTPUT_HEIGHT), interpolation=cv2.INTER_AREA)
+            # เฟรมที่ seq ตรงกันต้องใกล้กว่าเฟรมข้างเคียง (ไม่เลื่อนไปหนึ่งเฟรม)
+            diff = mean_diff(small, frames[seq - 1])
+            assert diff < MAX_MEAN_DIFF
+            assert diff < mean_diff(small, frames[seq - 2])
+        # หลุดออกจาก ring แล้ว
+        assert cap.read_full_resolution(1, timeout=0.1) is None
+    finally:
+        cap.release()
+
+
+def test_frame_grabber_reconnects_after_eof(clip):
+    def open_capture(source_path):
+        return FFmpegCapture(source_path, output_width=OUTPUT_WIDTH, is_stream=True, full_resolution_frames=CLIP_FRAMES)
+
+    grabber = FrameGrabber(clip, name='test', reconnect_delay_seconds=0.2, open_capture=open_capture)
+    # เล่นไฟล์แบบสตรีม: จบไฟล์ = สตรีมหลุด แล้วต้องเปิด ffmpeg ตัวใหม่และนับ frame_idx ต่อ
+    grabber.is_stream = True
+    assert (grabber.width, grabber.height) == (OUTPUT_WIDTH, OUTPUT_HEIGHT)
+    assert (grabber.source_width, grabber.source_height) == (CLIP_WIDTH, CLIP_HEIGHT)
+    first_capture = grabber.cap
+    grabber.start()
+
+    received = []
+    deadline = time.monotonic() + 30
+    try:
+        while time.monotonic() < deadline:
+            item = grabber.read(timeout=1.0)
+            if item is None:
+                continue
+            frame, frame_idx, _ = item
+            received.append((frame, frame_idx))
+            if frame_idx > grabber.capture_frame_offset > 0:
+                break
+    finally:
+        grabber.stop()
+
+    assert grabber.cap is not first_capture
+    assert first_capture.process is None
+    # ทุกเฟรมของรอบก่อนถูกนับ (รวมที่ถูก drop) - ต้องเท่ากับจำนวนเฟรมของไฟล์พอดีต่อหนึ่งรอบ
+    offset = grabber.capture_frame_offset
+    assert offset > 0 and offset % CLIP_FRAMES == 0
+    frame_indexes = [frame_idx for _, frame_idx in received]
+    assert frame_indexes == sorted(set(frame_indexes))
+    for frame, _ in received:
+        assert frame.shape == (OUTPUT_HEIGHT, OUTPUT_WIDTH, 3)
+
+    # เฟรมหลัง reconnect ต้องจับคู่กับภาพความละเอียดเต็มของ capture ตัวใหม่ได้ถูกเฟรม
+    frame, frame_idx = received[-1]
+    assert frame_idx > offset
+    reader = FullResolutionReader(clip, is_stream=True, frame_grabber=grabber)
+    full = reader.read(frame_idx)
+    assert full is not None and full.shape == (CLIP_HEIGHT, CLIP_WIDTH, 3)
+    small = cv2.resize(full, (OUTPUT_WIDTH, OUTPUT_HEIGHT), interpolation=cv2.INTER_AREA)
+    assert mean_diff(small, frame) < MAX_MEAN_DIFF
+    # frame_idx ของรอบก่อนไม่ถูกจับคู่กับ capture ตัวใหม่
+    assert reader.read(offset, fallback='fallback') == 'fallback'
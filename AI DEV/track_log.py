@@ -0,0 +1,247 @@
+# track_log.py
+"""
+Binary columnar log of the per-frame tracks of a camera (replaces the MOT text file for 24/7 recording).
+
+File layout:
+    MAGIC
+    block*   : BLOCK_HEADER (rows, first_frame, last_frame) + one uint32 compressed size per column,
+               then every column as zlib-compressed little-endian numpy bytes (COLUMNS order)
+    footer   : INDEX_DTYPE array (offset, first_frame, last_frame, rows) of every block
+    trailer  : TRAILER (footer offset, block count) + END_MAGIC
+
+The footer is written by close(). A file without one (worker killed) is still readable: the
+reader then walks the block headers from the start.
+
+    python track_log.py to-mot runs/.../track_log/tracks.trk mot.txt
+"""
+import argparse
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+import logging
+from pathlib import Path
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TRKLOG1\0'
+END_MAGIC = b'TRKEND1\0'
+BLOCK_HEADER = struct.Struct('<Iqq')
+TRAILER = struct.Struct('<QI')
+
+COLUMNS = (
+    ('frame_idx', '<i8'), ('id', '<i8'),
+    ('x1', '<f4'), ('y1', '<f4'), ('x2', '<f4'), ('y2', '<f4'),
+    ('conf', '<f4'), ('cls', '<i2'), ('zone_id', 'u1'), ('status', 'i1'),
+)
+INDEX_DTYPE = np.dtype([('offset', '<u8'), ('first_frame', '<i8'), ('last_frame', '<i8'), ('rows', '<u4')])
+COLUMN_SIZES = struct.Struct('<' + 'I' * len(COLUMNS))
+
+
+def _empty_columns(rows):
+    return {name: np.empty(rows, dtype=dtype) for name, dtype in COLUMNS}
+
+
+class TrackLogWriter:
+    """
+    Buffers the tracks of every frame into fixed-size numpy column chunks and hands full chunks
+    to a background thread, which compresses and appends them to the file. `append()` only
+    copies a few arrays, so the frame loop never waits on compression or disk I/O. A partial
+    chunk is also handed over after `flush_seconds`, which bounds what a crash can lose.
+    """
+    def __init__(self, path, chunk_rows=65536, flush_seconds=60.0, compress_level=6):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.chunk_rows = chunk_rows
+        self.flush_seconds = flush_seconds
+        self.compress_level = compress_level
+        self._file = open(self.path, 'wb')
+        self._file.write(MAGIC)
+        self._index = []
+        self._chunk = _empty_columns(chunk_rows)
+        self._rows = 0
+        self._chunk_started = time.monotonic()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"TrackLogWriter-{self.path.stem}", daemon=True)
+        self._thread.start()
+
+    def append(self, frame_idx, ids, boxes, conf, cls, zone_ids, statuses):
+        """
+        Adds the tracks of one frame.
+        Args:
+            frame_idx (int): Frame index (0-based).
+            ids, conf, cls, zone_ids, statuses: Arrays of length N (status = TrackStatus value, -1 if untracked).
+            boxes: (N, 4) array of [x1, y1, x2, y2].
+        """
+        rows = len(ids)
+        start = 0
+        boxes = np.asarray(boxes).reshape(-1, 4)
+        while start < rows:
+            count = min(rows - start, self.chunk_rows - self._rows)
+            dst, src = slice(self._rows, self._rows + count), slice(start, start + count)
+            chunk = self._chunk
+            chunk['frame_idx'][dst] = frame_idx
+            chunk['id'][dst] = ids[src]
+            chunk['x1'][dst], chunk['y1'][dst], chunk['x2'][dst], chunk['y2'][dst] = boxes[src].T
+            chunk['conf'][dst] = conf[src]
+            chunk['cls'][dst] = cls[src]
+            chunk['zone_id'][dst] = zone_ids[src]
+            chunk['status'][dst] = statuses[src]
+            self._rows += count
+            start += count
+            if self._rows == self.chunk_rows:
+                self._submit_chunk()
+        if self._rows and time.monotonic() - self._chunk_started >= self.flush_seconds:
+            self._submit_chunk()
+
+    def _submit_chunk(self):
+        if self._rows:
+            self._queue.put({name: column[:self._rows] for name, column in self._chunk.items()})
+            self._chunk = _empty_columns(self.chunk_rows)
+            self._rows = 0
+        self._chunk_started = time.monotonic()
+
+    def _run(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+            try:
+                self._write_block(chunk)
+            except Exception as e:
+                logger.error(f"Could not write track log block to {self.path}: {e}")
+
+    def _write_block(self, chunk):
+        frames = chunk['frame_idx']
+        payloads = [zlib.compress(np.ascontiguousarray(chunk[name], dtype=dtype).tobytes(), self.compress_level) for name, dtype in COLUMNS]
+        offset = self._file.tell()
+        self._file.write(BLOCK_HEADER.pack(len(frames), int(frames[0]), int(frames[-1])))
+        self._file.write(COLUMN_SIZES.pack(*(len(payload) for payload in payloads)))
+        for payload in payloads:
+            self._file.write(payload)
+        self._file.flush()
+        self._index.append((offset, int(frames[0]), int(frames[-1]), len(frames)))
+
+    def close(self):
+        """Writes the buffered tracks and the footer, and closes the file."""
+        self._submit_chunk()
+        self._queue.put(None)
+        self._thread.join()
+        footer_offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype=INDEX_DTYPE).tobytes())
+        self._file.write(TRAILER.pack(footer_offset, len(self._index)))
+        self._file.write(END_MAGIC)
+        self._file.close()
+
+
+class TrackLogReader:
+    """Reads a track log. Blocks are located through the footer, so reading a frame range only decompresses the blocks that overlap it."""
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a track log.")
+            self.index = self._read_footer(f)
+            if self.index is None:
+                logger.warning(f"{self.path} has no footer (writer was not closed); scanning blocks.")
+                self.index = self._scan_blocks(f)
+
+    @staticmethod
+    def _read_footer(f):
+        f.seek(0, 2)
+        file_size = f.tell()
+        if file_size < len(MAGIC) + TRAILER.size + len(END_MAGIC):
+            return None
+        f.seek(file_size - TRAILER.size - len(END_MAGIC))
+        footer_offset, block_count = TRAILER.unpack(f.read(TRAILER.size))
+        if f.read(len(END_MAGIC)) != END_MAGIC:
+            return None
+        f.seek(footer_offset)
+        return np.frombuffer(f.read(block_count * INDEX_DTYPE.itemsize), dtype=INDEX_DTYPE)
+
+    @staticmethod
+    def _scan_blocks(f):
+        f.seek(0, 2)
+        file_size = f.tell()
+        offset, index = len(MAGIC), []
+        while offset + BLOCK_HEADER.size + COLUMN_SIZES.size <= file_size:
+            f.seek(offset)
+            rows, first_frame, last_frame = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+            block_end = offset + BLOCK_HEADER.size + COLUMN_SIZES.size + sum(COLUMN_SIZES.unpack(f.read(COLUMN_SIZES.size)))
+            if block_end > file_size:
+                break  # block สุดท้ายเขียนไม่ครบ
+            index.append((offset, first_frame, last_frame, rows))
+            offset = block_end
+        return np.array(index, dtype=INDEX_DTYPE)
+
+    @property
+    def row_count(self):
+        return int(self.index['rows'].sum())
+
+    def _read_block(self, f, offset):
+        f.seek(offset)
+        rows, _, _ = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+        sizes = COLUMN_SIZES.unpack(f.read(COLUMN_SIZES.size))
+        return {name: np.frombuffer(zlib.decompress(f.read(size)), dtype=dtype, count=rows) for (name, dtype), size in zip(COLUMNS, sizes)}
+
+    def iter_blocks(self, start_frame=None, end_frame=None):
+        """Yields the blocks (dicts of column arrays) in file order, trimmed to start_frame <= frame_idx <= end_frame."""
+        with open(self.path, 'rb') as f:
+            for offset, first_frame, last_frame, _ in self.index:
+                if (start_frame is not None and last_frame < start_frame) or (end_frame is not None and first_frame > end_frame):
+                    continue
+                block = self._read_block(f, int(offset))
+                if (start_frame is not None and first_frame < start_frame) or (end_frame is not None and last_frame > end_frame):
+                    keep = np.ones(len(block['frame_idx']), dtype=bool)
+                    if start_frame is not None:
+                        keep &= block['frame_idx'] >= start_frame
+                    if end_frame is not None:
+                        keep &= block['frame_idx'] <= end_frame
+                    block = {name: column[keep] for name, column in block.items()}
+                yield block
+
+    def read(self, start_frame=None, end_frame=None):
+        """All rows in the frame range as one dict of column arrays."""
+        blocks = list(self.iter_blocks(start_frame, end_frame))
+        if not blocks:
+            return _empty_columns(0)
+        return {name: np.concatenate([block[name] for block in blocks]) for name, _ in COLUMNS}
+
+
+def convert_to_mot(log_path, mot_path):
+    """Writes a track log as the MOTChallenge text file that utils.write_mot_results would have produced. Returns the row count."""
+    rows = 0
+    with open(mot_path, 'w') as f:
+        for block in TrackLogReader(log_path).iter_blocks():
+            for frame_idx, track_id, x1, y1, x2, y2, conf in zip(block['frame_idx'].tolist(), block['id'].tolist(), block['x1'].tolist(), block['y1'].tolist(), block['x2'].tolist(), block['y2'].tolist(), block['conf'].tolist()):
+                f.write(f"{frame_idx + 1},{track_id},{x1:.2f},{y1:.2f},{x2 - x1:.2f},{y2 - y1:.2f},{conf:.2f},-1,-1,-1\n")
+            rows += len(block['frame_idx'])
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Track log tools.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    to_mot = subparsers.add_parser('to-mot', help="Convert a track log to a MOTChallenge text file.")
+    to_mot.add_argument("log_path", type=str)
+    to_mot.add_argument("mot_path", type=str)
+    info = subparsers.add_parser('info', help="Show the blocks of a track log.")
+    info.add_argument("log_path", type=str)
+    args = parser.parse_args()
+
+    if args.command == 'to-mot':
+        rows = convert_to_mot(args.log_path, args.mot_path)
+        print(f"Wrote {rows} rows to {args.mot_path}")
+    else:
+        reader = TrackLogReader(args.log_path)
+        print(f"{args.log_path}: {len(reader.index)} blocks, {reader.row_count} rows")
+        for offset, first_frame, last_frame, rows in reader.index:
+            print(f"  offset {offset}: frames {first_frame}-{last_frame}, {rows} rows")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
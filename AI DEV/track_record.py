@@ -0,0 +1,116 @@
+# track_record.py
+from collections import deque
+from enum import IntEnum
+import numpy as np
+
+
+class TrackStatus(IntEnum):
+    """Status of a tracked car. The order is also the int8 code used by VectorizedCarTrackerManager."""
+    NEW_DETECTION = 0
+    CONFIRMING_PARK = 1
+    MOVING_IN_ZONE = 2
+    OUT_OF_ZONE = 3
+    OUT_OF_ZONE_GRACE_PERIOD = 4
+    PARKED = 5
+    WARNING_PARKED = 6
+    VIOLATION = 7
+
+
+# สถานะของรถที่นับว่า "จอดอยู่" (ตรงกับ get_current_parking_cars)
+PARKED_STATUSES = (TrackStatus.PARKED, TrackStatus.WARNING_PARKED, TrackStatus.VIOLATION)
+# สถานะทั้งหมดของรถที่ยังมี parking session เปิดอยู่ (is_parking=True)
+OCCUPANCY_STATUSES = PARKED_STATUSES + (TrackStatus.OUT_OF_ZONE_GRACE_PERIOD,)
+# สถานะที่แปลว่าฉากยังมีการเคลื่อนไหว (ใช้กับ get_scene_state)
+ACTIVE_STATUSES = (TrackStatus.NEW_DETECTION, TrackStatus.MOVING_IN_ZONE, TrackStatus.CONFIRMING_PARK, TrackStatus.OUT_OF_ZONE_GRACE_PERIOD)
+
+
+class TrackRecord:
+    """
+    State of one tracked car in CarTrackerManager.
+
+    Replaces the per-car dict: fields are __slots__ attributes, the status is a TrackStatus and the
+    center history is a fixed-size (window, 3) numpy ring buffer of (x, y, frame_idx) rows instead
+    of a deque of tuples. `record['field']` / `record.get('field')` still work for code written
+    against the old dict, with 'status' returned as its name and 'center_history' as a deque.
+    """
+    __slots__ = (
+        'current_bbox', 'history', 'history_len', 'history_next', 'last_seen_frame_idx',
+        'is_still', 'is_parking', 'parking_start_frame_idx', 'parking_start_time', 'parking_session_id',
+        'has_left_zone', 'status', 'cls', 'frames_outside_zone_count',
+        'api_event_sent_parked_start', 'api_event_sent_warning', 'api_event_sent_violation',
+        'still_start_frame_idx', 'zone_id', 'insert_seq', 'expiry_timer_seq',
+    )
+
+    def __init__(self, bbox, cls, frame_idx, history_window, zone_id=0):
+        self.current_bbox = bbox
+        self.history = np.empty((max(1, history_window), 3), dtype=np.float64)
+        self.history_len = 0
+        self.history_next = 0
+        self.last_seen_frame_idx = frame_idx
+        self.is_still = False
+        self.is_parking = False
+        self.parking_start_frame_idx = None
+        self.parking_start_time = None
+        self.parking_session_id = None
+        self.has_left_zone = False
+        self.status = TrackStatus.NEW_DETECTION
+        self.cls = cls
+        self.frames_outside_zone_count = 0
+        self.api_event_sent_parked_start = False
+        self.api_event_sent_warning = False
+        self.api_event_sent_violation = False
+        self.still_start_frame_idx = None
+        self.zone_id = zone_id
+        # ใช้โดย CarTrackerManager: ลำดับที่ track ถูกเพิ่ม และ timer หมดเวลาตัวล่าสุดของ track
+        self.insert_seq = 0
+        self.expiry_timer_seq = None
+
+    # --- ประวัติจุดกึ่งกลาง (ring buffer) ---
+    def append_center(self, x, y, frame_idx):
+        row = self.history[self.history_next]
+        row[0], row[1], row[2] = x, y, frame_idx
+        window = len(self.history)
+        self.history_next = (self.history_next + 1) % window
+        if self.history_len < window:
+            self.history_len += 1
+
+    def center_displacement(self):
+        """Distance between the oldest and the newest center in the history."""
+        window = len(self.history)
+        oldest = self.history[(self.history_next - self.history_len) % window]
+        newest = self.history[(self.history_next - 1) % window]
+        return float(np.hypot(newest[0] - oldest[0], newest[1] - oldest[1]))
+
+    def reset_session(self):
+        """Clears the parking-session fields (status is left to the caller)."""
+        self.is_parking = False
+        self.parking_start_frame_idx = None
+        self.parking_start_time = None
+        self.parking_session_id = None
+        self.api_event_sent_parked_start = False
+        self.api_event_sent_warning = False
+        self.api_event_sent_violation = False
+
+    # --- มุมมองแบบ dict เดิม ---
+    @property
+    def center_history(self):
+        window = len(self.history)
+        rows = [self.history[(self.history_next - self.history_len + i) % window] for i in range(self.history_len)]
+        return deque([(row[0], row[1], int(row[2])) for row in rows], maxlen=window)
+
+    def __getitem__(self, key):
+        if key not in self.__slots__ and key != 'center_history':
+            raise KeyError(key)
+        if key == 'status':
+            return self.status.name
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def as_dict(self):
+        fields = [name for name in self.__slots__ if name not in ('history', 'history_len', 'history_next', 'insert_seq', 'expiry_timer_seq')]
+        return {name: self[name] for name in fields + ['center_history']}
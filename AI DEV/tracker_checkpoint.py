@@ -0,0 +1,110 @@
+# tracker_checkpoint.py
+import json
+import os
+import threading
+import time
+import logging
+from pathlib import Path
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+
+def box_iou_matrix(boxes_a, boxes_b):
+    """IoU of every [x1, y1, x2, y2] box in `boxes_a` (N, 4) against every box in `boxes_b` (M, 4), as an (N, M) array."""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)[:, None, :]
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def write_checkpoint(path, state):
+    """Writes `state` as JSON to `path` atomically (temp file + fsync + rename), so a crash never leaves a half-written file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, max_age_seconds=None):
+    """
+    Returns the checkpoint saved at `path`, or None if there is none, it cannot be read, it was
+    written by another version, or it is older than `max_age_seconds`.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read tracker checkpoint {path}: {e}")
+        return None
+    if state.get('version') != CHECKPOINT_VERSION:
+        logger.warning(f"Ignoring tracker checkpoint {path}: unsupported version {state.get('version')}.")
+        return None
+    age_seconds = time.time() - state.get('saved_at', 0)
+    if max_age_seconds is not None and age_seconds > max_age_seconds:
+        logger.info(f"Ignoring tracker checkpoint {path}: {age_seconds:.0f}s old (max {max_age_seconds}s).")
+        return None
+    return state
+
+
+class CheckpointWriter:
+    """
+    Writes tracker checkpoints on a background thread.
+
+    `submit()` only stores the state (a plain dict built by CarTrackerManager.export_state) and
+    returns, so the frame loop never waits on JSON encoding or disk I/O. If several states are
+    submitted while a write is in progress, only the newest one is written.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self._condition = threading.Condition()
+        self._pending = None
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=f"CheckpointWriter-{self.path.stem}", daemon=True)
+        self._thread.start()
+
+    def submit(self, state):
+        with self._condition:
+            self._pending = state
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopped:
+                    self._condition.wait()
+                state, self._pending = self._pending, None
+                if state is None:
+                    return
+            try:
+                write_checkpoint(self.path, state)
+            except Exception as e:
+                logger.error(f"Could not write tracker checkpoint {self.path}: {e}")
+
+    def close(self, remove=False):
+        """Writes the pending state (if any) and stops the thread. With `remove=True` the checkpoint file is deleted instead."""
+        with self._condition:
+            if remove:
+                self._pending = None
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+        if remove:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
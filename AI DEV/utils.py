@@ -52,6 +52,39 @@ def is_point_in_any_polygon(point, polygons):
             return True # ถ้าเจอในโซนใดโซนหนึ่ง ให้คืนค่า True ทันที
     return False # ถ้าไม่เจอในทุกโซน ค่อยคืนค่า False
 
+def points_in_any_polygon(points, polygons):
+    """
+    Vectorized version of is_point_in_any_polygon for an (N, 2) array of points.
+    Same rule as cv2.pointPolygonTest(...) >= 0: points on an edge count as inside.
+    Returns a boolean array of shape (N,).
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    inside = np.zeros(len(points), dtype=bool)
+    if polygons is None or len(points) == 0:
+        return inside
+
+    px, py = points[:, 0:1], points[:, 1:2]
+    for polygon in polygons:
+        # ตัดเป็น int32 เหมือนที่ is_point_in_any_polygon ส่งให้ cv2
+        vertices = np.array(polygon, np.int32).reshape(-1, 2).astype(np.float64)
+        if len(vertices) < 3:
+            continue
+        x1, y1 = vertices[:, 0], vertices[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+        cross = (x2 - x1) * (py - y1) - (y2 - y1) * (px - x1)
+        on_edge = ((cross == 0) & (px >= np.minimum(x1, x2)) & (px <= np.maximum(x1, x2))
+                   & (py >= np.minimum(y1, y2)) & (py <= np.maximum(y1, y2))).any(axis=1)
+
+        # Ray casting: นับจำนวนขอบที่เส้นแนวนอนจากจุดไปทางขวาตัดผ่าน
+        spans_y = (y1 > py) != (y2 > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        crossings = (spans_y & (px < x_cross)).sum(axis=1)
+
+        inside |= on_edge | (crossings % 2 == 1)
+    return inside
+
 # ### แก้ไข ###: เปลี่ยนชื่อและตรรกะให้รองรับหลายโซน
 def draw_parking_zones(im, polygons, color=(0, 255, 255), thickness=2):
     """Draws all parking zone polygons on the image."""
@@ -65,6 +98,18 @@ def draw_parking_zones(im, polygons, color=(0, 255, 255), thickness=2):
             cv2.polylines(im, [polygon_np], True, color, thickness)
     return im
 
+def get_zones_bounding_rect(polygons, padding, frame_width, frame_height):
+    """
+    Returns the padded union bounding box (x1, y1, x2, y2) of all polygons, clamped to the frame.
+    Returns the full frame if there are no polygons.
+    """
+    if not polygons:
+        return 0, 0, frame_width, frame_height
+    points = np.concatenate([np.array(polygon, np.int32).reshape(-1, 2) for polygon in polygons])
+    x1, y1 = points.min(axis=0) - padding
+    x2, y2 = points.max(axis=0) + padding
+    return max(0, int(x1)), max(0, int(y1)), min(frame_width, int(x2)), min(frame_height, int(y2))
+
 def save_parking_statistics(stats_data, output_dir, file_name="parking_statistics.csv"):
     """
     Saves parking statistics to a CSV file.
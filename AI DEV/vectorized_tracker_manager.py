@@ -0,0 +1,592 @@
+# vectorized_tracker_manager.py
+from datetime import datetime, timedelta
+import heapq
+import numpy as np
+
+from car_tracker_manager import CarTrackerManager, TIMER_WARNING, TIMER_VIOLATION, TIMER_EXPIRY
+from detections import Detections
+from track_record import TrackRecord, TrackStatus
+from zone_index import NO_ZONE
+
+# รหัสสถานะ (เก็บใน numpy array แทน string) - ค่าเดียวกับ TrackStatus
+STATUS_NAMES = tuple(status.name for status in TrackStatus)
+NEW_DETECTION, CONFIRMING_PARK, MOVING_IN_ZONE, OUT_OF_ZONE, OUT_OF_ZONE_GRACE_PERIOD, PARKED, WARNING_PARKED, VIOLATION = range(len(STATUS_NAMES))
+PARKING_STATUS_CODES = (PARKED, WARNING_PARKED, VIOLATION)
+ACTIVE_STATUS_CODES = (NEW_DETECTION, MOVING_IN_ZONE, CONFIRMING_PARK, OUT_OF_ZONE_GRACE_PERIOD)
+
+NONE_FRAME = -1  # ใช้แทน None ใน array ของ frame index / session id
+
+
+class VectorizedCarTrackerManager(CarTrackerManager):
+    """
+    Struct-of-arrays engine with the same behaviour and events as CarTrackerManager.
+
+    All track state lives in preallocated numpy arrays indexed by slot (grown by doubling).
+    `update()` computes zone membership, stillness, grace-period exits and warning/violation
+    thresholds for every detection of the frame at once. Values that depend on the order in
+    which the dict engine walks the tracks (`current_park`, `total_parking_sessions`, session
+    ids) are reproduced with cumulative sums over the detection order, so `api_events_queue`
+    receives exactly the same events in the same order. Warnings and violations of parked cars
+    that are not detected on a frame, and the removal of lost tracks, come from the same timer
+    heap and rules as in CarTrackerManager (timers carry the slot's insert_seq instead of the
+    TrackRecord), so a frame only pays for the timers that are due, not for every tracked car.
+
+    `tracked_cars` is still available as a read-only dict of TrackRecord (built on demand) for
+    the reporting methods inherited from CarTrackerManager.
+    """
+    _FIELDS = {
+        'track_ids': (np.int64, ()), 'active': (np.bool_, ()), 'insert_seq': (np.int64, ()),
+        'bboxes': (np.float64, (4,)), 'cls': (np.float64, ()),
+        'history': (np.float64, None), 'history_frames': (np.int64, None),
+        'history_len': (np.int64, ()), 'history_next': (np.int64, ()),
+        'last_seen': (np.int64, ()), 'status': (np.int8, ()),
+        'is_parking': (np.bool_, ()), 'is_still': (np.bool_, ()), 'has_left_zone': (np.bool_, ()),
+        'parking_start_frame': (np.int64, ()), 'session_ids': (np.int64, ()),
+        'still_start_frame': (np.int64, ()), 'frames_outside': (np.int64, ()),
+        'sent_started': (np.bool_, ()), 'sent_warning': (np.bool_, ()), 'sent_violation': (np.bool_, ()),
+        'zone_ids': (np.uint8, ()), 'expiry_seq': (np.int64, ()),
+    }
+
+    def __init__(self, *args, initial_capacity=64, **kwargs):
+        self._capacity = 0
+        self._slot_of = {}
+        self._free_slots = []
+        self._insert_counter = 0
+        self._view_cache = None
+        super().__init__(*args, **kwargs)
+        self._allocate(initial_capacity)
+
+    # --- การจัดการ slot ---
+    def _allocate(self, capacity):
+        window = max(1, self.movement_frame_window)
+        for name, (dtype, shape) in self._FIELDS.items():
+            if shape is None:
+                shape = (window, 2) if name == 'history' else (window,)
+            new_array = np.zeros((capacity, *shape), dtype=dtype)
+            if self._capacity:
+                new_array[:self._capacity] = getattr(self, name)
+            setattr(self, name, new_array)
+        self.parking_start_times = (self.parking_start_times + [None] * (capacity - self._capacity)) if self._capacity else [None] * capacity
+        self._free_slots = list(range(capacity - 1, self._capacity - 1, -1)) + self._free_slots
+        self._capacity = capacity
+
+    def _new_slot(self, track_id):
+        if not self._free_slots:
+            self._allocate(self._capacity * 2)
+        slot = self._free_slots.pop()
+        self._slot_of[track_id] = slot
+        self._insert_counter += 1
+        self.track_ids[slot] = track_id
+        self.active[slot] = True
+        self.insert_seq[slot] = self._insert_counter
+        return slot
+
+    def _release_slot(self, slot):
+        del self._slot_of[int(self.track_ids[slot])]
+        self.active[slot] = False
+        self.parking_start_times[slot] = None
+        self._free_slots.append(slot)
+
+    def _clear_slots(self):
+        for slot in list(self._slot_of.values()):
+            self._release_slot(slot)
+        self._view_cache = None
+
+    # --- timer (heap เดียวกับ CarTrackerManager แต่เก็บ insert_seq ของ slot แทน TrackRecord) ---
+    def _schedule_slot_expiry(self, slot):
+        timeout_seconds = self.parked_car_timeout_seconds if self.is_parking[slot] else 5.0
+        self.expiry_seq[slot] = self._schedule(int(self.last_seen[slot]) + timeout_seconds * self.fps, TIMER_EXPIRY, int(self.track_ids[slot]), int(self.insert_seq[slot]))
+
+    def _schedule_slot_session_timers(self, slot):
+        start, track_id, token = int(self.parking_start_frame[slot]), int(self.track_ids[slot]), int(self.insert_seq[slot])
+        self._schedule(start + self.warning_time_limit_seconds * self.fps, TIMER_WARNING, track_id, token, start)
+        self._schedule(start + self.parking_time_limit_seconds * self.fps, TIMER_VIOLATION, track_id, token, start)
+
+    def _counted(self, slots):
+        """True for slots that get_current_parking_cars() would count."""
+        return self.is_parking[slots] & np.isin(self.status[slots], PARKING_STATUS_CODES)
+
+    def _reset_session(self, slots, has_left_zone, status):
+        self.is_parking[slots] = False
+        self.parking_start_frame[slots] = NONE_FRAME
+        for slot in slots:
+            self.parking_start_times[slot] = None
+        self.session_ids[slots] = NONE_FRAME
+        self.has_left_zone[slots] = has_left_zone
+        self.status[slots] = status
+        self.sent_started[slots] = False
+        self.sent_warning[slots] = False
+        self.sent_violation[slots] = False
+
+    # --- ความเข้ากันได้กับ CarTrackerManager แบบ dict ---
+    @property
+    def tracked_cars(self):
+        if self._view_cache is None:
+            self._view_cache = {track_id: self._car_info(slot) for track_id, slot in self._slot_of.items()}
+        return self._view_cache
+
+    @tracked_cars.setter
+    def tracked_cars(self, value):
+        # CarTrackerManager.__init__ กำหนด self.tracked_cars = {} ซึ่งหมายถึงเริ่มจากว่าง
+        if value:
+            raise ValueError("VectorizedCarTrackerManager.tracked_cars is read-only.")
+        if self._capacity:
+            self._clear_slots()
+
+    def _car_info(self, slot):
+        history_len = int(self.history_len[slot])
+        window = self.history.shape[1]
+        order = [(int(self.history_next[slot]) - history_len + i) % window for i in range(history_len)]
+        parking_start_frame = int(self.parking_start_frame[slot])
+        session_id = int(self.session_ids[slot])
+        still_start_frame = int(self.still_start_frame[slot])
+        record = TrackRecord(self.bboxes[slot].copy(), self.cls[slot], int(self.last_seen[slot]), self.movement_frame_window, int(self.zone_ids[slot]))
+        for i in order:
+            record.append_center(self.history[slot, i, 0], self.history[slot, i, 1], self.history_frames[slot, i])
+        record.is_still = bool(self.is_still[slot])
+        record.is_parking = bool(self.is_parking[slot])
+        record.parking_start_frame_idx = None if parking_start_frame == NONE_FRAME else parking_start_frame
+        record.parking_start_time = self.parking_start_times[slot]
+        record.parking_session_id = None if session_id == NONE_FRAME else session_id
+        record.has_left_zone = bool(self.has_left_zone[slot])
+        record.status = TrackStatus(int(self.status[slot]))
+        record.frames_outside_zone_count = int(self.frames_outside[slot])
+        record.api_event_sent_parked_start = bool(self.sent_started[slot])
+        record.api_event_sent_warning = bool(self.sent_warning[slot])
+        record.api_event_sent_violation = bool(self.sent_violation[slot])
+        record.still_start_frame_idx = None if still_start_frame == NONE_FRAME else still_start_frame
+        return record
+
+    # --- checkpoint / restore (ดู CarTrackerManager.restore_state) ---
+    def _has_track(self, track_id):
+        return track_id in self._slot_of
+
+    def _load_track(self, track_id, car_info):
+        slot = self._new_slot(track_id)
+        self.bboxes[slot] = car_info.current_bbox
+        self.cls[slot] = car_info.cls
+        history = car_info.center_history
+        for i, (x, y, frame_idx) in enumerate(history):
+            self.history[slot, i] = (x, y)
+            self.history_frames[slot, i] = frame_idx
+        self.history_len[slot] = len(history)
+        self.history_next[slot] = len(history) % self.history.shape[1]
+        self.last_seen[slot] = car_info.last_seen_frame_idx
+        self.status[slot] = int(car_info.status)
+        self.is_parking[slot] = car_info.is_parking
+        self.is_still[slot] = car_info.is_still
+        self.has_left_zone[slot] = car_info.has_left_zone
+        self.parking_start_frame[slot] = NONE_FRAME if car_info.parking_start_frame_idx is None else car_info.parking_start_frame_idx
+        self.parking_start_times[slot] = car_info.parking_start_time
+        self.session_ids[slot] = NONE_FRAME if car_info.parking_session_id is None else car_info.parking_session_id
+        self.still_start_frame[slot] = NONE_FRAME if car_info.still_start_frame_idx is None else car_info.still_start_frame_idx
+        self.frames_outside[slot] = car_info.frames_outside_zone_count
+        self.sent_started[slot] = car_info.api_event_sent_parked_start
+        self.sent_warning[slot] = car_info.api_event_sent_warning
+        self.sent_violation[slot] = car_info.api_event_sent_violation
+        self.zone_ids[slot] = car_info.zone_id
+        self._schedule_slot_expiry(slot)
+        if car_info.is_parking:
+            self._schedule_slot_session_timers(slot)
+        self._view_cache = None
+
+    def _rekey_track(self, old_track_id, new_track_id):
+        # timer ของ ID เดิมจะถูกทิ้งเองเมื่อถึงกำหนด (insert_seq เปลี่ยน)
+        slot = self._slot_of.pop(old_track_id)
+        self._slot_of[new_track_id] = slot
+        self.track_ids[slot] = new_track_id
+        self._insert_counter += 1
+        self.insert_seq[slot] = self._insert_counter
+        self._schedule_slot_expiry(slot)
+        if self.is_parking[slot]:
+            self._schedule_slot_session_timers(slot)
+        self._view_cache = None
+
+    def reset(self):
+        print("Resetting CarTrackerManager state...")
+        self._clear_slots()
+        self._reset_timers()
+        self._restored_bboxes.clear()
+        self.parking_statistics.clear()
+        self.api_events_queue.clear()
+
+    def finalize_all_sessions(self, final_frame_idx):
+        super().finalize_all_sessions(final_frame_idx)
+        self._clear_slots()
+
+    # --- เมธอดที่ถูกเรียกทุกเฟรม (เขียนแบบ vectorized) ---
+    def _active_slots_in_order(self):
+        slots = np.flatnonzero(self.active)
+        return slots[np.argsort(self.insert_seq[slots], kind='stable')]
+
+    def get_current_parking_cars(self):
+        slots = self._active_slots_in_order()
+        return self.track_ids[slots[self._counted(slots)]].tolist()
+
+    def get_current_parking_count(self):
+        return int(self._counted(np.flatnonzero(self.active)).sum())
+
+    def get_occupancy_counts(self, zone_id=None):
+        slots = np.flatnonzero(self.active & self.is_parking)
+        if zone_id is not None:
+            slots = slots[self.zone_ids[slots] == zone_id]
+        statuses = self.status[slots]
+        return {STATUS_NAMES[code]: int((statuses == code).sum()) for code in PARKING_STATUS_CODES}
+
+    def _open_session_count(self):
+        return int((self.active & self.is_parking).sum())
+
+    def get_scene_state(self):
+        statuses = self.status[self.active]
+        if np.isin(statuses, ACTIVE_STATUS_CODES).any():
+            return 'ACTIVE'
+        return 'PARKED' if np.isin(statuses, PARKING_STATUS_CODES).any() else 'EMPTY'
+
+    def get_status_codes(self, track_ids):
+        slots = np.array([self._slot_of.get(track_id, -1) for track_id in track_ids], dtype=np.int64)
+        return np.where(slots >= 0, self.status[slots], -1).astype(np.int8)
+
+    def get_car_status(self, track_id, current_frame_idx):
+        slot = self._slot_of.get(track_id)
+        if slot is None: return {'status': 'OUT_OF_SCENE', 'time_parked_str': ''}
+        time_parked_str = ""
+        if self.is_parking[slot] and self.parking_start_frame[slot] != NONE_FRAME:
+            parking_duration_s = (current_frame_idx - self.parking_start_frame[slot]) / self.fps
+            minutes, seconds = divmod(int(parking_duration_s), 60)
+            time_parked_str = f"{minutes:02d}m {seconds:02d}s"
+        return {'status': STATUS_NAMES[self.status[slot]], 'time_parked_str': time_parked_str}
+
+    def get_render_snapshot(self, current_frame_idx):
+        slots = self._active_slots_in_order()
+        boxes = self.bboxes[slots].astype(int)
+        tracks = []
+        for slot, (x1, y1, x2, y2) in zip(slots.tolist(), boxes.tolist()):
+            status_info = self.get_car_status(int(self.track_ids[slot]), current_frame_idx)
+            tracks.append((int(self.track_ids[slot]), x1, y1, x2, y2, status_info['status'], status_info['time_parked_str']))
+        return {
+            'tracks': tracks,
+            'current_parked': int(self._counted(slots).sum()),
+            'occupancy': self.get_occupancy_counts(),
+            'total_sessions': self.get_parking_count()
+        }
+
+    # --- อัปเดตทุก track ในเฟรมพร้อมกัน ---
+    def update(self, current_tracks, current_frame_idx, resized_frame, original_frame=None):
+        self._view_cache = None
+        alerts = []
+        f = current_frame_idx
+        window = self.history.shape[1]
+        detections = Detections.from_track_dicts(current_tracks)
+        track_ids = detections.ids.tolist()
+        detected_ids_in_frame = set(track_ids)
+        if self._restored_bboxes:
+            self._adopt_restored_tracks(detections)
+        # จำนวนรถที่จอดอยู่ก่อนเฟรมนี้ (จุดเริ่มของ cumulative sum ด้านล่าง)
+        base_parked = int((self.active & self.is_parking & np.isin(self.status, PARKING_STATUS_CODES)).sum())
+
+        if len(detections):
+            bboxes = detections.xyxy
+            centers = detections.centers
+            classes = detections.cls
+            slots = np.array([self._slot_of.get(track_id, -1) for track_id in track_ids], dtype=np.int64)
+
+            # 1) ป้องกัน ID สลับ: รถที่จอดอยู่แล้วกระโดดไกลเกินไป -> ไม่สนใจ detection นี้
+            valid = np.ones(len(track_ids), dtype=bool)
+            existing = np.flatnonzero(slots >= 0)
+            if len(existing):
+                existing_slots = slots[existing]
+                parked = np.isin(self.status[existing_slots], PARKING_STATUS_CODES)
+                last_centers = (self.bboxes[existing_slots, 0:2] + self.bboxes[existing_slots, 2:4]) / 2
+                distances = np.linalg.norm(last_centers - centers[existing], axis=1)
+                switched = parked & (distances > self.id_switch_threshold_px)
+                for row in existing[switched]:
+                    print(f"WARNING: Potential ID switch for parked Car ID {track_ids[row]}. Dist: {distances[np.searchsorted(existing, row)]:.2f}px. Ignoring update.")
+                valid[existing[switched]] = False
+
+            rows = np.flatnonzero(valid)
+            zone_ids = self.zone_index.lookup(centers[rows])
+            in_zone = zone_ids != NO_ZONE
+
+            # 2) สร้าง slot ให้ track ใหม่ (ตามลำดับ detection เหมือน dict) - ประวัติเริ่มด้วยจุดแรกหนึ่งจุด
+            for row in rows[slots[rows] < 0]:
+                slot = self._new_slot(track_ids[row])
+                slots[row] = slot
+                self.cls[slot] = classes[row]
+                self.history[slot, 0] = centers[row]
+                self.history_frames[slot, 0] = f
+                self.history_len[slot] = 1
+                self.history_next[slot] = 1 % window
+                self.is_still[slot] = self.is_parking[slot] = self.has_left_zone[slot] = False
+                self.status[slot] = NEW_DETECTION
+                self.parking_start_frame[slot] = self.session_ids[slot] = self.still_start_frame[slot] = NONE_FRAME
+                self.frames_outside[slot] = 0
+                self.sent_started[slot] = self.sent_warning[slot] = self.sent_violation[slot] = False
+                self.last_seen[slot] = f
+                self._schedule_slot_expiry(slot)
+
+            s = slots[rows]
+            c = centers[rows]
+            old_counted = self._counted(s)
+
+            # 3) อัปเดต bbox / last_seen และเพิ่มจุดลงใน ring buffer ของประวัติ
+            self.bboxes[s] = bboxes[rows]
+            self.last_seen[s] = f
+            self.zone_ids[s] = zone_ids
+            write_idx = self.history_next[s]
+            self.history[s, write_idx] = c
+            self.history_frames[s, write_idx] = f
+            self.history_next[s] = (write_idx + 1) % window
+            self.history_len[s] = np.minimum(self.history_len[s] + 1, window)
+
+            # 4) stillness: ระยะระหว่างจุดเก่าที่สุดกับจุดล่าสุดใน window
+            oldest = self.history[s, self.history_next[s]]
+            still = (self.history_len[s] >= self.movement_frame_window) & (np.linalg.norm(oldest - c, axis=1) < self.movement_threshold_px)
+            self.is_still[s] = still
+
+            was_parking = self.is_parking[s].copy()
+            parking_start = self.parking_start_frame[s].copy()
+            durations_s = (f - parking_start) / self.fps
+
+            event_rows = {}            # ตำแหน่งใน rows -> ชนิด event
+            session_delta = np.zeros(len(rows), dtype=np.int64)
+
+            # 5a) ยังไม่จอด
+            idle = ~was_parking
+            confirm_candidates = idle & in_zone & still
+            first_still = confirm_candidates & (self.still_start_frame[s] == NONE_FRAME)
+            self.still_start_frame[s[first_still]] = f
+            self.status[s[first_still]] = CONFIRMING_PARK
+            frames_still = f - self.still_start_frame[s]
+            confirmed = confirm_candidates & ~first_still & (frames_still >= self.parking_confirm_frames)
+            session_delta[confirmed] += 1
+            for i in np.flatnonzero(confirmed):
+                slot = s[i]
+                self.is_parking[slot] = True
+                self.parking_start_frame[slot] = self.still_start_frame[slot]
+                self.parking_start_times[slot] = datetime.utcnow() - timedelta(seconds=(frames_still[i] / self.fps))
+                self.has_left_zone[slot] = False
+                self.status[slot] = PARKED
+                self._schedule_slot_session_timers(slot)
+                if not self.sent_started[slot]:
+                    event_rows[i] = 'parking_started'
+                    self.sent_started[slot] = True
+            moving_idle = idle & in_zone & ~still
+            self.still_start_frame[s[moving_idle]] = NONE_FRAME
+            self.status[s[moving_idle]] = MOVING_IN_ZONE
+            outside_idle = idle & ~in_zone
+            self.still_start_frame[s[outside_idle]] = NONE_FRAME
+            self.status[s[outside_idle]] = OUT_OF_ZONE
+
+            # 5b) จอดอยู่แล้วแต่ออกนอกโซน -> grace period / จบ session
+            leaving = was_parking & ~in_zone
+            self.frames_outside[s[leaving]] += 1
+            exited = leaving & (self.frames_outside[s] >= self.grace_period_frames_exit)
+            self.status[s[leaving & ~exited]] = OUT_OF_ZONE_GRACE_PERIOD
+            short_session = (durations_s / 60.0 < 1.0) & (not self.debug_mode_enabled)
+            session_delta[exited & short_session] -= 1
+            for i in np.flatnonzero(exited & ~short_session):
+                event_rows[i] = 'parking_ended'
+
+            # 5c) จอดอยู่ในโซน
+            staying = was_parking & in_zone
+            self.frames_outside[s[staying]] = 0
+            moved = staying & ~still
+            for i in np.flatnonzero(moved):
+                event_rows[i] = 'parking_ended_moved'
+            parked_still = staying & still
+            violation = parked_still & (durations_s > self.parking_time_limit_seconds)
+            warning = parked_still & ~violation & (durations_s > self.warning_time_limit_seconds)
+            self.status[s[violation]] = VIOLATION
+            self.status[s[warning]] = WARNING_PARKED
+            self.status[s[parked_still & ~violation & ~warning]] = PARKED
+            for i in np.flatnonzero(violation & ~self.sent_violation[s]):
+                event_rows[i] = 'parking_violation_triggered'
+            for i in np.flatnonzero(warning & ~self.sent_warning[s]):
+                event_rows[i] = 'parking_warning_triggered'
+
+            # 6) ค่าที่ขึ้นกับลำดับใน dict engine: current_park และ parking_sessions_count ณ ตอนที่ถึงรถคันนั้น
+            # (คำนวณก่อน reset session ของรถที่จบ แล้วค่อยปรับสถานะใหม่ของรถเหล่านั้น)
+            new_counted = self._counted(s)
+            new_counted[exited | moved] = False
+            counted_delta = new_counted.astype(np.int64) - old_counted
+            parked_inclusive = base_parked + np.cumsum(counted_delta)
+            parked_exclusive = parked_inclusive - counted_delta
+            sessions_inclusive = self.parking_sessions_count + np.cumsum(session_delta)
+
+            for i in np.flatnonzero(confirmed):
+                self.session_ids[s[i]] = sessions_inclusive[i]
+                print(f"[{f}] Car ID {track_ids[rows[i]]} CONFIRMED parking.")
+
+            for i in sorted(event_rows):
+                slot = s[i]
+                track_id = track_ids[rows[i]]
+                event_type = event_rows[i]
+                # ใช้ float ของ Python ให้ round() ได้ผลเหมือน dict engine (numpy ปัดเศษต่างกันที่ .5)
+                duration_s = float(durations_s[i])
+                duration_min = duration_s / 60.0
+                if event_type == 'parking_started':
+                    self.api_events_queue.append({
+                        'event_type': 'parking_started', 'car_id': track_id, 'zone_id': int(self.zone_ids[slot]),
+                        'current_park': int(parked_inclusive[i]), 'total_parking_sessions': int(sessions_inclusive[i]),
+                        'entry_time': self.parking_start_times[slot], 'duration_minutes': 0.0,
+                        'is_violation': False
+                    })
+                elif event_type in ('parking_ended', 'parking_ended_moved'):
+                    is_violation_status = bool(duration_s > self.parking_time_limit_seconds)
+                    if event_type == 'parking_ended':
+                        final_status = 'VIOLATION_ENDED' if is_violation_status else 'PARKED_ENDED'
+                        print(f"[Parking Ended] Car ID {track_id}, Session ID {self.session_ids[slot]}: Parked for {duration_s:.2f} seconds.")
+                    else:
+                        final_status = 'PARKED_MOVED_IN_ZONE'
+                        print(f"[Parking Ended - Moved In Zone] Car ID {track_id}, Session ID {self.session_ids[slot]}: Parked for {duration_s:.2f} seconds.")
+                    self.parking_statistics.append({
+                        'session_id': int(self.session_ids[slot]), 'car_id': track_id,
+                        'start_frame': int(parking_start[i]), 'end_frame': f,
+                        'duration_frames': int(f - parking_start[i]), 'duration_s': duration_s,
+                        'duration_min': duration_min, 'final_status': final_status
+                    })
+                    self.api_events_queue.append({
+                        'event_type': event_type, 'car_id': track_id,
+                        'current_park': int(parked_exclusive[i] - old_counted[i]), 'total_parking_sessions': int(sessions_inclusive[i]),
+                        'entry_time': self.parking_start_times[slot], 'exit_time': datetime.utcnow(),
+                        'duration_minutes': round(duration_min, 2), 'is_violation': is_violation_status
+                    })
+                else:
+                    is_violation = event_type == 'parking_violation_triggered'
+                    limit_s = self.parking_time_limit_seconds if is_violation else self.warning_time_limit_seconds
+                    alerts.append(f"{'VIOLATION' if is_violation else 'WARNING'}: Car ID {track_id} parked over {limit_s/60:.2f} minutes ({duration_min:.2f} min).")
+                    event = {
+                        'event_type': event_type,
+                        'car_id': track_id, 'zone_id': int(self.zone_ids[slot]), 'current_park': int(parked_inclusive[i]),
+                        'total_parking_sessions': int(sessions_inclusive[i]),
+                        'entry_time': self.parking_start_times[slot],
+                        'duration_minutes': round(duration_min, 2),
+                        'is_violation': is_violation
+                    }
+                    if is_violation:
+                        image_jpeg = None
+                        if original_frame is not None:
+                            image_jpeg = self.evidence_encoder.submit(original_frame, self.bboxes[slot], resized_frame.shape)
+                        else:
+                            print(f"Warning: Original frame not provided. Cannot capture high-resolution image.")
+                        event['image_jpeg'] = image_jpeg
+                        self.sent_violation[slot] = True
+                    else:
+                        self.sent_warning[slot] = True
+                    self.api_events_queue.append(event)
+
+            for i in np.flatnonzero(exited & short_session):
+                print(f"[Info] Short parking session ({durations_s[i] / 60.0:.2f} min) for Car ID {track_ids[rows[i]]} ignored. Correcting session count.")
+            self.parking_sessions_count = int(sessions_inclusive[-1]) if len(rows) else self.parking_sessions_count
+
+            # reset session ของรถที่จบ (still_start ของ moved ไม่ถูก reset เหมือน dict engine)
+            exited_slots = s[exited]
+            self._reset_session(exited_slots, has_left_zone=True, status=OUT_OF_ZONE)
+            self.frames_outside[exited_slots] = 0
+            self.still_start_frame[exited_slots] = NONE_FRAME
+            self._reset_session(s[moved], has_left_zone=False, status=MOVING_IN_ZONE)
+            for slot in s[exited | moved].tolist():
+                self._schedule_slot_expiry(slot)
+
+        # 7) timer ที่ถึงกำหนด (กฎเดียวกับ CarTrackerManager.update): warning / violation ของรถที่จอดอยู่แต่ไม่ถูกตรวจพบ
+        # ในเฟรมนี้ และการลบ track ที่หายไปนานเกิน timeout
+        due_slots, expired, reschedule = [], [], []
+        for timer in self._pop_due_timers(f):
+            deadline, seq, kind, track_id, token, session_start = timer
+            slot = self._slot_of.get(track_id)
+            if slot is None or self.insert_seq[slot] != token:
+                continue
+            if kind == TIMER_EXPIRY:
+                if self.expiry_seq[slot] != seq:
+                    continue
+                seconds_disappeared = (f - self.last_seen[slot]) / self.fps
+                timeout_seconds = self.parked_car_timeout_seconds if self.is_parking[slot] else 5.0
+                if track_id in detected_ids_in_frame or seconds_disappeared <= timeout_seconds:
+                    reschedule.append(slot)
+                else:
+                    expired.append(slot)
+            elif self.is_parking[slot] and self.parking_start_frame[slot] == session_start and not self.sent_violation[slot] \
+                    and not (kind == TIMER_WARNING and self.sent_warning[slot]):
+                limit_seconds = self.warning_time_limit_seconds if kind == TIMER_WARNING else self.parking_time_limit_seconds
+                if (f - session_start) / self.fps <= limit_seconds:
+                    heapq.heappush(self._timers, timer)
+                elif self.last_seen[slot] != f and self.status[slot] in PARKING_STATUS_CODES:
+                    due_slots.append(slot)
+                else:
+                    heapq.heappush(self._timers, timer)
+
+        if due_slots:
+            due_slots = np.unique(due_slots)
+            due_slots = due_slots[np.argsort(self.insert_seq[due_slots], kind='stable')]
+            durations = (f - self.parking_start_frame[due_slots]) / self.fps
+            to_violation = durations > self.parking_time_limit_seconds
+            current_parked = self.get_current_parking_count()
+            for i, slot in enumerate(due_slots.tolist()):
+                track_id = int(self.track_ids[slot])
+                is_violation = bool(to_violation[i])
+                duration_min = float(durations[i]) / 60.0
+                limit_s = self.parking_time_limit_seconds if is_violation else self.warning_time_limit_seconds
+                alerts.append(f"{'VIOLATION' if is_violation else 'WARNING'}: Car ID {track_id} parked over {limit_s/60:.2f} minutes ({duration_min:.2f} min).")
+                event = {
+                    'event_type': 'parking_violation_triggered' if is_violation else 'parking_warning_triggered',
+                    'car_id': track_id, 'zone_id': int(self.zone_ids[slot]), 'current_park': current_parked,
+                    'total_parking_sessions': self.parking_sessions_count,
+                    'entry_time': self.parking_start_times[slot],
+                    'duration_minutes': round(duration_min, 2),
+                    'is_violation': is_violation
+                }
+                if is_violation:
+                    self.status[slot] = VIOLATION
+                    image_jpeg = None
+                    if original_frame is not None:
+                        image_jpeg = self.evidence_encoder.submit(original_frame, self.bboxes[slot], resized_frame.shape)
+                    else:
+                        print(f"Warning: Original frame not provided. Cannot capture high-resolution image.")
+                    event['image_jpeg'] = image_jpeg
+                    self.sent_violation[slot] = True
+                else:
+                    self.status[slot] = WARNING_PARKED
+                    self.sent_warning[slot] = True
+                self.api_events_queue.append(event)
+
+        for slot in reschedule:
+            self._schedule_slot_expiry(slot)
+
+        # 8) ลบ track ที่หายไปนานเกิน timeout (ตามลำดับที่เพิ่มเข้ามา เหมือน dict)
+        if expired:
+            expired_slots = np.array(expired, dtype=np.int64)
+            expired_slots = expired_slots[np.argsort(self.insert_seq[expired_slots], kind='stable')]
+            parked_after_loop = self.get_current_parking_count()
+            for slot in expired_slots.tolist():
+                track_id = int(self.track_ids[slot])
+                is_parked = bool(self.is_parking[slot])
+                lost_s = (f - self.last_seen[slot]) / self.fps
+                print(f"[Info] Removing track ID {track_id} after being lost for {lost_s:.2f} seconds (is_parked={is_parked}).")
+                if not is_parked:
+                    continue
+                duration_frames = f - int(self.parking_start_frame[slot])
+                duration_s = duration_frames / self.fps
+                duration_min = duration_s / 60.0
+                if duration_min < 1.0 and not self.debug_mode_enabled:
+                    print(f"[Info] Short parking session ({duration_min:.2f} min) for disappeared Car ID {track_id} ignored. Correcting session count.")
+                    self.parking_sessions_count -= 1
+                    continue
+                is_violation_status = bool(duration_s > self.parking_time_limit_seconds)
+                self.parking_statistics.append({
+                    'session_id': int(self.session_ids[slot]), 'car_id': track_id,
+                    'start_frame': int(self.parking_start_frame[slot]), 'end_frame': f,
+                    'duration_frames': duration_frames, 'duration_s': duration_s,
+                    'duration_min': duration_min, 'final_status': 'VIOLATION_DISAPPEARED' if is_violation_status else 'PARKED_DISAPPEARED'
+                })
+                print(f"[Parking Ended - Disappeared] Car ID {track_id}, Session ID {self.session_ids[slot]}: Parked for {duration_s:.2f} seconds.")
+                self.api_events_queue.append({
+                    'event_type': 'parking_ended_disappeared', 'car_id': track_id,
+                    'current_park': parked_after_loop - int(self._counted(np.array([slot]))[0]),
+                    'total_parking_sessions': self.parking_sessions_count,
+                    'entry_time': self.parking_start_times[slot], 'exit_time': datetime.utcnow(),
+                    'duration_minutes': round(duration_min, 2), 'is_violation': is_violation_status
+                })
+            for slot in expired_slots.tolist():
+                self._release_slot(slot)
+
+        return alerts
@@ -0,0 +1,86 @@
+# zone_index.py
+import math
+import cv2
+import numpy as np
+
+from utils import points_in_any_polygon
+
+NO_ZONE = 0  # ค่าใน label mask สำหรับพิกเซลที่ไม่อยู่ในโซนใดเลย
+
+
+class ZoneIndex:
+    """
+    Rasterized lookup table of the parking zones of one camera.
+
+    Built once at inference resolution: a uint8 label mask where every cell holds the id of the
+    zone covering it (1 = first polygon in the ROI file, 2 = second, ...) or NO_ZONE. Looking up a
+    point is then a single array read instead of a cv2.pointPolygonTest per polygon, and
+    `lookup()` does it for a whole (N, 2) array of centers at once. Where zones overlap, the
+    lower id wins.
+
+    The mask has SUBPIXELS cells per pixel on each axis, and the cells along the polygon edges are
+    decided with the exact test, so every center of an integer bbox (a multiple of 0.5) gets the
+    same answer as cv2.pointPolygonTest(...) >= 0. Other points are rounded to the nearest cell.
+    """
+    SUBPIXELS = 2
+
+    def __init__(self, polygons, frame_width=None, frame_height=None):
+        polygons = [np.array(polygon, np.int32).reshape(-1, 2) for polygon in (polygons or [])]
+        if len(polygons) > 255:
+            raise ValueError(f"ZoneIndex supports at most 255 zones, got {len(polygons)}.")
+        self.polygons = polygons
+
+        # ถ้าไม่ระบุขนาดเฟรม ใช้ขอบเขตของโซนเอง (จุดที่อยู่นอก mask ถือว่าไม่อยู่ในโซน)
+        if frame_width is None or frame_height is None:
+            extent = np.concatenate(polygons).max(axis=0) + 1 if polygons else np.zeros(2, np.int32)
+            frame_width = int(extent[0]) if frame_width is None else frame_width
+            frame_height = int(extent[1]) if frame_height is None else frame_height
+        self.width, self.height = max(0, int(frame_width)), max(0, int(frame_height))
+
+        self.label_mask = np.full((self.height * self.SUBPIXELS, self.width * self.SUBPIXELS), NO_ZONE, dtype=np.uint8)
+        # วาดจากโซนสุดท้ายไปโซนแรก เพื่อให้โซนที่ id ต่ำกว่าทับส่วนที่ซ้อนกัน
+        for zone_id in range(len(polygons), 0, -1):
+            polygon = polygons[zone_id - 1]
+            if len(polygon) >= 3:
+                self.label_mask[self._rasterize(polygon)] = zone_id
+
+    def _rasterize(self, polygon):
+        """Boolean cell mask of one polygon, exact on the cells along its edges."""
+        scaled_polygon = polygon * self.SUBPIXELS
+        zone_mask = np.zeros(self.label_mask.shape, dtype=np.uint8)
+        cv2.fillPoly(zone_mask, [scaled_polygon], 1)
+
+        # fillPoly ปัดเศษที่ขอบต่างจาก pointPolygonTest - ตัดสิน cell แถบรอบขอบใหม่ด้วยการทดสอบแบบเดียวกับ cv2
+        edge_band = np.zeros(self.label_mask.shape, dtype=np.uint8)
+        cv2.polylines(edge_band, [scaled_polygon], True, 1, 3)
+        band_y, band_x = np.nonzero(edge_band)
+        band_points = np.column_stack([band_x, band_y]) / self.SUBPIXELS
+        zone_mask[band_y, band_x] = points_in_any_polygon(band_points, [polygon])
+        return zone_mask.astype(bool)
+
+    @property
+    def zone_count(self):
+        return len(self.polygons)
+
+    def _cells(self, points):
+        return np.floor(np.asarray(points, dtype=np.float64) * self.SUBPIXELS + 0.5).astype(np.int64)
+
+    def lookup(self, points):
+        """Returns the zone id (uint8, NO_ZONE if outside every zone) of each point of an (N, 2) array."""
+        cells = self._cells(points).reshape(-1, 2)
+        zone_ids = np.full(len(cells), NO_ZONE, dtype=np.uint8)
+        x, y = cells[:, 0], cells[:, 1]
+        on_mask = (x >= 0) & (x < self.label_mask.shape[1]) & (y >= 0) & (y < self.label_mask.shape[0])
+        zone_ids[on_mask] = self.label_mask[y[on_mask], x[on_mask]]
+        return zone_ids
+
+    def contains(self, points):
+        """Boolean version of lookup(): True for points inside any zone."""
+        return self.lookup(points) != NO_ZONE
+
+    def zone_id_at(self, point):
+        """Zone id of a single (x, y) point."""
+        x, y = math.floor(point[0] * self.SUBPIXELS + 0.5), math.floor(point[1] * self.SUBPIXELS + 0.5)
+        if 0 <= x < self.label_mask.shape[1] and 0 <= y < self.label_mask.shape[0]:
+            return int(self.label_mask[y, x])
+        return NO_ZONE
@@ -1,13 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, status
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from typing import Any, List
+from datetime import timezone
 import logging
 from app import database, schemas
 from app.api.deps import get_db, verify_api_key
+from app.evidence_store import move_inline_image
+from app.rollups import apply_rollups
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
+# ชนิด event กับตารางที่เก็บ (ลำดับเดียวกับ endpoint แบบ event เดียว: ถ้ามีหลายชนิดใน item เดียวจะใช้ชนิดแรก)
+EVENT_TABLES = (
+    ("parking_violation", database.DBParkingViolation),
+    ("table_occupancy", database.DBTableOccupancy),
+    ("chilled_basket_alert", database.DBChilledBasketAlert),
+)
+MAX_BATCH_SIZE = 1000
+_batch_adapter = TypeAdapter(List[schemas.AnalyticsDataIn])
+
+def _to_naive_utc(row):
+    """Converts the event times of a parking row to naive UTC before storing. SQLite keeps only the wall time of an aware datetime, and the rollups bucket stored times as UTC."""
+    for key in ("timestamp", "entry_time", "exit_time"):
+        value = row.get(key)
+        if value is not None and value.tzinfo is not None:
+            row[key] = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return row
+
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.InferenceResultResponse, dependencies=[Depends(verify_api_key)])
 async def create_inference_result(data: schemas.AnalyticsDataIn, db: Session=Depends(get_db)):
     logger.info(f"Received analytics data")
@@ -15,8 +38,10 @@ async def create_inference_result(data: schemas.AnalyticsDataIn, db: Session=Dep
         db_item, message = None, "No valid analytics data provided"
 
         if data.parking_violation:
-            db_item = database.DBParkingViolation(**data.parking_violation.model_dump())
+            row = _to_naive_utc(move_inline_image(data.parking_violation.model_dump()))
+            db_item = database.DBParkingViolation(**row)
             db.add(db_item)
+            apply_rollups(db, [row])
             message = "Parking violation data received."
         elif data.table_occupancy:
             db_item = database.DBTableOccupancy(**data.table_occupancy.model_dump())
@@ -42,4 +67,65 @@ async def create_inference_result(data: schemas.AnalyticsDataIn, db: Session=Dep
         import traceback
         traceback.print_exc()
         logger.info(f"--- DEBUG ERROR END ---\n")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,detail=f"Failed to process inference result: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,detail=f"Failed to process inference result: {e}")
+
+
+def _validate_batch(items):
+    """Validates the whole batch in one pass. Returns ({index: AnalyticsDataIn}, {index: error message})."""
+    try:
+        return dict(enumerate(_batch_adapter.validate_python(items))), {}
+    except ValidationError as e:
+        errors = {}
+        for error in e.errors():
+            index = error['loc'][0]
+            field = '.'.join(str(part) for part in error['loc'][1:])
+            errors.setdefault(index, f"{field}: {error['msg']}" if field else error['msg'])
+        valid = {index: schemas.AnalyticsDataIn.model_validate(item) for index, item in enumerate(items) if index not in errors}
+        return valid, errors
+
+@router.post("/batch", status_code=status.HTTP_201_CREATED, response_model=schemas.AnalyticsBatchResponse, dependencies=[Depends(verify_api_key)])
+def create_inference_results_batch(items: List[Any] = Body(...), db: Session=Depends(get_db)):
+    """
+    Stores a list of AnalyticsDataIn items (any mix of event kinds) in one transaction, with one
+    bulk INSERT per table. Invalid items are reported in `results` and do not stop the others.
+    """
+    logger.info(f"Received analytics batch of {len(items)} events")
+    if not items:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty batch.")
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Batch too large ({len(items)} items, max {MAX_BATCH_SIZE}).")
+
+    valid, errors = _validate_batch(items)
+    results = [schemas.AnalyticsBatchItemResult(index=index, error=errors.get(index)) for index in range(len(items))]
+    rows = {kind: [] for kind, _ in EVENT_TABLES}
+    for index, data in valid.items():
+        for kind, model in EVENT_TABLES:
+            event = getattr(data, kind)
+            if event is not None:
+                columns = model.__table__.columns.keys()
+                row = {key: value for key, value in event.model_dump().items() if key in columns}
+                if kind == "parking_violation":
+                    _to_naive_utc(move_inline_image(row))
+                rows[kind].append((index, row))
+                results[index].event_type = kind
+                break
+        else:
+            results[index].error = "No valid analytics data provided."
+
+    try:
+        for kind, model in EVENT_TABLES:
+            if not rows[kind]:
+                continue
+            ids = db.execute(insert(model).returning(model.id, sort_by_parameter_order=True), [row for _, row in rows[kind]]).scalars().all()
+            for (index, _), row_id in zip(rows[kind], ids):
+                results[index].id = row_id
+        # สรุปรายชั่วโมงของ dashboard อัปเดตใน transaction เดียวกับ event
+        apply_rollups(db, [row for _, row in rows["parking_violation"]])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"Error storing analytics batch:")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to store analytics batch: {e}")
+
+    inserted = sum(result.id is not None for result in results)
+    return {"message": f"Stored {inserted} of {len(items)} analytics events.", "inserted": inserted, "failed": len(items) - inserted, "results": results}
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from typing import Optional
+import logging
+from app import schemas
+from app.api.deps import verify_api_key
+from app.core.config import settings
+from app.evidence_store import IMMUTABLE_CACHE_CONTROL, JPEG_MAGIC, evidence_store
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/evidence", tags=["Evidence"])
+
+async def _read_image(request: Request) -> bytes:
+    """The uploaded image: a raw image/jpeg body, or the `file` part of a multipart/form-data body."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "image/jpeg":
+        return await request.body()
+    if content_type == "multipart/form-data":
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing 'file' part.")
+        return await upload.read()
+    raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Send the image as image/jpeg or as the 'file' part of multipart/form-data.")
+
+@router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.EvidenceUploadResponse, dependencies=[Depends(verify_api_key)])
+async def upload_evidence(request: Request, response: Response):
+    """
+    Stores a JPEG evidence image and returns its SHA-256. Events reference the image by that hash
+    (`image_sha256`). Uploading an image that is already stored returns 200 with the same hash.
+    """
+    data = await _read_image(request)
+    if not data:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty image.")
+    if len(data) > settings.EVIDENCE_MAX_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Image too large ({len(data)} bytes, max {settings.EVIDENCE_MAX_BYTES}).")
+    if not data.startswith(JPEG_MAGIC):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Not a JPEG image.")
+
+    sha256, created = await run_in_threadpool(evidence_store.put, data)
+    if not created:
+        response.status_code = status.HTTP_200_OK
+    return {"sha256": sha256, "url": f"{router.prefix}/{sha256}", "size": len(data), "created": created}
+
+@router.get("/{sha256}", response_class=FileResponse)
+def get_evidence(sha256: str, if_none_match: Optional[str] = Header(None)):
+    path = evidence_store.get_path(sha256)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found.")
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{sha256}"'}
+    if if_none_match and sha256 in if_none_match:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
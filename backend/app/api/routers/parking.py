@@ -1,5 +1,6 @@
 # backend/app/api/routers/parking.py
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import Optional, List
@@ -10,10 +11,16 @@ import math
 from app import database, schemas
 from app import api_schemas
 from app.api.deps import get_db
+from app.evidence_store import IMMUTABLE_CACHE_CONTROL, decode_base64_image, evidence_store
+from app.rollups import bucket_bounds
 
 router = APIRouter(prefix="/parking_violations", tags=["Parking Violations"])
 
-@router.get("/", response_model=List[schemas.ParkingViolationData])
+def image_url(v):
+    """URL ของภาพหลักฐานของ event (list endpoint ไม่ส่งตัวภาพ)"""
+    return f"{router.prefix}/{v.id}/image" if v.has_image else None
+
+@router.get("/", response_model=List[schemas.ParkingViolationListItem])
 def get_parking_violations(
      skip: int=0, 
      limit: int=100, 
@@ -23,7 +30,38 @@ def get_parking_violations(
     query = db.query(database.DBParkingViolation)
     if branch_id:
         query = query.filter(database.DBParkingViolation.branch_id.startswith(branch_id))
-    return query.offset(skip).limit(limit).all()
+    return [
+        schemas.ParkingViolationListItem.model_validate(v, from_attributes=True).model_copy(update={"image_url": image_url(v)})
+        for v in query.offset(skip).limit(limit).all()
+    ]
+
+#--- ภาพหลักฐานของ event (โหลดเมื่อเปิดดูเท่านั้น) ---#
+@router.get("/{event_id}/image", response_class=FileResponse, summary="Get the evidence image of a parking event")
+def get_violation_image(event_id: int, db: Session = Depends(get_db)):
+    row = db.query(database.DBParkingViolation.image_sha256, database.DBParkingViolation.image_base64)\
+        .filter(database.DBParkingViolation.id == event_id).first()
+    if row is not None and row.image_sha256:
+        path = evidence_store.get_path(row.image_sha256)
+        if path is not None:
+            return FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{row.image_sha256}"'})
+    if row is not None and row.image_base64:
+        # ข้อมูลเก่าที่ยังไม่ได้ย้ายออกจากตาราง
+        data = decode_base64_image(row.image_base64)
+        if data is not None:
+            return Response(content=data, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=86400"})
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found.")
+
+def violating_branches(rollup_query):
+    """สาขาที่มีการละเมิด (ไม่รวมที่ไม่มีชื่อสาขา) เรียงตามจำนวนการละเมิดจากมากไปน้อย"""
+    rollup = database.DBParkingViolationRollup
+    violation_count = func.sum(rollup.violation_count)
+    return rollup_query.filter(rollup.branch.isnot(None)).with_entities(
+        rollup.branch,
+        rollup.branch_id,
+        violation_count.label("violation_count")
+    ).group_by(rollup.branch, rollup.branch_id)\
+     .having(violation_count > 0)\
+     .order_by(violation_count.desc())
 
 #--- ข้อมูลสรุป KPI Card, Chart, Top Branch---#
 @router.get(
@@ -50,70 +88,62 @@ def get_violation_summary(
     if not start_date:
         start_date = end_date - timedelta(days=6)
 
-    # สร้าง Base Query เพื่อเป็นตัวตั้งต้น    
-    base_query = db.query(database.DBParkingViolation)
+    # ### แก้ไข ###: อ่านจากตารางสรุปรายชั่วโมง (parking_violation_rollups) แทนการ scan parking_violations ทุกครั้ง
+    # ช่วงวันที่เป็นวันตามเวลาไทย (bucket เป็นชั่วโมงของ Asia/Bangkok)
+    rollup = database.DBParkingViolationRollup
+    bucket_start, bucket_end = bucket_bounds(start_date, end_date)
+    range_query = db.query(rollup).filter(rollup.bucket_hour >= bucket_start, rollup.bucket_hour < bucket_end)
 
-    # เงื่อนไข .filter() เข้าไปใน Base Query ถ้ามีการส่งค่ามา
+    # เงื่อนไขสาขา (ใช้กับ KPI และ Chart)
+    base_query = range_query
     if branch_id:
-        base_query = base_query.filter(database.DBParkingViolation.branch_id.startswith(branch_id))
-    if start_date:
-        base_query = base_query.filter(database.DBParkingViolation.timestamp >= start_date)
-    if end_date:
-        from datetime import timedelta
-        # บวกไป 1 วันเพื่อให้ครอบคลุมข้อมูลของ end_date ทั้งวัน
-        base_query = base_query.filter(database.DBParkingViolation.timestamp < (end_date + timedelta(days=1)))
+        base_query = base_query.filter(rollup.branch_id.startswith(branch_id))
 
     # --- 1. คำนวณข้อมูลสำหรับ KPI Cards ---
 
-    total_unique_branches = base_query.with_entities(func.count(database.DBParkingViolation.branch_id.distinct()))\
-        .scalar() or 0
-    
-    # online_threshold = datetime.utcnow() - timedelta(minutes=15)
-    # online_branches_count = db.query(func.count(database.DBParkingViolation.branch_id.distinct()))\
-    #     .filter(database.DBParkingViolation.timestamp >= online_threshold)\
-    #     .scalar() or 0
-    
-    total_violations = base_query.filter(database.DBParkingViolation.is_violation == True).count()
-    ongoing_violations = base_query.filter(
-        database.DBParkingViolation.is_violation == True,
-        database.DBParkingViolation.exit_time.is_(None)
-    ).count()
+    totals = base_query.with_entities(
+        func.count(rollup.branch_id.distinct()).label("branches"),
+        func.coalesce(func.sum(rollup.event_count), 0).label("sessions"),
+        func.coalesce(func.sum(rollup.violation_count), 0).label("violations"),
+        func.coalesce(func.sum(rollup.open_violation_count), 0).label("ongoing"),
+        func.coalesce(func.sum(rollup.violation_duration_sum), 0).label("violation_duration_sum"),
+        func.coalesce(func.sum(rollup.violation_duration_count), 0).label("violation_duration_count"),
+        func.coalesce(func.sum(rollup.normal_duration_sum), 0).label("normal_duration_sum"),
+        func.coalesce(func.sum(rollup.normal_duration_count), 0).label("normal_duration_count")
+    ).one()
 
-    avg_duration_violation = base_query.with_entities(func.avg(database.DBParkingViolation.duration_minutes)).filter(database.DBParkingViolation.is_violation == True).scalar() or 0
-    avg_duration_normal = base_query.with_entities(func.avg(database.DBParkingViolation.duration_minutes)).filter(database.DBParkingViolation.is_violation == False).scalar() or 0
-    total_sessions = base_query.count()
+    avg_duration_violation = totals.violation_duration_sum / totals.violation_duration_count if totals.violation_duration_count else 0
+    avg_duration_normal = totals.normal_duration_sum / totals.normal_duration_count if totals.normal_duration_count else 0
 
     kpi_data = api_schemas.ParkingKpiData(
-        totalViolations=total_violations,
-        ongoingViolations=ongoing_violations,
-        total_parking_sessions=total_sessions,
+        totalViolations=totals.violations,
+        ongoingViolations=totals.ongoing,
+        total_parking_sessions=totals.sessions,
         avgViolationDuration=round(avg_duration_violation, 1),
         avgNormalParkingTime=round(avg_duration_normal, 1),
-        onlineBranches=total_unique_branches
+        onlineBranches=totals.branches
     )
 
-    # --- 2. คำนวณข้อมูลสำหรับ Violations Chart (ตัวอย่าง: จัดกลุ่มรายวัน 30 วันล่าสุด) ---
+    # --- 2. คำนวณข้อมูลสำหรับ Violations Chart ---
+    # label มาจาก bucket_hour ('YYYY-MM-DD HH:00') โดยตรง
 
-    chart_base_query = base_query.filter(database.DBParkingViolation.is_violation == True)
+    def count_violations_by(label_expression):
+        results_db = base_query.with_entities(
+            label_expression.label("label"),
+            func.sum(rollup.violation_count).label("count")
+        ).group_by("label").all()
+        return {r.label: r.count for r in results_db}
 
     chart_data = []
     
     if group_by_unit == 'hour':
-        results_db = chart_base_query.with_entities(
-            func.strftime('%H', database.DBParkingViolation.timestamp).label("label"),
-            func.count(database.DBParkingViolation.id).label("count")
-        ).group_by("label").all()
-        results_map = {f"{int(r.label):02d}:00": r.count for r in results_db}
+        results_map = {f"{int(label):02d}:00": count for label, count in count_violations_by(func.substr(rollup.bucket_hour, 12, 2)).items()}
         for hour in range(24):
             hour_str = f"{hour:02d}:00"
             chart_data.append(api_schemas.ViolationChartDataPoint(label=hour_str, value=results_map.get(hour_str, 0)))
 
     elif group_by_unit == 'day':
-        results_db = chart_base_query.with_entities(
-            func.date(database.DBParkingViolation.timestamp).label("label"),
-            func.count(database.DBParkingViolation.id).label("count")
-        ).group_by("label").all()
-        results_map = {str(r.label): r.count for r in results_db}
+        results_map = count_violations_by(func.substr(rollup.bucket_hour, 1, 10))
         current_date = start_date
         while current_date <= end_date:
             date_str = current_date.strftime("%Y-%m-%d")
@@ -122,11 +152,7 @@ def get_violation_summary(
             
     elif group_by_unit == 'week':
         # ใช้ %Y-%W สำหรับ SQLite เพื่อให้ได้ 'ปี-เลขสัปดาห์'
-        results_db = chart_base_query.with_entities(
-            func.strftime('%Y-%W', database.DBParkingViolation.timestamp).label("label"),
-            func.count(database.DBParkingViolation.id).label("count")
-        ).group_by("label").all()
-        results_map = {r.label: r.count for r in results_db}
+        results_map = count_violations_by(func.strftime('%Y-%W', rollup.bucket_hour))
         
         current_date = start_date
         while current_date <= end_date:
@@ -138,14 +164,9 @@ def get_violation_summary(
             current_date += timedelta(days=7)
 
     elif group_by_unit == 'month':
-        # 1. ดึงข้อมูลจริงจาก DB
-        results_db = chart_base_query.with_entities(
-            func.strftime('%Y-%m', database.DBParkingViolation.timestamp).label("label"),
-            func.count(database.DBParkingViolation.id).label("count")
-        ).group_by("label").all()
-        results_map = {r.label: r.count for r in results_db}
+        results_map = count_violations_by(func.substr(rollup.bucket_hour, 1, 7))
         
-        # 2. สร้างข้อมูลเปล่าสำหรับทุกเดือนในช่วงที่เลือก
+        # สร้างข้อมูลเปล่าสำหรับทุกเดือนในช่วงที่เลือก
         current_year = start_date.year
         current_month = start_date.month
         
@@ -161,25 +182,11 @@ def get_violation_summary(
                 current_month = 1
                 current_year += 1
 
-    # --- 3. คำนวณ Top 5 Branches ---
-    top_branches_query_base = db.query(database.DBParkingViolation)
-    if start_date:
-        top_branches_query_base = top_branches_query_base.filter(database.DBParkingViolation.timestamp >= start_date)
-    if end_date:
-        from datetime import timedelta
-        top_branches_query_base = top_branches_query_base.filter(database.DBParkingViolation.timestamp < (end_date + timedelta(days=1)))
- 
-    top_branches_query = top_branches_query_base.with_entities(
-        database.DBParkingViolation.branch,
-        database.DBParkingViolation.branch_id,
-        func.count(database.DBParkingViolation.id).label("violation_count")
-    ).filter(database.DBParkingViolation.is_violation == True,
-             database.DBParkingViolation.branch.isnot(None))\
-     .group_by(database.DBParkingViolation.branch, database.DBParkingViolation.branch_id)\
-     .order_by(func.count(database.DBParkingViolation.id).desc())\
-     .limit(5).all()
-
-    top_branches_data = [api_schemas.TopBranchData(name=row.branch, code=row.branch_id, count=row.violation_count) for row in top_branches_query]
+    # --- 3. คำนวณ Top 5 Branches (ทุกสาขา ไม่ใช้ branch_id filter) ---
+    top_branches_data = [
+        api_schemas.TopBranchData(name=row.branch, code=row.branch_id, count=row.violation_count)
+        for row in violating_branches(range_query).limit(5).all()
+    ]
 
     # --- 4. รวบรวมข้อมูลทั้งหมดและส่งกลับในรูปแบบที่กำหนด ---
     return api_schemas.ViolationSummaryResponse(
@@ -201,39 +208,21 @@ def get_all_violating_branches(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None
 ):
-    query_base = db.query(database.DBParkingViolation)\
-        .filter(database.DBParkingViolation.is_violation == True)\
-        .filter(database.DBParkingViolation.branch.isnot(None))
-
+    # ### แก้ไข ###: อ่านจาก parking_violation_rollups แทนการ group by บน parking_violations
+    rollup = database.DBParkingViolationRollup
+    query_base = db.query(rollup)
     if start_date:
-        query_base = query_base.filter(database.DBParkingViolation.timestamp >= start_date)
+        query_base = query_base.filter(rollup.bucket_hour >= bucket_bounds(start_date, start_date)[0])
     if end_date:
-        from datetime import timedelta
-        query_base = query_base.filter(database.DBParkingViolation.timestamp < (end_date + timedelta(days=1)))
-    
-    subquery = query_base.group_by(
-        database.DBParkingViolation.branch_id
-    ).subquery()
+        query_base = query_base.filter(rollup.bucket_hour < bucket_bounds(end_date, end_date)[1])
 
-    # Query เพื่อนับจำนวนกลุ่มทั้งหมด (ก่อน limit)
-    total_items_query = query_base.group_by(
-        database.DBParkingViolation.branch, 
-        database.DBParkingViolation.branch_id
-    )
-    total_items = db.query(func.count(subquery.c.id)).scalar()
+    # นับจำนวนสาขาทั้งหมด (ก่อน limit)
+    total_items = query_base.filter(rollup.violation_count > 0, rollup.branch.isnot(None))\
+        .with_entities(rollup.branch_id).group_by(rollup.branch_id).count()
     total_pages = math.ceil(total_items / limit)
 
     # Query เพื่อดึงข้อมูลของหน้านั้นๆ
-    branches_query = query_base.with_entities(
-        database.DBParkingViolation.branch,
-        database.DBParkingViolation.branch_id,
-        func.count(database.DBParkingViolation.id).label("violation_count")
-    ).group_by(
-        database.DBParkingViolation.branch,
-        database.DBParkingViolation.branch_id
-    ).order_by(
-        func.count(database.DBParkingViolation.id).desc()
-    ).offset((page - 1) * limit).limit(limit).all()
+    branches_query = violating_branches(query_base).offset((page - 1) * limit).limit(limit).all()
 
     branches_data = [
         api_schemas.TopBranchData(name=row.branch, code=row.branch_id, count=row.violation_count) 
@@ -288,6 +277,7 @@ def get_violation_events(
     #    - order_by: เรียงจากเหตุการณ์ล่าสุดไปเก่าสุด
     #    - offset: ข้ามข้อมูลของหน้าก่อนๆ
     #    - limit: จำกัดจำนวนข้อมูลต่อหน้า
+    #    - image_base64 เป็น deferred column จึงไม่ถูกอ่าน (ส่งแค่ hasImage + imageUrl)
     db_violations = query.order_by(database.DBParkingViolation.timestamp.desc())\
         .offset((page - 1) * limit)\
         .limit(limit)\
@@ -310,7 +300,8 @@ def get_violation_events(
             durationMinutes=v.duration_minutes,
             isViolation=v.is_violation,
             total_parking_sessions=v.total_parking_sessions or 0,
-            imageBase64=v.image_base64
+            hasImage=v.has_image,
+            imageUrl=image_url(v)
         )
         results.append(event)
     
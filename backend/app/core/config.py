@@ -3,5 +3,8 @@ import os
 class Settings:
     API_KEY = os.getenv("API_KEY", "nemo1234")
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/master_database_filtered.sqlite")
+    # ที่เก็บภาพหลักฐาน (content-addressed ตาม SHA-256) และขนาดภาพสูงสุดที่รับ
+    EVIDENCE_DIR = os.getenv("EVIDENCE_DIR", "./data/evidence")
+    EVIDENCE_MAX_BYTES = int(os.getenv("EVIDENCE_MAX_BYTES", 10 * 1024 * 1024))
 
 settings = Settings()
@@ -1,8 +1,8 @@
 # backend/app/database.py
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Boolean, JSON , Text
+from sqlalchemy import create_engine, inspect, or_, text, Column, Index, Integer, String, DateTime, Float, Boolean, JSON , Text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, deferred, column_property
 from datetime import datetime
 from app.core.config import settings
 
@@ -33,13 +33,40 @@ class DBParkingViolation(Base):
     is_violation= Column(Boolean)
     total_parking_sessions = Column(Integer, nullable=True)
     # total_parking_sessions_hourly = Column(Integer, nullable=True)
-    # ### FIX: เพิ่มคอลัมน์สำหรับเก็บภาพ Base64 ###
-    image_base64 = Column(Text, nullable=True)
+    # ภาพ Base64 ของข้อมูลเก่า (ย้ายไป EvidenceStore ด้วย python -m app.migrate_evidence)
+    # deferred: query ปกติไม่อ่านคอลัมน์นี้ - โหลดเฉพาะตอนขอภาพ
+    image_base64 = deferred(Column(Text, nullable=True))
+    # ภาพหลักฐานใน EvidenceStore (ไฟล์ตาม hash) - แทนการเก็บ Base64 ในตาราง
+    image_sha256 = Column(String(64), nullable=True)
     def __repr__(self):
         return (f"<ParkingViolation(id={self.id}, car_id={self.car_id}, "
                 f"camera_id='{self.camera_id}', event_type='{self.event_type}', "
                 f"timestamp='{self.timestamp}')>")
     
+# คำนวณใน SQL (IS NOT NULL) จึงรู้ว่ามีภาพโดยไม่ต้องอ่านภาพ
+DBParkingViolation.has_image = column_property(
+    or_(DBParkingViolation.image_sha256.isnot(None), DBParkingViolation.image_base64.isnot(None))
+)
+
+# ### เพิ่ม ###: ตารางสรุปรายชั่วโมง (เวลาไทย) สำหรับ dashboard - อัปเดตใน transaction เดียวกับการรับ event (ดู app/rollups.py)
+class DBParkingViolationRollup(Base):
+    __tablename__ = "parking_violation_rollups"
+    # key เก็บ NULL ตามตาราง event (สาขาที่ไม่มีชื่อ NULL กับชื่อว่าง '' เป็นคนละ bucket) จึงใช้ id เป็น primary key
+    # และ apply_rollups จับคู่ key ด้วย IS (is_not_distinct_from) แทน ON CONFLICT
+    id = Column(Integer, primary_key=True)
+    bucket_hour = Column(String(16), nullable=False) # 'YYYY-MM-DD HH:00' Asia/Bangkok
+    branch_id = Column(String, nullable=True)
+    camera_id = Column(String, nullable=True)
+    branch = Column(String, nullable=True)
+    event_count = Column(Integer, nullable=False, default=0)
+    violation_count = Column(Integer, nullable=False, default=0)
+    open_violation_count = Column(Integer, nullable=False, default=0) # is_violation และยังไม่มี exit_time
+    violation_duration_sum = Column(Float, nullable=False, default=0.0)
+    violation_duration_count = Column(Integer, nullable=False, default=0)
+    normal_duration_sum = Column(Float, nullable=False, default=0.0)
+    normal_duration_count = Column(Integer, nullable=False, default=0)
+    __table_args__ = (Index("ix_parking_violation_rollups_key", "bucket_hour", "branch_id", "camera_id", "branch", unique=True),)
+
 class DBTableOccupancy(Base):
     __tablename__= "table_occupancy"
     id= Column(Integer, primary_key=True, index=True)
@@ -74,8 +101,22 @@ class DBChilledBasketAlert(Base):
 # Function to create tables (call this once when the app starts)
 def create_db_tables():
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
     print("Database tables created/updated.")
 
+# create_all ไม่เพิ่มคอลัมน์ใหม่ให้ตารางที่มีอยู่แล้ว - เพิ่มเองสำหรับฐานข้อมูลเดิม
+def add_missing_columns():
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"))
+                    print(f"Added column {table.name}.{column.name}.")
+
 # Dependency for FastAPI to get DB session
 def get_db():
     db= SessionLocal()
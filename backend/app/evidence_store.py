@@ -0,0 +1,83 @@
+# backend/app/evidence_store.py
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple
+from app.core.config import settings
+
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+JPEG_MAGIC = b"\xff\xd8\xff"
+# ไฟล์ของ hash หนึ่งไม่มีวันเปลี่ยน - ให้ browser/proxy cache ได้ตลอด
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def decode_base64_image(image_base64: str) -> Optional[bytes]:
+    """Decodes a base64 image (optionally a data: URL). Returns None if it is empty or not valid base64."""
+    if image_base64.startswith("data:"):
+        image_base64 = image_base64.partition(",")[2]
+    try:
+        return base64.b64decode(image_base64, validate=True) or None
+    except (binascii.Error, ValueError):
+        return None
+
+class EvidenceStore:
+    """
+    Content-addressed store for violation evidence images on local disk.
+
+    Each image is saved once under its SHA-256 (<root>/ab/cd/<sha256>.jpg), so uploading the
+    same bytes again (a retried upload, an outbox replay) costs nothing and the file behind a
+    hash never changes - it can be served with an immutable cache header. Files are written
+    to a temporary name and renamed into place, so a reader never sees a partial image.
+    """
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}.jpg"
+
+    def put(self, data: bytes) -> Tuple[str, bool]:
+        """Stores `data` under its hash. Returns (sha256, created); created is False if the image was already stored."""
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.path_for(sha256)
+        if path.exists():
+            return sha256, False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return sha256, True
+
+    def get_path(self, sha256: str) -> Optional[Path]:
+        """Path of a stored image, or None if `sha256` is not a valid hash or nothing is stored under it."""
+        if not SHA256_PATTERN.match(sha256):
+            return None
+        path = self.path_for(sha256)
+        return path if path.is_file() else None
+
+    def put_base64(self, image_base64: str) -> Optional[str]:
+        """Stores a base64 image (optionally a data: URL) from an older sender. Returns its sha256, or None if it is not valid base64."""
+        data = decode_base64_image(image_base64)
+        return self.put(data)[0] if data is not None else None
+
+def move_inline_image(event: dict) -> dict:
+    """
+    Moves an inline `image_base64` of an ingested parking event into the store and references it
+    by `image_sha256` instead (senders that predate POST /evidence/). Images that cannot be decoded
+    are left inline.
+    """
+    image_base64 = event.get("image_base64")
+    if image_base64 and not event.get("image_sha256"):
+        sha256 = evidence_store.put_base64(image_base64)
+        if sha256 is not None:
+            event["image_sha256"], event["image_base64"] = sha256, None
+    return event
+
+evidence_store = EvidenceStore(settings.EVIDENCE_DIR)
@@ -2,8 +2,8 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.routers import parking, table, chilled, analytics
-from app import database
+from app.api.routers import parking, table, chilled, analytics, evidence
+from app import database, rollups
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,6 +28,12 @@ app.add_middleware(
 def on_startup(): #runs when the FastAPI application starts up.
     database.create_db_tables()
     logger.info(f"Database tables ensured and ready.")
+    db = database.SessionLocal()
+    try:
+        if rollups.ensure_rollups(db):
+            logger.info(f"Built parking violation rollups from existing events.")
+    finally:
+        db.close()
 
 @app.get("/", tags=["Root"])
 async def root():
@@ -41,3 +47,4 @@ app.include_router(parking.router)
 app.include_router(table.router)
 app.include_router(chilled.router)
 app.include_router(analytics.router)
+app.include_router(evidence.router)
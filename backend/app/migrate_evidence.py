@@ -0,0 +1,62 @@
+# backend/app/migrate_evidence.py
+"""
+Moves the inline image_base64 evidence of existing parking_violations rows into the EvidenceStore.
+
+Each image is decoded, stored under its SHA-256 and referenced by image_sha256; image_base64 is
+then cleared, so the table only holds event data. Rows are processed in batches (one commit
+each) and the command can be stopped and run again. Images that cannot be decoded are left
+inline. Use --vacuum to give the freed space back to the file system afterwards.
+
+    python -m app.migrate_evidence [--batch-size 200] [--vacuum]
+"""
+import argparse
+import logging
+from sqlalchemy import text
+from app import database
+from app.evidence_store import evidence_store
+
+logger = logging.getLogger(__name__)
+
+def migrate_inline_images(db, batch_size=200):
+    """Returns (moved, skipped) row counts."""
+    moved = skipped = 0
+    last_id = 0
+    while True:
+        rows = db.query(database.DBParkingViolation.id, database.DBParkingViolation.image_base64)\
+            .filter(database.DBParkingViolation.id > last_id, database.DBParkingViolation.image_base64.isnot(None))\
+            .order_by(database.DBParkingViolation.id).limit(batch_size).all()
+        if not rows:
+            return moved, skipped
+        for row_id, image_base64 in rows:
+            sha256 = evidence_store.put_base64(image_base64)
+            if sha256 is None:
+                skipped += 1
+                continue
+            db.query(database.DBParkingViolation).filter(database.DBParkingViolation.id == row_id)\
+                .update({"image_sha256": sha256, "image_base64": None}, synchronize_session=False)
+            moved += 1
+        db.commit()
+        last_id = rows[-1].id
+        logger.info(f"Moved {moved} images so far (last id {last_id}).")
+
+def main():
+    parser = argparse.ArgumentParser(description="Move inline Base64 evidence images out of parking_violations into the evidence store.")
+    parser.add_argument("--batch-size", type=int, default=200, help="Rows per transaction.")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the database afterwards to shrink the file.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    database.create_db_tables()
+    db = database.SessionLocal()
+    try:
+        moved, skipped = migrate_inline_images(db, args.batch_size)
+    finally:
+        db.close()
+    logger.info(f"Moved {moved} images to {evidence_store.root}; {skipped} could not be decoded and were left inline.")
+    if args.vacuum:
+        with database.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+        logger.info("Database vacuumed.")
+
+if __name__ == "__main__":
+    main()
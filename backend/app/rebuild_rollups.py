@@ -0,0 +1,30 @@
+# backend/app/rebuild_rollups.py
+"""
+Rebuilds parking_violation_rollups from parking_violations (backfill for existing databases such
+as master_database_filtered.sqlite, or a repair after editing events by hand). Runs in one
+transaction, so ingestion waits for it and the dashboard never sees a half-built table.
+
+    python -m app.rebuild_rollups
+"""
+import argparse
+import logging
+from app import database
+from app.rollups import rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+def main():
+    argparse.ArgumentParser(description="Rebuild the hourly parking violation rollups from the event table.").parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    database.create_db_tables()
+    db = database.SessionLocal()
+    try:
+        buckets = rebuild_rollups(db)
+        db.commit()
+    finally:
+        db.close()
+    logger.info(f"Rebuilt {buckets} hourly rollup buckets.")
+
+if __name__ == "__main__":
+    main()
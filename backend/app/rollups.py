@@ -0,0 +1,99 @@
+# backend/app/rollups.py
+"""
+Hourly rollups of parking_violations for the dashboard summary.
+
+parking_violation_rollups holds one row per (hour bucket in Asia/Bangkok, branch_id, camera_id,
+branch) with the counters the summary needs. Ingestion adds its rows' counters in the same
+transaction as the events (apply_rollups), so the summary, chart and top-branch endpoints only
+read a few rows per hour instead of scanning the event table. rebuild_rollups recomputes the
+table from parking_violations in one INSERT ... SELECT (backfill for existing databases).
+
+Key columns keep NULL as NULL (matched with IS), so the endpoints tell a missing branch from an
+empty one exactly as the queries on parking_violations did.
+
+Event rows are never updated after they are stored, so every counter only grows.
+"""
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import case, func, insert, select
+from app import database
+
+# Asia/Bangkok ไม่มี daylight saving - offset คงที่ +7 ทั้ง Python และ SQL (strftime '+7 hours')
+BANGKOK_OFFSET = timedelta(hours=7)
+BUCKET_FORMAT = "%Y-%m-%d %H:00"
+
+Rollup = database.DBParkingViolationRollup
+KEY_COLUMNS = ("bucket_hour", "branch_id", "camera_id", "branch")
+COUNTER_COLUMNS = ("event_count", "violation_count", "open_violation_count",
+                   "violation_duration_sum", "violation_duration_count",
+                   "normal_duration_sum", "normal_duration_count")
+
+def bucket_hour(timestamp: datetime) -> str:
+    """Asia/Bangkok hour bucket ('YYYY-MM-DD HH:00') of an event timestamp (naive timestamps are UTC, as stored)."""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp + BANGKOK_OFFSET).strftime(BUCKET_FORMAT)
+
+def bucket_bounds(start_date, end_date):
+    """Bucket range [start, end) covering whole Bangkok days from start_date to end_date."""
+    return f"{start_date:%Y-%m-%d} 00:00", f"{end_date + timedelta(days=1):%Y-%m-%d} 00:00"
+
+def _counters(row):
+    is_violation, duration = row.get("is_violation"), row.get("duration_minutes")
+    return {
+        "event_count": 1,
+        "violation_count": int(is_violation is True),
+        "open_violation_count": int(is_violation is True and row.get("exit_time") is None),
+        "violation_duration_sum": duration if is_violation is True and duration is not None else 0.0,
+        "violation_duration_count": int(is_violation is True and duration is not None),
+        "normal_duration_sum": duration if is_violation is False and duration is not None else 0.0,
+        "normal_duration_count": int(is_violation is False and duration is not None),
+    }
+
+def apply_rollups(db, rows):
+    """Adds the counters of newly stored parking_violations rows (column dicts) to their buckets. Call inside the ingesting transaction."""
+    buckets = {}
+    for row in rows:
+        timestamp = row.get("timestamp") or datetime.utcnow()
+        key = (bucket_hour(timestamp), row.get("branch_id"), row.get("camera_id"), row.get("branch"))
+        totals = buckets.setdefault(key, dict.fromkeys(COUNTER_COLUMNS, 0))
+        for column, value in _counters(row).items():
+            totals[column] += value
+    for key, totals in buckets.items():
+        # IS แทน = เพื่อให้ key ที่เป็น NULL จับคู่กันได้ (unique index ของ SQLite ถือว่า NULL ไม่ซ้ำกัน ใช้ ON CONFLICT ไม่ได้)
+        updated = db.query(Rollup).filter(*(getattr(Rollup, column).is_not_distinct_from(value) for column, value in zip(KEY_COLUMNS, key)))\
+            .update({column: getattr(Rollup, column) + value for column, value in totals.items()}, synchronize_session=False)
+        if not updated:
+            db.execute(insert(Rollup).values(**dict(zip(KEY_COLUMNS, key)), **totals))
+
+def rebuild_rollups(db):
+    """Recomputes all rollups from parking_violations (same rules as apply_rollups). Returns the number of buckets."""
+    pv = database.DBParkingViolation
+    is_violation, is_normal = pv.is_violation.is_(True), pv.is_violation.is_(False)
+    has_duration = pv.duration_minutes.isnot(None)
+    keys = (
+        func.strftime(BUCKET_FORMAT, pv.timestamp, f"+{int(BANGKOK_OFFSET.total_seconds() // 3600)} hours"),
+        pv.branch_id, pv.camera_id, pv.branch
+    )
+    source = select(
+        *keys,
+        func.count(),
+        func.sum(case((is_violation, 1), else_=0)),
+        func.sum(case((is_violation & pv.exit_time.is_(None), 1), else_=0)),
+        func.sum(case((is_violation & has_duration, pv.duration_minutes), else_=0.0)),
+        func.sum(case((is_violation & has_duration, 1), else_=0)),
+        func.sum(case((is_normal & has_duration, pv.duration_minutes), else_=0.0)),
+        func.sum(case((is_normal & has_duration, 1), else_=0)),
+    ).where(pv.timestamp.isnot(None)).group_by(*keys)
+    # drop + create แทน delete เพื่อให้ตารางที่สร้างด้วยโครงสร้างเก่ากลับมาตรงกับ model
+    Rollup.__table__.drop(db.connection(), checkfirst=True)
+    Rollup.__table__.create(db.connection())
+    db.execute(insert(Rollup).from_select(list(KEY_COLUMNS + COUNTER_COLUMNS), source))
+    return db.query(func.count()).select_from(Rollup).scalar()
+
+def ensure_rollups(db):
+    """Builds the rollups once for a database that has events but no rollups yet (first start after upgrading). Returns True if it did."""
+    if db.query(Rollup.bucket_hour).first() is not None or db.query(database.DBParkingViolation.id).first() is None:
+        return False
+    rebuild_rollups(db)
+    db.commit()
+    return True
@@ -46,7 +46,12 @@ const EvidenceModal: React.FC<{ violation: ParkingViolationEvent; onClose: () =>
                 </div>
                 <div className="modal-body">
                     <div className="modal-image-container">
-                        <img src={`data:image/jpeg;base64,${violation.imageBase64}`} alt={`Evidence for vehicle ${violation.vehicleId}`} />
+                        {violation.hasImage && violation.imageUrl ? (
+                            // ภาพโหลดจาก backend เมื่อเปิด modal เท่านั้น (cache ได้)
+                            <img src={`${process.env.REACT_APP_API_URL}${violation.imageUrl}`} alt={`Evidence for vehicle ${violation.vehicleId}`} />
+                        ) : (
+                            <p>No evidence image</p>
+                        )}
                     </div>
                     <div className="modal-details">
                         <p><strong>Vehicle ID:</strong> <span className="font-mono">{violation.vehicleId}</span></p>
@@ -19,7 +19,8 @@ export interface ParkingViolationEvent {
   durationMinutes: number;
   isViolation: boolean;
   total_parking_sessions: number;
-  imageBase64?: string;
+  hasImage: boolean;
+  imageUrl?: string | null; // path ของภาพหลักฐานบน backend (/parking_violations/<id>/image) - โหลดเมื่อเปิดดูเท่านั้น
 }
 
 export interface ParkingKpiData {
@@ -0,0 +1,46 @@
+import time
+import requests
+from datetime import datetime
+
+
+class EventBatcher:
+    """
+    Coalesces the simulators' JSON payloads into POST /analytics/batch requests.
+
+    `add()` buffers a payload (a JSON string of AnalyticsDataIn) and sends the buffer when it
+    holds `max_events` payloads or the oldest one has waited `max_delay_ms`. Call `flush()`
+    before the simulator sleeps so nothing waits for the next cycle.
+    """
+    def __init__(self, batch_url: str, headers: dict, max_events: int = 50, max_delay_ms: int = 500, timeout: float = 10):
+        self.batch_url = batch_url
+        self.headers = headers
+        self.max_events = max_events
+        self.max_delay = max_delay_ms / 1000
+        self.timeout = timeout
+        self._payloads = []
+        self._first_added = None
+
+    def add(self, payload: str):
+        if not self._payloads:
+            self._first_added = time.monotonic()
+        self._payloads.append(payload)
+        if len(self._payloads) >= self.max_events or time.monotonic() - self._first_added >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        """Sends the buffered payloads as one request (the payloads are already JSON, so they are joined without re-encoding)."""
+        if not self._payloads:
+            return
+        payloads, self._payloads = self._payloads, []
+        log_prefix = f"[{datetime.now():%Y-%m-%d %H:%M:%S}]"
+        try:
+            response = requests.post(self.batch_url, data="[" + ",".join(payloads) + "]", headers=self.headers, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"{log_prefix} \033[91mError sending batch of {len(payloads)} events: {e}\033[0m")
+            return
+        body = response.json()
+        print(f"{log_prefix} \033[92m{body['message']}\033[0m")
+        for result in body['results']:
+            if result['error']:
+                print(f"{log_prefix} \033[91mEvent {result['index']} rejected: {result['error']}\033[0m")
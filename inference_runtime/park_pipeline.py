@@ -9,9 +9,13 @@ from datetime import datetime, timedelta
 
 # --- การตั้งค่าพื้นฐาน ---
 API_URL = "http://127.0.0.1:8000/analytics/"
+BATCH_API_URL = "http://127.0.0.1:8000/analytics/batch"
 # !!! ATTENTION: Please replace "YOUR_API_KEY_HERE" with your actual API key.
 API_KEY = "nemo1234" 
 SIMULATION_INTERVAL_SECONDS = 1 # หน่วงเวลา 1 วินาทีในแต่ละรอบ
+# Coalescing: รวม event เป็น request เดียวไปที่ BATCH_API_URL เมื่อครบ N event หรือรอครบ T ms (0 = ส่งทีละ event)
+COALESCE_MAX_EVENTS = 0
+COALESCE_MAX_DELAY_MS = 500
 
 # --- เพิ่ม Path ไปยังโปรเจกต์หลักเพื่อ import schemas ---
 try:
@@ -21,6 +25,7 @@ try:
     from backend.app.schemas import (
         ParkingViolationData, TableOccupancyData, ChilledBasketAlertData, AnalyticsDataIn
     )
+    from inference_wrapper.event_batcher import EventBatcher
     print("Successfully imported schemas from backend.")
 except ImportError:
     print("Error: Could not import schemas from 'backend.app.schemas'.")
@@ -131,6 +136,10 @@ def main():
     
     # รายชื่อสาขาจำลอง
     branch_ids = ["1955", "15144", "10333", "2247", "22853", "12190", "2172"]
+    batcher = None
+    if COALESCE_MAX_EVENTS > 0:
+        batcher = EventBatcher(BATCH_API_URL, {"Content-Type": "application/json", "X-API-Key": API_KEY}, COALESCE_MAX_EVENTS, COALESCE_MAX_DELAY_MS)
+        print(f"Coalescing events: {COALESCE_MAX_EVENTS} events or {COALESCE_MAX_DELAY_MS} ms per request to {BATCH_API_URL}")
 
     try:
         while True:
@@ -151,10 +160,15 @@ def main():
                         continue
 
                     for payload in mock_results:
-                        send_data_to_api(payload, branch_id, camera_id)
+                        if batcher is not None:
+                            batcher.add(payload)
+                        else:
+                            send_data_to_api(payload, branch_id, camera_id)
                 
                 print("-" * 30)
 
+            if batcher is not None:
+                batcher.flush()
             print(f"\n>>> Cycle complete. Waiting for {SIMULATION_INTERVAL_SECONDS} seconds... <<<\n")
             time.sleep(SIMULATION_INTERVAL_SECONDS)
 
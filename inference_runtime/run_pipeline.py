@@ -10,8 +10,13 @@ PATH_TO_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "
 sys.path.append(PATH_TO_PROJECT_ROOT)
 
 from inference_wrapper.mock_ai_inference import generate_mock_ai_results
+from inference_wrapper.event_batcher import EventBatcher
 
 BACKEND_API_URL = "http://127.0.0.1:8000/analytics" 
+BACKEND_BATCH_API_URL = "http://127.0.0.1:8000/analytics/batch"
+# รวม event เป็น request เดียวเมื่อครบ N event หรือรอครบ T ms (0 = ส่งทีละ event)
+COALESCE_MAX_EVENTS = 0
+COALESCE_MAX_DELAY_MS = 500
 
 NUM_MOCK_BRANCHES = 5 #จำลอง 5 สาขา
 BRANCHES = [str(random.randint(100, 29999)) for _ in range(NUM_MOCK_BRANCHES)]
@@ -30,6 +35,7 @@ def send_to_backend(branch_id: str, camera_id: str, data_payload_json_string: st
 def main():
     print("Starting AI inference pipeline simulation...")
     simulation_interval_seconds = 10
+    batcher = EventBatcher(BACKEND_BATCH_API_URL, {"Content-Type": "application/json"}, COALESCE_MAX_EVENTS, COALESCE_MAX_DELAY_MS) if COALESCE_MAX_EVENTS > 0 else None
 
     while True:
         for branch_id in BRANCHES:
@@ -44,10 +50,15 @@ def main():
 
                 if mock_results_json_string_list:
                     for result_json_string in mock_results_json_string_list:
-                        send_to_backend(branch_id, camera_id, result_json_string)
+                        if batcher is not None:
+                            batcher.add(result_json_string)
+                        else:
+                            send_to_backend(branch_id, camera_id, result_json_string)
                 else:
                     print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] No mock data generated for Branch ID: {branch_id}, Camera ID: {camera_id} in this cycle.")
         
+        if batcher is not None:
+            batcher.flush()
         time.sleep(simulation_interval_seconds)
 
 if __name__ =="__main__":